@@ -0,0 +1,223 @@
+"""
+Скрипт архивации старых секций pereval_added
+Секции месяцев, в которых все перевалы приняты или отклонены, отсоединяются
+от таблицы, выгружаются в сжатые CSV и удаляются из базы вместе с изображениями
+
+Запуск: python archive_partitions.py [--older-than 12] [--dir archive] [--dry-run]
+Только для базы, секционированной через python init_db.py --partitioned.
+Прерванный запуск можно повторить: отсоединенные секции будут выгружены.
+ID удаленных перевалов записываются в pereval_archived для GET /sync и
+удаляются из общего кэша Redis (FSTR_CACHE_URL).
+"""
+
+import os
+import gzip
+import asyncio
+import argparse
+from datetime import date
+from typing import List
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+from database.cache import PerevalCache
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Секции pereval_added и отсоединенные, но еще не выгруженные таблицы
+SELECT_PARTITIONS = """
+    SELECT c.relname, i.inhrelid IS NOT NULL AS attached, coalesce(i.inhdetachpending, false) AS detach_pending
+    FROM pg_class c
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+    WHERE c.relkind = 'r'
+      AND c.relnamespace = 'public'::regnamespace
+      AND c.relname ~ '^pereval_added_y[0-9]{4}m[0-9]{2}$'
+    ORDER BY c.relname
+"""
+
+# Перевалы, проверка которых не завершена
+SELECT_OPEN = "SELECT EXISTS (SELECT 1 FROM {} WHERE status IS NULL OR status NOT IN ('accepted', 'rejected'))"
+
+COPY_PEREVALS = "COPY (SELECT * FROM {} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)"
+
+COPY_IMAGES = """
+    COPY (
+        SELECT i.* FROM pereval_images i WHERE i.pereval_id IN (SELECT id FROM {}) ORDER BY i.id
+    ) TO STDOUT WITH (FORMAT csv, HEADER)
+"""
+
+# Отметки об удалении для GET /sync; повторная архивация возвращенного перевала
+# выдает отметку заново
+INSERT_ARCHIVED = """
+    INSERT INTO pereval_archived (id, user_id)
+    SELECT id, user_id FROM {}
+    ON CONFLICT (id) DO UPDATE SET change_xid = EXCLUDED.change_xid, archived_at = EXCLUDED.archived_at
+    RETURNING id
+"""
+
+
+def partition_name(month: date) -> str:
+    """Имя секции месяца, как в create_pereval_partitions()"""
+    return f"pereval_added_y{month.year:04d}m{month.month:02d}"
+
+
+def cutoff_month(older_than: int) -> date:
+    """Первый месяц, который еще остается в базе"""
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - older_than
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def export(cursor, query: sql.Composed, path: str) -> int:
+    """
+    Выгрузка результата COPY в gzip-файл
+    
+    Файл пишется во временный и переименовывается после записи на диск,
+    поэтому неполный архив не остается под итоговым именем.
+    
+    Returns:
+        int: Количество выгруженных строк
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            cursor.copy_expert(query, f)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return cursor.rowcount
+
+
+async def invalidate_cache(pereval_ids: List[int]):
+    """
+    Удаление архивированных перевалов из общего кэша API
+    
+    Args:
+        pereval_ids: ID удаленных перевалов
+    """
+    cache = PerevalCache.from_env()
+    try:
+        for pereval_id in pereval_ids:
+            await cache.invalidate(pereval_id)
+    finally:
+        await cache.close()
+
+
+def archive_partition(conn, name: str, attached: bool, detach_pending: bool, directory: str):
+    """
+    Отсоединение, выгрузка и удаление одной секции
+    
+    Args:
+        conn: Подключение в режиме autocommit
+        name: Имя секции
+        attached: Секция еще присоединена к pereval_added
+        detach_pending: Отсоединение прервано и должно быть завершено
+        directory: Каталог архива
+    """
+    table = sql.Identifier(name)
+    cursor = conn.cursor()
+    
+    # CONCURRENTLY не блокирует чтение и запись в остальные секции
+    if detach_pending:
+        cursor.execute(sql.SQL("ALTER TABLE pereval_added DETACH PARTITION {} FINALIZE").format(table))
+    elif attached:
+        cursor.execute(sql.SQL("ALTER TABLE pereval_added DETACH PARTITION {} CONCURRENTLY").format(table))
+    
+    rows = export(cursor, sql.SQL(COPY_PEREVALS).format(table), os.path.join(directory, f"{name}.csv.gz"))
+    images = export(cursor, sql.SQL(COPY_IMAGES).format(table), os.path.join(directory, f"{name}_images.csv.gz"))
+    
+    # Удаление одной транзакцией после того, как архив записан
+    conn.autocommit = False
+    try:
+        cursor.execute(sql.SQL(INSERT_ARCHIVED).format(table))
+        pereval_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(sql.SQL("DELETE FROM pereval_images WHERE pereval_id IN (SELECT id FROM {})").format(table))
+        cursor.execute(sql.SQL("DELETE FROM pereval_idempotency_keys WHERE pereval_id IN (SELECT id FROM {})").format(table))
+        cursor.execute(sql.SQL("DROP TABLE {}").format(table))
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+    
+    # Локальные кэши процессов API не очищаются: записи в них устаревают
+    # не позже, чем через FSTR_CACHE_TTL
+    if pereval_ids and os.getenv('FSTR_CACHE_URL'):
+        asyncio.run(invalidate_cache(pereval_ids))
+    
+    print(f"{name}: {rows} перевалов и {images} изображений перенесено в архив")
+
+
+def archive_partitions(older_than: int, directory: str, dry_run: bool = False) -> bool:
+    """
+    Архивация секций старше older_than месяцев
+    
+    Args:
+        older_than: Сколько последних месяцев остается в базе
+        directory: Каталог архива
+        dry_run: Только показать секции, которые будут перенесены
+    
+    Returns:
+        bool: True если архивация выполнена без ошибок
+    """
+    last_name = partition_name(cutoff_month(older_than))
+    
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('FSTR_DB_HOST', 'localhost'),
+            port=os.getenv('FSTR_DB_PORT', '5432'),
+            user=os.getenv('FSTR_DB_LOGIN', 'postgres'),
+            password=os.getenv('FSTR_DB_PASS', 'password'),
+            database=os.getenv('FSTR_DB_NAME', 'pereval')
+        )
+        # DETACH PARTITION CONCURRENTLY нельзя выполнять внутри транзакции
+        conn.autocommit = True
+        cursor = conn.cursor()
+        
+        cursor.execute(SELECT_PARTITIONS)
+        candidates = [row for row in cursor.fetchall() if row[0] < last_name]
+        
+        os.makedirs(directory, exist_ok=True)
+        for name, attached, detach_pending in candidates:
+            if attached and not detach_pending:
+                cursor.execute(sql.SQL(SELECT_OPEN).format(sql.Identifier(name)))
+                if cursor.fetchone()[0]:
+                    print(f"{name}: есть перевалы на проверке, секция остается в базе")
+                    continue
+            if dry_run:
+                print(f"{name}: будет перенесена в архив")
+                continue
+            archive_partition(conn, name, attached, detach_pending, directory)
+        
+        cursor.close()
+        conn.close()
+    
+    except (psycopg2.Error, OSError) as e:
+        print(f"Ошибка при архивации секций: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Архивация старых секций pereval_added")
+    parser.add_argument(
+        "--older-than", type=int, default=int(os.getenv('FSTR_ARCHIVE_AFTER_MONTHS', '12')),
+        help="Сколько последних месяцев оставить в базе (по умолчанию 12)"
+    )
+    parser.add_argument(
+        "--dir", default=os.getenv('FSTR_ARCHIVE_DIR', 'archive'),
+        help="Каталог архива (по умолчанию archive)"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Только показать секции для архивации")
+    args = parser.parse_args()
+    
+    if args.older_than < 1:
+        parser.error("--older-than должен быть не меньше 1: текущий месяц не архивируется")
+    
+    print(f"Архивация секций старше {partition_name(cutoff_month(args.older_than))}...")
+    if archive_partitions(args.older_than, args.dir, args.dry_run):
+        print("Архивация завершена")
+    else:
+        print("Ошибка при архивации")
@@ -0,0 +1,98 @@
+"""
+Бенчмарк подготовленных запросов: время вызовов AsyncDatabaseManager на путях
+отправки и чтения без подготовки на сервере (FSTR_DB_PREPARE_THRESHOLD=off)
+и с подготовкой горячих запросов при первом выполнении
+
+Запуск: python benchmarks/bench_prepared.py [количество]
+Использует переменные окружения FSTR_DB_* и пишет в указанную БД.
+Пул из одного подключения и отключенный кэш, чтобы каждый вызов шел в БД.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['FSTR_DB_POOL_MIN'] = os.environ['FSTR_DB_POOL_MAX'] = '1'
+os.environ['FSTR_CACHE_SIZE'] = '0'
+os.environ.pop('FSTR_DB_REPLICAS', None)
+
+from database.async_db_manager import AsyncDatabaseManager
+from models.pereval_models import PerevalSubmitData
+
+
+def make_payload(email: str, index: int) -> dict:
+    """Тестовые данные перевала, уже прошедшие валидацию"""
+    return PerevalSubmitData.model_validate({
+        "beauty_title": "пер. ",
+        "title": f"Пхия {uuid.uuid4().hex[:8]}",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {
+            "email": email,
+            "fam": "Пупкин",
+            "name": "Василий",
+            "otc": "Иванович",
+            "phone": "+7 555 55 55 55"
+        },
+        # Точки далеко друг от друга, чтобы проверка дубликатов ничего не находила
+        "coords": {"latitude": 40 + index % 100 / 10, "longitude": 40 + index // 100 % 100 / 10, "height": 1200},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": []
+    }).model_dump()
+
+
+async def timed(calls) -> float:
+    """Среднее время вызова в микросекундах"""
+    started = time.perf_counter()
+    for call in calls:
+        await call()
+    return (time.perf_counter() - started) / len(calls) * 1e6
+
+
+async def run(mode: str, count: int) -> dict:
+    """Замер submit, lookup и update в одном режиме подготовки"""
+    os.environ['FSTR_DB_PREPARE_THRESHOLD'] = mode
+    db = AsyncDatabaseManager()
+    if not await db.connect():
+        sys.exit("Не удалось подключиться к базе данных")
+    
+    emails = [f"bench-{uuid.uuid4().hex}@example.com" if i % 2 else "bench@example.com" for i in range(count)]
+    payloads = [make_payload(email, i) for i, email in enumerate(emails)]
+    ids = []
+    
+    async def submit(payload):
+        ids.append((await db.add_pereval(payload))['id'])
+    
+    # Прогрев: подключение, кэш каталога и подготовка горячих запросов
+    await submit(make_payload("bench@example.com", count))
+    
+    results = {
+        "submit": await timed([lambda p=p: submit(p) for p in payloads]),
+        "lookup": await timed([lambda i=i: db.get_pereval_by_id(i) for i in ids]),
+        "user": await timed([lambda e=e: db.get_or_create_user({"email": e}) for e in emails]),
+        "update": await timed([lambda i=i: db.update_pereval(i, {"title": "Пхия"}) for i in ids[1:]]),
+    }
+    await db.disconnect()
+    return results
+
+
+async def main(count: int):
+    logging.disable(logging.INFO)
+    before = await run('off', count)
+    after = await run('5', count)
+    
+    print(f"{count} вызовов, среднее время в мкс")
+    print(f"{'':<8} {'без подготовки':>15} {'подготовленные':>15} {'разница':>9}")
+    for name in before:
+        change = (after[name] / before[name] - 1) * 100
+        print(f"{name:<8} {before[name]:15.0f} {after[name]:15.0f} {change:+8.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,114 @@
+"""
+Бенчмарк сериализации списка перевалов: jsonable_encoder + json.dumps
+(путь FastAPI по умолчанию) против orjson, и размер ответа без сжатия,
+с gzip и brotli (если установлен пакет brotli)
+
+Запуск: python benchmarks/bench_serialize.py [количество записей] [повторов]
+БД не нужна, записи формируются в памяти в том виде, в каком их возвращает psycopg.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from serialization import dumps, compress, brotli
+
+
+def make_rows(count: int) -> list:
+    """Тестовые записи как из SELECT_PEREVAL_BY_USER_EMAIL"""
+    started = datetime(2021, 9, 22, 13, 18, 13)
+    return [
+        {
+            "id": i,
+            "beauty_title": "пер. ",
+            "title": f"Пхия {i}",
+            "other_titles": "Триев",
+            "connect": "",
+            "add_time": started + timedelta(minutes=i),
+            "date_added": started + timedelta(minutes=i, seconds=5),
+            "latitude": Decimal("45.38420000") + Decimal(i) / 10000,
+            "longitude": Decimal("7.15250000"),
+            "height": 1200 + i % 500,
+            "winter_level": "",
+            "summer_level": "1А",
+            "autumn_level": "1А",
+            "spring_level": "",
+            "status": "new",
+            "version": 1,
+            "raw_data": {
+                "beauty_title": "пер. ",
+                "title": f"Пхия {i}",
+                "coords": {"latitude": "45.3842", "longitude": "7.1525", "height": "1200"},
+                "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+            },
+            "images": [
+                {"id": i * 2, "title": "Седловина", "url": f"/pereval/{i}/images/{i * 2}"},
+                {"id": i * 2 + 1, "title": "Подъем", "url": f"/pereval/{i}/images/{i * 2 + 1}"},
+            ],
+            "email": "qwerty@mail.ru",
+            "fam": "Пупкин",
+            "name": "Василий",
+            "otc": "Иванович",
+            "phone": "+7 555 55 55 55",
+        }
+        for i in range(count)
+    ]
+
+
+def default_encode(content) -> bytes:
+    """Кодирование как у JSONResponse после jsonable_encoder"""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def measure(name: str, encode, content, repeat: int) -> bytes:
+    """Среднее время кодирования одного ответа"""
+    body = encode(content)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(content)
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<22} {elapsed * 1000:8.2f} мс на ответ")
+    return body
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    
+    content = {
+        "message": f"Найдено {count} перевалов",
+        "pereval_list": make_rows(count),
+        "next_cursor": None,
+    }
+    
+    print(f"Список из {count} перевалов, {repeat} повторов")
+    default_body = measure("jsonable_encoder+json", default_encode, content, repeat)
+    body = measure("orjson", dumps, content, repeat)
+    assert json.loads(body) == json.loads(default_body)
+    
+    print()
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    print(f"{'identity':<22} {len(body):8d} байт")
+    for encoding in encodings:
+        started = time.perf_counter()
+        compressed = compress(body, encoding)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{encoding:<22} {len(compressed):8d} байт "
+            f"({len(compressed) / len(body):.0%}), сжатие {elapsed * 1000:.2f} мс"
+        )
+    if brotli is None:
+        print("brotli не установлен, сравнение br пропущено")
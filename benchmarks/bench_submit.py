@@ -0,0 +1,81 @@
+"""
+Бенчмарк сохранения перевала: прежний путь (поиск/создание пользователя и
+отдельная вставка перевала, два коммита) против одной транзакции с CTE
+
+Запуск: python benchmarks/bench_submit.py [количество]
+Использует переменные окружения FSTR_DB_* и пишет в указанную БД.
+"""
+
+import os
+import sys
+import logging
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import queries
+from database.db_manager import DatabaseManager
+
+
+def make_payload(email: str) -> dict:
+    """Тестовые данные перевала"""
+    return {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {
+            "email": email,
+            "fam": "Пупкин",
+            "name": "Василий",
+            "otc": "Иванович",
+            "phone": "+7 555 55 55 55"
+        },
+        "coords": {"latitude": "45.3842", "longitude": "7.1525", "height": "1200"},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": []
+    }
+
+
+def legacy_add_pereval(db: DatabaseManager, pereval_data: dict) -> int:
+    """Прежняя реализация: пользователь и перевал в разных транзакциях"""
+    user_id = db.get_or_create_user(pereval_data['user'])
+    with db.get_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                queries.INSERT_PEREVAL,
+                queries.pereval_values(pereval_data) + (user_id,)
+            )
+            pereval_id = cursor.fetchone()['id']
+            connection.commit()
+            return pereval_id
+
+
+def run(name: str, submit, db: DatabaseManager, count: int):
+    """Замер количества сохранений в секунду"""
+    # Половина отправок от новых пользователей, половина от существующего
+    emails = [
+        f"bench-{uuid.uuid4().hex}@example.com" if i % 2 else "bench@example.com"
+        for i in range(count)
+    ]
+    started = time.perf_counter()
+    for email in emails:
+        submit(db, make_payload(email))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<12} {count} отправок за {elapsed:.2f} с — {count / elapsed:.0f} отправок/с")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    
+    db = DatabaseManager()
+    if not db.connect():
+        sys.exit("Не удалось подключиться к базе данных")
+    
+    logging.getLogger("database.db_manager").setLevel(logging.WARNING)
+    
+    run("legacy", legacy_add_pereval, db, count)
+    run("single-tx", DatabaseManager.add_pereval, db, count)
+    db.disconnect()
@@ -0,0 +1,121 @@
+"""
+Бенчмарк валидации отправки перевала: прежние модели (строковые координаты,
+validator в стиле Pydantic v1 и повторный разбор float/int/strptime перед записью
+в БД) против текущих моделей, которые разбирают каждое поле один раз
+
+Запуск: python benchmarks/bench_validate.py [повторов]
+БД не нужна.
+"""
+
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+from typing import Optional, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, Field, validator
+
+from models.pereval_models import PerevalSubmitData, UserData, Level, ImageData
+
+
+PAYLOAD = {
+    "beauty_title": "пер. ",
+    "title": "Пхия",
+    "other_titles": "Триев",
+    "connect": "",
+    "add_time": "2021-09-22 13:18:13",
+    "user": {
+        "email": "qwerty@mail.ru",
+        "fam": "Пупкин",
+        "name": "Василий",
+        "otc": "Иванович",
+        "phone": "+7 555 55 55 55"
+    },
+    "coords": {"latitude": "45.3842", "longitude": "7.1525", "height": "1200"},
+    "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+    "images": [{"data": "aGVsbG8=", "title": "Седловина"}]
+}
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    
+    class LegacyCoordinates(BaseModel):
+        """Прежняя модель координат: строки, проверяемые через float()"""
+        latitude: str = Field(..., description="Широта")
+        longitude: str = Field(..., description="Долгота")
+        height: str = Field(..., description="Высота")
+        
+        @validator('latitude', 'longitude', 'height')
+        def validate_coordinates(cls, v):
+            try:
+                float(v)
+            except ValueError:
+                raise ValueError('Координаты должны быть числовыми')
+            return v
+    
+    class LegacyPerevalSubmitData(BaseModel):
+        """Прежняя модель отправки: add_time проверяется strptime и остается строкой"""
+        beauty_title: Optional[str] = None
+        title: str
+        other_titles: Optional[str] = None
+        connect: Optional[str] = None
+        add_time: Optional[str] = None
+        user: UserData
+        coords: LegacyCoordinates
+        level: Level
+        area_id: Optional[int] = None
+        images: List[ImageData] = []
+        
+        @validator('add_time')
+        def validate_add_time(cls, v):
+            if v:
+                try:
+                    datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    raise ValueError('Некорректный формат времени. Используйте: YYYY-MM-DD HH:MM:SS')
+            return v
+
+
+def legacy(payload: dict) -> tuple:
+    """Прежний путь: валидация, dict() и повторный разбор значений для INSERT"""
+    data = LegacyPerevalSubmitData.model_validate(payload).model_dump()
+    return (
+        datetime.strptime(data['add_time'], '%Y-%m-%d %H:%M:%S'),
+        float(data['coords']['latitude']),
+        float(data['coords']['longitude']),
+        int(data['coords']['height']),
+    )
+
+
+def current(payload: dict) -> tuple:
+    """Текущий путь: значения разобраны моделью и передаются в БД как есть"""
+    data = PerevalSubmitData.model_validate(payload).model_dump()
+    return (
+        data['add_time'],
+        data['coords']['latitude'],
+        data['coords']['longitude'],
+        data['coords']['height'],
+    )
+
+
+def run(name: str, parse, repeat: int) -> tuple:
+    """Среднее время обработки одной отправки"""
+    result = parse(PAYLOAD)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parse(PAYLOAD)
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<8} {elapsed * 1e6:8.1f} мкс на отправку")
+    return result
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    
+    print(f"{repeat} отправок")
+    legacy_values = run("legacy", legacy, repeat)
+    current_values = run("current", current, repeat)
+    assert legacy_values == current_values
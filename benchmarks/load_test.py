@@ -0,0 +1,400 @@
+"""
+Нагрузочный тест API: отправка перевалов, получение по ID, PATCH и список по email
+
+Генерирует отправки PerevalSubmitData с разным количеством и размером изображений,
+выполняет сценарии с заданной параллельностью и выводит p50/p95/p99, пропускную
+способность и память сервера (RSS). Результаты сохраняются в JSON для сравнения версий.
+
+Запуск:
+    python benchmarks/load_test.py                      # запускает uvicorn сам
+    python benchmarks/load_test.py --url http://localhost:8000 --server-pid 1234
+    python benchmarks/load_test.py --baseline benchmarks/results/prev.json
+
+Сервер пишет в БД из переменных окружения FSTR_DB_* - используйте локальную тестовую БД.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import base64
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('submit', 'get', 'patch', 'list')
+
+TITLES = ('Пхия', 'Дятлова', 'Кавказский', 'Чегет', 'Бечо', 'Местийский', 'Донгуз-Орун')
+LEVELS = ('', '1А', '1Б', '2А', '2Б', '3А')
+
+
+class PayloadGenerator:
+    """Генератор отправок перевалов; при одинаковом seed данные повторяются"""
+    
+    def __init__(self, seed: int, users: int, max_images: int, image_min_kb: int, image_max_kb: int):
+        """
+        Args:
+            seed: Начальное значение генератора случайных чисел
+            users: Количество разных пользователей (email)
+            max_images: Максимум изображений в отправке
+            image_min_kb: Минимальный размер изображения в КБ
+            image_max_kb: Максимальный размер изображения в КБ
+        """
+        self.random = random.Random(seed)
+        # Email уникальны для прогона: список по email не растет от прогона к прогону
+        run_id = uuid.uuid4().hex[:8]
+        self.emails = [f"load-{run_id}-{i}@example.com" for i in range(users)]
+        self.max_images = max_images
+        self.image_min_kb = image_min_kb
+        self.image_max_kb = image_max_kb
+    
+    def image(self) -> Dict[str, str]:
+        size = self.random.randint(self.image_min_kb, self.image_max_kb) * 1024
+        return {
+            "data": base64.b64encode(self.random.randbytes(size)).decode(),
+            "title": self.random.choice(('Седловина', 'Подъем', 'Спуск', 'Вид с перевала'))
+        }
+    
+    def pereval(self) -> Dict[str, Any]:
+        """Отправка перевала в формате POST /submitData"""
+        rnd = self.random
+        return {
+            "beauty_title": "пер. ",
+            "title": f"{rnd.choice(TITLES)} {rnd.randint(1, 10 ** 6)}",
+            "other_titles": rnd.choice(TITLES),
+            "connect": "",
+            "add_time": datetime(2020 + rnd.randint(0, 5), rnd.randint(1, 12), rnd.randint(1, 28),
+                                 rnd.randint(0, 23), rnd.randint(0, 59)).strftime('%Y-%m-%d %H:%M:%S'),
+            "user": {
+                "email": rnd.choice(self.emails),
+                "fam": "Пупкин",
+                "name": "Василий",
+                "otc": "Иванович",
+                "phone": "+7 555 55 55 55"
+            },
+            "coords": {
+                "latitude": f"{rnd.uniform(41.0, 45.0):.4f}",
+                "longitude": f"{rnd.uniform(39.0, 48.0):.4f}",
+                "height": str(rnd.randint(1500, 5500))
+            },
+            "level": {season: rnd.choice(LEVELS) for season in ('winter', 'summer', 'autumn', 'spring')},
+            "images": [self.image() for _ in range(rnd.randint(0, self.max_images))]
+        }
+    
+    def changes(self) -> Dict[str, Any]:
+        """Тело PATCH /submitData/{id}: часть полей"""
+        return {
+            "title": f"{self.random.choice(TITLES)} {self.random.randint(1, 10 ** 6)}",
+            "coords": {"height": str(self.random.randint(1500, 5500))}
+        }
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+class RSSSampler:
+    """Пиковая память сервера и его рабочих процессов по /proc (только Linux)"""
+    
+    def __init__(self, pid: Optional[int], interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    @staticmethod
+    def _process_rss(pid: int) -> int:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+    
+    @staticmethod
+    def _children(pid: int) -> List[int]:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    
+    def rss(self) -> Optional[int]:
+        """Текущий суммарный RSS в байтах или None, если недоступен"""
+        if not self.pid:
+            return None
+        try:
+            # При --workers > 1 запросы обрабатывают дочерние процессы uvicorn
+            return sum(self._process_rss(pid) for pid in [self.pid] + self._children(self.pid))
+        except (OSError, ValueError):
+            return None
+    
+    def _run(self):
+        while not self._stop.is_set():
+            value = self.rss()
+            if value is not None:
+                self.peak = max(self.peak or 0, value)
+            self._stop.wait(self.interval)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_scenario(name: str, operation: Callable[[requests.Session, int], bool],
+                 count: int, concurrency: int, sampler: RSSSampler) -> Dict[str, Any]:
+    """
+    Выполнение count операций в concurrency потоков
+    
+    Returns:
+        Dict: Количество запросов и ошибок, пропускная способность, перцентили в мс, RSS
+    """
+    local = threading.local()
+    
+    def call(index: int):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = operation(local.session, index)
+        except (requests.RequestException, ValueError):
+            # ValueError - ответ не JSON, например страница ошибки прокси
+            ok = False
+        return time.perf_counter() - started, ok
+    
+    rss_before = sampler.rss()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(count)))
+    elapsed = time.perf_counter() - started
+    
+    latencies = [duration * 1000 for duration, ok in results if ok]
+    result = {
+        "requests": count,
+        "errors": sum(1 for _, ok in results if not ok),
+        "seconds": round(elapsed, 3),
+        "throughput": round(count / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else None,
+        "rss_before": rss_before,
+        "rss_after": sampler.rss(),
+    }
+    for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+        if result[key] is not None:
+            result[key] = round(result[key], 2)
+    print(
+        f"{name:<7} {count:6d} запросов, ошибок {result['errors']:4d}, "
+        f"{result['throughput'] or 0:8.1f} зап/с, p50 {result['p50_ms']} мс, "
+        f"p95 {result['p95_ms']} мс, p99 {result['p99_ms']} мс"
+    )
+    return result
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, log_path: Optional[str]) -> Tuple[subprocess.Popen, str]:
+    """Запуск uvicorn main:app на свободном порту и ожидание /health"""
+    port = free_port()
+    # Логи сервера (INFO на каждый запрос) не смешиваются с отчетом
+    log = open(log_path or os.devnull, 'w')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=ROOT, stdout=log, stderr=subprocess.STDOUT
+    )
+    log.close()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit("Сервер завершился при запуске, подробности в --server-log")
+        try:
+            if requests.get(f"{url}/health", timeout=1).json().get('status') == 'ok':
+                return server, url
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    sys.exit("Сервер не ответил на /health за 30 секунд")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline_path: str, max_regression: float) -> bool:
+    """
+    Сравнение p95 и пропускной способности с сохраненным прогоном
+    
+    Returns:
+        bool: True, если ни один сценарий не ухудшился больше чем на max_regression процентов
+    """
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    
+    ok = True
+    print(f"\nСравнение с {baseline_path} ({baseline.get('revision')}):")
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get('p95_ms') or not current.get('p95_ms'):
+            continue
+        p95_change = (current['p95_ms'] / previous['p95_ms'] - 1) * 100
+        regressed = p95_change > max_regression
+        throughput = f"{previous.get('throughput')} -> {current.get('throughput')} зап/с"
+        # Пропускная способность сравнивается, только если она замерена в обоих прогонах
+        if previous.get('throughput') and current.get('throughput'):
+            throughput_change = (current['throughput'] / previous['throughput'] - 1) * 100
+            regressed = regressed or -throughput_change > max_regression
+            throughput += f" ({throughput_change:+.1f}%)"
+        ok = ok and not regressed
+        print(
+            f"{name:<7} p95 {previous['p95_ms']} -> {current['p95_ms']} мс ({p95_change:+.1f}%), "
+            f"{throughput}{'  РЕГРЕССИЯ' if regressed else ''}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API перевалов")
+    parser.add_argument('--url', help="Адрес запущенного API; без него uvicorn запускается автоматически")
+    parser.add_argument('--server-pid', type=int, help="PID сервера для замера RSS при --url")
+    parser.add_argument('--workers', type=int, default=1, help="Процессы uvicorn при автоматическом запуске")
+    parser.add_argument('--server-log', help="Файл для вывода автоматически запущенного сервера")
+    parser.add_argument('--requests', type=int, default=500, help="Запросов на сценарий")
+    parser.add_argument('--concurrency', type=int, default=16, help="Параллельных клиентов")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument('--users', type=int, default=20, help="Разных email в отправках")
+    parser.add_argument('--max-images', type=int, default=3, help="Максимум изображений в отправке")
+    parser.add_argument('--image-min-kb', type=int, default=20, help="Минимальный размер изображения, КБ")
+    parser.add_argument('--image-max-kb', type=int, default=300, help="Максимальный размер изображения, КБ")
+    parser.add_argument('--seed', type=int, default=1, help="Seed генератора данных")
+    parser.add_argument('--output', help="Файл результатов (по умолчанию benchmarks/results/load-<время>.json)")
+    parser.add_argument('--baseline', help="Результаты прежнего прогона для сравнения")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="Допустимое ухудшение p95 и пропускной способности, %%")
+    args = parser.parse_args()
+    
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+    
+    server = None
+    url, pid = args.url, args.server_pid
+    if not url:
+        server, url = start_server(args.workers, args.server_log)
+        pid = server.pid
+    url = url.rstrip('/')
+    
+    generator = PayloadGenerator(args.seed, args.users, args.max_images, args.image_min_kb, args.image_max_kb)
+    # Данные готовятся заранее, чтобы генерация не попадала в замер
+    payloads = [generator.pereval() for _ in range(args.requests)]
+    changes = [generator.changes() for _ in range(args.requests)]
+    pereval_ids: List[int] = []
+    lock = threading.Lock()
+    
+    def submit(session, index):
+        response = session.post(f"{url}/submitData", json=payloads[index], timeout=60)
+        if response.status_code != 200:
+            return False
+        body = response.json()
+        if body.get('status') != 200:
+            return False
+        with lock:
+            pereval_ids.append(body['id'])
+        return True
+    
+    def get(session, index):
+        pereval_id = pereval_ids[index % len(pereval_ids)]
+        return session.get(f"{url}/submitData/{pereval_id}", timeout=60).status_code == 200
+    
+    def patch(session, index):
+        pereval_id = pereval_ids[index % len(pereval_ids)]
+        response = session.patch(f"{url}/submitData/{pereval_id}", json=changes[index], timeout=60)
+        # 412 - тот же перевал одновременно изменил другой клиент, это не ошибка сервера
+        return response.status_code in (200, 412)
+    
+    def list_by_email(session, index):
+        email = generator.emails[index % len(generator.emails)]
+        response = session.get(f"{url}/submitData/", params={"user__email": email}, timeout=60)
+        return response.status_code == 200
+    
+    operations = {'submit': submit, 'get': get, 'patch': patch, 'list': list_by_email}
+    
+    payload_bytes = [len(json.dumps(payload)) for payload in payloads]
+    results = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "url": url,
+        "params": {
+            key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'server_log')
+        },
+        "payload_kb": {
+            "p50": round(percentile(payload_bytes, 50) / 1024, 1),
+            "max": round(max(payload_bytes) / 1024, 1),
+        },
+        "scenarios": {},
+    }
+    
+    print(f"{url}, {args.requests} запросов на сценарий, параллельность {args.concurrency}")
+    try:
+        with RSSSampler(pid) as sampler:
+            for name in scenarios:
+                if name != 'submit' and not pereval_ids:
+                    # Для чтения и PATCH нужны перевалы: создаются без замера
+                    run_scenario('prepare', submit, min(args.requests, 50), args.concurrency, sampler)
+                results["scenarios"][name] = run_scenario(
+                    name, operations[name], args.requests, args.concurrency, sampler
+                )
+            results["rss_peak"] = sampler.peak
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    
+    if results["rss_peak"]:
+        print(f"Пиковый RSS сервера: {results['rss_peak'] / 2 ** 20:.1f} МБ")
+    
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+    
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1288 @@
+"""
+Асинхронный класс для работы с базой данных PostgreSQL
+Используется обработчиками FastAPI, чтобы не блокировать event loop
+"""
+
+import os
+import logging
+import inspect
+import functools
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Sequence, Tuple, AsyncIterator
+from datetime import datetime
+import psycopg
+from psycopg.conninfo import make_conninfo, conninfo_to_dict
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from dotenv import load_dotenv
+
+from database import queries
+from database.cache import PerevalCache
+from database import replicas
+from database.partitions import PartitionMap
+from metrics import instrument
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StaleStatementError(Exception):
+    """Подготовленный на подключении запрос устарел после изменения схемы"""
+
+
+# Сообщение PostgreSQL (SQLSTATE 0A000) о подготовленном запросе, у которого изменился тип результата
+STALE_STATEMENT_MESSAGE = "cached plan must not change result type"
+
+# Ошибку устаревшего запроса превращать в StaleStatementError; на последней попытке
+# метода выключено, чтобы метод обработал ошибку сам и вернул обычный результат ошибки
+_convert_stale = contextvars.ContextVar('convert_stale', default=True)
+
+
+def is_stale_statement(error: psycopg.Error) -> bool:
+    """Ошибка вызвана подготовленным запросом, устаревшим после ALTER TABLE"""
+    return error.sqlstate == '0A000' and STALE_STATEMENT_MESSAGE in (error.diag.message_primary or '')
+
+
+class PreparedCursor(psycopg.AsyncCursor):
+    """
+    Курсор, отличающий устаревший подготовленный запрос от остальных ошибок
+    
+    После ALTER TABLE подготовленный запрос, у которого изменился тип результата,
+    завершается ошибкой FeatureNotSupported (cached plan must not change result type).
+    Готовятся не только горячие запросы (prepare=True), но и любые после
+    prepare_threshold выполнений, поэтому проверка сделана для всех запросов.
+    Остальные ошибки FeatureNotSupported передаются без изменений.
+    """
+    
+    async def execute(self, query, params=None, **kwargs):
+        try:
+            return await super().execute(query, params, **kwargs)
+        except psycopg.errors.FeatureNotSupported as e:
+            if _convert_stale.get() and is_stale_statement(e):
+                raise StaleStatementError(str(e)) from e
+            raise
+
+
+def retry_stale_statements(exclude: Sequence[str] = ()):
+    """
+    Декоратор класса менеджера БД: повтор метода после StaleStatementError
+    
+    Откат транзакции с ошибкой сбрасывает подготовленные запросы подключения,
+    поэтому повтор метода целиком выполняется уже с новыми. Каждое подключение
+    пулов ошибается не больше одного раза, отсюда число попыток. Последняя
+    попытка выполняется без StaleStatementError: ошибку обрабатывает сам метод.
+    
+    Args:
+        exclude: Методы, которые не повторяются (подключение, статистика)
+    """
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _retried(method))
+        return cls
+    return decorate
+
+
+def _retried(method):
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        attempts = self.pool_max * (1 + len(self.replicas)) + 1
+        for _ in range(attempts - 1):
+            try:
+                return await method(self, *args, **kwargs)
+            except StaleStatementError:
+                logger.info(f"Подготовленный запрос устарел после изменения схемы, повтор {method.__name__}")
+        token = _convert_stale.set(False)
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            _convert_stale.reset(token)
+    return wrapper
+
+
+@instrument(exclude=('connect', 'disconnect', 'pool_stats', 'replica_stats', 'cache_stats'))
+@retry_stale_statements(exclude=('connect', 'disconnect'))
+class AsyncDatabaseManager:
+    """Асинхронный менеджер БД на psycopg 3 с собственным пулом подключений"""
+    
+    def __init__(self):
+        """Инициализация параметров подключения через переменные окружения"""
+        self.host = os.getenv('FSTR_DB_HOST', 'localhost')
+        self.port = os.getenv('FSTR_DB_PORT', '5432')
+        self.login = os.getenv('FSTR_DB_LOGIN', 'postgres')
+        self.password = os.getenv('FSTR_DB_PASS', 'password')
+        self.database = os.getenv('FSTR_DB_NAME', 'pereval')
+        self.pool_min = int(os.getenv('FSTR_DB_POOL_MIN', '1'))
+        self.pool_max = int(os.getenv('FSTR_DB_POOL_MAX', '10'))
+        # Ожидание свободного соединения в секундах, когда все заняты
+        self.pool_timeout = float(os.getenv('FSTR_DB_POOL_TIMEOUT', '30'))
+        self.pool = None
+        self.cache = PerevalCache.from_env()
+        # Нечеткий поиск по названиям доступен только с расширением pg_trgm
+        self.trigram = False
+        # pereval_added секционирована по месяцам date_added
+        self.partitioned = False
+        # Месяцы секций для чтения перевала по ID (только для секционированной таблицы)
+        self.partition_map: Optional[PartitionMap] = None
+        # Расстояние в метрах, на котором похожие перевалы считаются дубликатами (0 - не искать)
+        self.duplicate_radius = float(os.getenv('FSTR_DUPLICATE_RADIUS', '300'))
+        # Время в секундах, после которого незавершенная проверка возвращается в очередь
+        self.claim_timeout = int(os.getenv('FSTR_CLAIM_TIMEOUT', '1800'))
+        # Реплики для чтения: строки подключения через запятую
+        self.replica_dsns = [dsn.strip() for dsn in os.getenv('FSTR_DB_REPLICAS', '').split(',') if dsn.strip()]
+        # Ожидание подключения к реплике и пауза перед повторной попыткой после ошибки, в секундах
+        self.replica_timeout = float(os.getenv('FSTR_DB_REPLICA_TIMEOUT', '2'))
+        self.replica_retry = float(os.getenv('FSTR_DB_REPLICA_RETRY', '30'))
+        self.replicas: List[replicas.Replica] = []
+        self._replica_turn = 0
+        # Запрос готовится на сервере после стольких выполнений на подключении, горячие
+        # запросы (prepare=True) - при первом; off отключает, например для PgBouncer в режиме transaction
+        threshold = os.getenv('FSTR_DB_PREPARE_THRESHOLD', '5').strip().lower()
+        self.prepare_threshold = None if threshold in ('', 'off', 'none') else int(threshold)
+    
+    async def connect(self) -> bool:
+        """
+        Открытие асинхронного пула подключений
+        
+        Returns:
+            bool: True если подключение успешно, False в противном случае
+        """
+        conninfo = make_conninfo(
+            host=self.host,
+            port=self.port,
+            user=self.login,
+            password=self.password,
+            dbname=self.database
+        )
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=self.pool_min,
+            max_size=self.pool_max,
+            kwargs={
+                "row_factory": dict_row,
+                "cursor_factory": PreparedCursor,
+                "prepare_threshold": self.prepare_threshold
+            },
+            check=AsyncConnectionPool.check_connection,
+            timeout=self.pool_timeout,
+            open=False
+        )
+        try:
+            await pool.open(wait=True)
+        except psycopg.Error as e:
+            # В том числе PoolTimeout, если БД недоступна
+            logger.error(f"Ошибка подключения к базе данных: {e}")
+            await pool.close()
+            return False
+        
+        self.pool = pool
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.SELECT_TRIGRAM_AVAILABLE)
+                self.trigram = (await cursor.fetchone())['available']
+        except psycopg.Error as e:
+            logger.error(f"Ошибка проверки расширения pg_trgm: {e}")
+        if not self.trigram:
+            logger.info("Расширение pg_trgm недоступно, поиск по названиям только полнотекстовый")
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.SELECT_PARTITIONED)
+                self.partitioned = (await cursor.fetchone())['partitioned']
+        except psycopg.Error as e:
+            logger.error(f"Ошибка проверки секционирования: {e}")
+        if self.partitioned:
+            await self._load_partition_map()
+        
+        await self._open_replicas()
+        
+        logger.info(
+            f"Успешное асинхронное подключение к базе данных "
+            f"(пул: {self.pool_min}-{self.pool_max}, реплик: {len(self.replicas)})"
+        )
+        return True
+    
+    async def _open_replicas(self):
+        """
+        Открытие пулов реплик
+        
+        Недоступная при запуске реплика не мешает старту: пул подключается в фоне,
+        а чтение идет с других серверов. Не указанные в строке подключения
+        пользователь, пароль, порт и БД берутся из настроек основного сервера.
+        """
+        for dsn in self.replica_dsns:
+            params = conninfo_to_dict(dsn)
+            params.setdefault('port', self.port)
+            params.setdefault('user', self.login)
+            params.setdefault('password', self.password)
+            params.setdefault('dbname', self.database)
+            pool = AsyncConnectionPool(
+                make_conninfo(**params),
+                min_size=self.pool_min,
+                max_size=self.pool_max,
+                kwargs={
+                    "row_factory": dict_row,
+                    "cursor_factory": PreparedCursor,
+                    "prepare_threshold": self.prepare_threshold
+                },
+                check=AsyncConnectionPool.check_connection,
+                timeout=self.replica_timeout,
+                open=False
+            )
+            await pool.open(wait=False)
+            self.replicas.append(replicas.Replica(dsn, pool))
+    
+    def _replica_order(self) -> List[replicas.Replica]:
+        """Доступные реплики по кругу, начиная со следующей"""
+        available = [replica for replica in self.replicas if replica.available()]
+        if not available:
+            return []
+        self._replica_turn = (self._replica_turn + 1) % len(available)
+        return available[self._replica_turn:] + available[:self._replica_turn]
+    
+    @asynccontextmanager
+    async def _read_connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """
+        Подключение для запроса только на чтение
+        
+        Реплики выбираются по кругу. Реплика с ошибкой подключения пропускается на
+        replica_retry секунд; реплика, не догнавшая токен согласованности запроса,
+        пропускается для этого запроса. Если подходящей реплики нет - основной сервер.
+        """
+        token = replicas.read_after()
+        for replica in self._replica_order():
+            try:
+                connection = await replica.pool.getconn()
+            except psycopg.OperationalError as e:
+                # В том числе PoolTimeout, если реплика не отвечает
+                replica.mark_down(self.replica_retry, e)
+                continue
+            
+            used = False
+            try:
+                async with connection:
+                    if token:
+                        cursor = await connection.execute(queries.SELECT_REPLICA_CAUGHT_UP, (token,))
+                        if not (await cursor.fetchone())['caught_up']:
+                            replica.lagging += 1
+                            continue
+                    replica.reads += 1
+                    used = True
+                    yield connection
+                    return
+            except psycopg.OperationalError as e:
+                if connection.broken:
+                    replica.mark_down(self.replica_retry, e)
+                # Ошибку запроса получает вызывающий, до запроса - пробуем следующий сервер
+                if used:
+                    raise
+            finally:
+                await replica.pool.putconn(connection)
+        
+        async with self.pool.connection() as connection:
+            yield connection
+    
+    async def maintain_partitions(self, months_ahead: int) -> Optional[Dict[str, int]]:
+        """
+        Обслуживание секций pereval_added: создание будущих месяцев
+        и закрытие прошедших (CHECK по диапазону id)
+        
+        Args:
+            months_ahead: На сколько месяцев вперед создавать секции
+        
+        Returns:
+            Dict: created и sealed - число созданных и закрытых секций, или None при ошибке
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.MAINTAIN_PARTITIONS, (months_ahead,))
+                result = await cursor.fetchone()
+        except psycopg.Error as e:
+            logger.error(f"Ошибка обслуживания секций: {e}")
+            return None
+        
+        # Закрытые здесь или другим экземпляром API месяцы начинают отсекаться
+        await self._load_partition_map()
+        return result
+    
+    async def _load_partition_map(self):
+        """Загрузка месяцев секций и диапазонов id закрытых секций"""
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.SELECT_PEREVAL_PARTITIONS)
+                self.partition_map = PartitionMap(await cursor.fetchall())
+        except psycopg.Error as e:
+            logger.error(f"Ошибка загрузки секций: {e}")
+    
+    async def current_lsn(self) -> Optional[str]:
+        """
+        Текущая позиция WAL основного сервера для токена согласованности
+        
+        Returns:
+            str: LSN или None при ошибке
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.SELECT_CURRENT_LSN)
+                return (await cursor.fetchone())['lsn']
+        except psycopg.Error as e:
+            logger.error(f"Ошибка получения позиции WAL: {e}")
+            return None
+    
+    async def disconnect(self):
+        """Закрытие пулов подключений"""
+        for replica in self.replicas:
+            await replica.pool.close()
+        self.replicas = []
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Подключение к базе данных закрыто")
+        if self.cache:
+            await self.cache.close()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Статистика пула подключений
+        
+        Returns:
+            Dict: Размеры пула, свободные соединения и счетчики
+        """
+        if not self.pool:
+            return {}
+        
+        stats = self.pool.get_stats()
+        return {
+            "min": self.pool_min,
+            "max": self.pool_max,
+            "size": stats.get("pool_size", 0),
+            "available": stats.get("pool_available", 0),
+            "waiting": stats.get("requests_waiting", 0),
+            "checkouts": stats.get("requests_num", 0),
+            "recycled": stats.get("connections_lost", 0),
+        }
+    
+    def replica_stats(self) -> List[Dict[str, Any]]:
+        """
+        Состояние реплик для чтения
+        
+        Returns:
+            List: Статистика каждой реплики (Replica.stats)
+        """
+        return [replica.stats() for replica in self.replicas]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Статистика кэша перевалов
+        
+        Returns:
+            Dict: Попадания, промахи и размер кэша или пустой словарь, если кэш отключен
+        """
+        return self.cache.stats() if self.cache else {}
+    
+    async def _invalidate(self, pereval_id: int):
+        """Удаление перевала из кэша после изменения"""
+        if self.cache:
+            await self.cache.invalidate(pereval_id)
+    
+    async def health_check(self) -> bool:
+        """
+        Проверка доступности базы данных
+        
+        Returns:
+            bool: True если база данных отвечает
+        """
+        if not self.pool:
+            return False
+        
+        try:
+            async with self.pool.connection() as connection:
+                await connection.execute("SELECT 1")
+            return True
+        except psycopg.Error as e:
+            logger.error(f"Ошибка проверки подключения к БД: {e}")
+            return False
+    
+    async def _next_image_ids(self, connection, count: int) -> List[int]:
+        """Выделение ID для новых строк pereval_images"""
+        if not count:
+            return []
+        cursor = await connection.execute(queries.NEXT_IMAGE_IDS, (count,), prepare=True)
+        return [row['id'] for row in await cursor.fetchall()]
+    
+    async def _insert_images(self, connection, pereval_id: int, image_ids: List[int], images: list):
+        """Сохранение изображений перевала в pereval_images"""
+        if not images:
+            return
+        async with connection.cursor() as cursor:
+            await cursor.executemany(queries.INSERT_IMAGE, [
+                (image_id, pereval_id, data, title)
+                for image_id, (title, data) in zip(image_ids, images)
+            ])
+    
+    async def get_or_create_user(self, user_data: Dict[str, Any]) -> Optional[int]:
+        """
+        Получение существующего пользователя или создание нового
+        
+        Args:
+            user_data: Словарь с данными пользователя
+        
+        Returns:
+            int: ID пользователя или None в случае ошибки
+        """
+        if not self.pool:
+            logger.error("Нет подключения к базе данных")
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(
+                    queries.SELECT_USER_ID_BY_EMAIL,
+                    (user_data['email'],),
+                    prepare=True
+                )
+                existing_user = await cursor.fetchone()
+                
+                if existing_user:
+                    logger.info(f"Найден существующий пользователь с ID: {existing_user['id']}")
+                    return existing_user['id']
+                
+                # Создаем нового пользователя
+                cursor = await connection.execute(
+                    queries.INSERT_USER,
+                    queries.user_values(user_data),
+                    prepare=True
+                )
+                user_id = (await cursor.fetchone())['id']
+                logger.info(f"Создан новый пользователь с ID: {user_id}")
+                return user_id
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при работе с пользователем: {e}")
+            return None
+    
+    async def _find_by_idempotency_key(
+        self,
+        connection,
+        email: str,
+        idempotency_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """Перевал, ранее сохраненный пользователем с тем же ключом повтора"""
+        cursor = await connection.execute(
+            queries.SELECT_PEREVAL_BY_IDEMPOTENCY_KEY, (email, idempotency_key), prepare=True
+        )
+        return await cursor.fetchone()
+    
+    async def _find_by_idempotency_keys(
+        self,
+        connection,
+        emails: Sequence[str],
+        idempotency_keys: Sequence[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Перевалы пакета (id и duplicate_of), ранее сохраненные с теми же ключами повтора"""
+        cursor = await connection.execute(
+            queries.SELECT_PEREVALS_BY_IDEMPOTENCY_KEYS, (list(emails), list(idempotency_keys))
+        )
+        return {
+            row['idempotency_key']: {"id": row['id'], "duplicate_of": row['duplicate_of']}
+            for row in await cursor.fetchall()
+        }
+    
+    async def _find_duplicate(self, connection, pereval_data: Dict[str, Any]) -> Optional[int]:
+        """
+        Поиск вероятного оригинала перевала по координатам и названию
+        
+        Args:
+            connection: Подключение текущей транзакции
+            pereval_data: Словарь с данными о перевале
+        
+        Returns:
+            int: ID оригинала или None, если похожих перевалов рядом нет
+        """
+        if self.duplicate_radius <= 0:
+            return None
+        
+        coords = pereval_data['coords']
+        sql, params = queries.duplicate_query(
+            coords['latitude'],
+            coords['longitude'],
+            self.duplicate_radius,
+            pereval_data['title'],
+            trigram=self.trigram
+        )
+        cursor = await connection.execute(sql, params, prepare=True)
+        row = await cursor.fetchone()
+        return row['id'] if row else None
+    
+    async def add_pereval(
+        self,
+        pereval_data: Dict[str, Any],
+        idempotency_key: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Добавление нового перевала в базу данных
+        
+        Если рядом уже есть перевал с похожим названием, новая запись
+        сохраняется со ссылкой duplicate_of на него. Повтор запроса с тем же
+        idempotency_key от того же пользователя возвращает ранее созданную запись.
+        
+        Args:
+            pereval_data: Словарь с данными о перевале
+            idempotency_key: Ключ повтора запроса от клиента
+        
+        Returns:
+            Dict: id, duplicate_of и created (False для повтора) или None в случае ошибки
+        """
+        if not self.pool:
+            logger.error("Нет подключения к базе данных")
+            return None
+        
+        email = pereval_data['user']['email']
+        
+        try:
+            images = queries.decode_images(pereval_data)
+            
+            async with self.pool.connection() as connection:
+                if idempotency_key:
+                    row = await self._find_by_idempotency_key(connection, email, idempotency_key)
+                    if row:
+                        logger.info(f"Повтор запроса для перевала с ID: {row['id']}")
+                        return {"id": row['id'], "duplicate_of": row['duplicate_of'], "created": False}
+                
+                duplicate_of = await self._find_duplicate(connection, pereval_data)
+                
+                # Пользователь, перевал и изображения сохраняются одной транзакцией
+                image_ids = await self._next_image_ids(connection, len(images))
+                params = queries.submit_values(
+                    pereval_data,
+                    queries.image_refs(image_ids, images),
+                    duplicate_of,
+                    idempotency_key
+                )
+                cursor = await connection.execute(queries.INSERT_PEREVAL_WITH_USER, params, prepare=True)
+                row = await cursor.fetchone()
+                if row is None:
+                    # Пользователь создан параллельно, повторяем с его ID
+                    cursor = await connection.execute(queries.INSERT_PEREVAL_WITH_USER, params, prepare=True)
+                    row = await cursor.fetchone()
+                pereval_id = row['id']
+                await self._insert_images(connection, pereval_id, image_ids, images)
+            
+            if duplicate_of:
+                logger.info(f"Добавлен перевал с ID: {pereval_id}, вероятный дубликат {duplicate_of}")
+            else:
+                logger.info(f"Добавлен перевал с ID: {pereval_id}")
+            return {"id": pereval_id, "duplicate_of": duplicate_of, "created": True}
+        
+        except psycopg.errors.UniqueViolation as e:
+            if not idempotency_key:
+                logger.error(f"Ошибка при добавлении перевала: {e}")
+                return None
+            # Параллельный повтор с тем же ключом успел сохранить перевал первым
+            try:
+                async with self.pool.connection() as connection:
+                    row = await self._find_by_idempotency_key(connection, email, idempotency_key)
+            except psycopg.Error as e:
+                logger.error(f"Ошибка при поиске повтора запроса: {e}")
+                return None
+            if not row:
+                return None
+            return {"id": row['id'], "duplicate_of": row['duplicate_of'], "created": False}
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при добавлении перевала: {e}")
+            return None
+        except (ValueError, KeyError) as e:
+            logger.error(f"Ошибка в данных перевала: {e}")
+            return None
+    
+    async def _copy_perevals(
+        self,
+        connection,
+        pereval_list: List[Dict[str, Any]],
+        idempotency_keys: Sequence[Optional[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Загрузка перевалов командой COPY в текущей транзакции
+        
+        Все пользователи пакета создаются и находятся двумя запросами,
+        изображения загружаются второй командой COPY. Вероятные дубликаты
+        ищутся для каждого перевала, как при одиночной отправке.
+        
+        Returns:
+            List[Dict]: id и duplicate_of перевалов в порядке входного списка
+        """
+        # Уникальные пользователи пакета, первый по email побеждает
+        users = {}
+        for pereval_data in pereval_list:
+            users.setdefault(pereval_data['user']['email'], pereval_data['user'])
+        user_columns = list(zip(*(queries.user_values(user) for user in users.values())))
+        images = [queries.decode_images(pereval_data) for pereval_data in pereval_list]
+        
+        await connection.execute(queries.INSERT_USERS_BATCH, [list(column) for column in user_columns])
+        cursor = await connection.execute(queries.SELECT_USER_IDS_BY_EMAILS, (list(users),))
+        user_ids = {row['email']: row['id'] for row in await cursor.fetchall()}
+        
+        cursor = await connection.execute(queries.NEXT_PEREVAL_IDS, (len(pereval_list),))
+        pereval_ids = [row['id'] for row in await cursor.fetchall()]
+        
+        duplicates = [await self._find_duplicate(connection, pereval_data) for pereval_data in pereval_list]
+        
+        image_ids = iter(await self._next_image_ids(connection, sum(map(len, images))))
+        image_rows = []
+        async with connection.cursor().copy(queries.COPY_PEREVAL_BATCH) as copy:
+            for pereval_data, pereval_images, pereval_id, duplicate_of, key in zip(
+                pereval_list, images, pereval_ids, duplicates, idempotency_keys
+            ):
+                ids = [next(image_ids) for _ in pereval_images]
+                image_rows.extend(
+                    (image_id, pereval_id, data, title)
+                    for image_id, (title, data) in zip(ids, pereval_images)
+                )
+                row = queries.pereval_values(pereval_data, queries.image_refs(ids, pereval_images))
+                await copy.write_row(row + (duplicate_of, key, user_ids[pereval_data['user']['email']], pereval_id))
+        
+        if image_rows:
+            async with connection.cursor().copy(queries.COPY_IMAGES_BATCH) as copy:
+                for image_row in image_rows:
+                    await copy.write_row(image_row)
+        return [
+            {"id": pereval_id, "duplicate_of": duplicate_of}
+            for pereval_id, duplicate_of in zip(pereval_ids, duplicates)
+        ]
+    
+    async def add_pereval_batch(
+        self,
+        pereval_list: List[Dict[str, Any]],
+        idempotency_keys: Optional[Sequence[str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Пакетное добавление перевалов одной транзакцией
+        
+        Перевалы загружаются одной командой COPY. Пакет сохраняется целиком
+        или не сохраняется совсем: ошибка БД на любом перевале (например,
+        несуществующий area_id) откатывает весь пакет.
+        
+        Перевалы, уже сохраненные с теми же ключами повтора, повторно не
+        записываются; остальные перевалы пакета сохраняются. Для каждого
+        нового перевала ищется вероятный оригинал (duplicate_of).
+        
+        Args:
+            pereval_list: Список словарей с данными о перевалах
+            idempotency_keys: Ключи повтора перевалов (queries.batch_idempotency_key)
+        
+        Returns:
+            List[Dict]: id, duplicate_of и created (False для повтора) в порядке
+                входного списка или None в случае ошибки
+        """
+        if not self.pool:
+            logger.error("Нет подключения к базе данных")
+            return None
+        
+        if not pereval_list:
+            return []
+        
+        keys = list(idempotency_keys) if idempotency_keys else [None] * len(pereval_list)
+        emails = [pereval_data['user']['email'] for pereval_data in pereval_list]
+        
+        try:
+            results: List[Optional[Dict[str, Any]]] = [None] * len(pereval_list)
+            async with self.pool.connection() as connection:
+                if idempotency_keys:
+                    existing = await self._find_by_idempotency_keys(connection, emails, keys)
+                    for index, key in enumerate(keys):
+                        if key in existing:
+                            results[index] = {**existing[key], "created": False}
+                
+                pending = [index for index, result in enumerate(results) if result is None]
+                if pending:
+                    created = await self._copy_perevals(
+                        connection,
+                        [pereval_list[index] for index in pending],
+                        [keys[index] for index in pending]
+                    )
+                    for index, result in zip(pending, created):
+                        results[index] = {**result, "created": True}
+            
+            logger.info(
+                f"Добавлено перевалов пакетом: {len(pending)}, "
+                f"уже сохранено ранее: {len(pereval_list) - len(pending)}"
+            )
+            return results
+        
+        except psycopg.errors.UniqueViolation as e:
+            if not idempotency_keys:
+                logger.error(f"Ошибка при пакетном добавлении перевалов: {e}")
+                return None
+            # Параллельный повтор с тем же ключом успел сохранить пакет первым
+            try:
+                async with self.pool.connection() as connection:
+                    existing = await self._find_by_idempotency_keys(connection, emails, keys)
+            except psycopg.Error as e:
+                logger.error(f"Ошибка при поиске повтора пакета: {e}")
+                return None
+            if not all(key in existing for key in keys):
+                logger.error(f"Ошибка при пакетном добавлении перевалов: {e}")
+                return None
+            return [{**existing[key], "created": False} for key in keys]
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при пакетном добавлении перевалов: {e}")
+            return None
+        except (ValueError, KeyError) as e:
+            logger.error(f"Ошибка в данных перевалов: {e}")
+            return None
+    
+    async def get_pereval_by_id(self, pereval_id: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Получение данных о перевале по ID
+        
+        Args:
+            pereval_id: ID перевала
+            fields: Имена возвращаемых полей (queries.PEREVAL_FIELDS), по умолчанию все
+        
+        Returns:
+            Dict: Данные о перевале или None
+        
+        Raises:
+            ValueError: Если запрошено неизвестное поле
+        """
+        if not self.pool:
+            return None
+        
+        sql = queries.select_pereval_fields(tuple(fields)) if fields else queries.SELECT_PEREVAL_BY_ID
+        if self.partition_map:
+            # Границы месяца в тексте запроса: план читает только секции, где может быть перевал
+            sql = queries.date_added_bounds(sql, *self.partition_map.bounds(pereval_id))
+        
+        if self.cache:
+            cached = await self.cache.get(pereval_id)
+            if cached is not None:
+                if fields:
+                    return {name: cached[name] for name in dict.fromkeys(('id',) + tuple(fields))}
+                return cached
+        
+        try:
+            async with self._read_connection() as connection:
+                cursor = await connection.execute(sql, (pereval_id,), prepare=True)
+                result = await cursor.fetchone()
+            
+            if result and not fields and self.cache:
+                await self.cache.set(pereval_id, result)
+            return result
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении перевала: {e}")
+            return None
+    
+    async def update_pereval(
+        self,
+        pereval_id: int,
+        changes: dict,
+        expected_version: Optional[int] = None
+    ) -> dict:
+        """
+        Частичное обновление существующего перевала
+        
+        Записываются только переданные поля. Изображения заменяются, только
+        если передан ключ images, иначе остаются нетронутыми. Статус и версия
+        проверяются в условии самого UPDATE, поэтому изменение, сделанное
+        модератором параллельно, не будет перезаписано.
+        
+        Args:
+            pereval_id: ID перевала для обновления
+            changes: Изменяемые поля перевала
+            expected_version: Версия, которую редактирует клиент (If-Match);
+                None - без проверки версии
+        
+        Returns:
+            Dict: Результат обновления с state и message, новой version при
+                успехе или reason (not_found, not_new, version_mismatch) при отказе
+        """
+        if not self.pool:
+            return {"state": 0, "message": "Нет подключения к базе данных"}
+        
+        try:
+            images = queries.decode_images(changes) if 'images' in changes else None
+            
+            async with self.pool.connection() as connection:
+                refs = None
+                if images is not None:
+                    # Заменяем изображения; при отказе транзакция откатывается вместе с удалением
+                    await connection.execute(queries.DELETE_PEREVAL_IMAGES, (pereval_id,))
+                    cursor = await connection.execute(queries.SELECT_FILE_IMAGE_REFS, (pereval_id,))
+                    file_refs = await cursor.fetchall()
+                    image_ids = await self._next_image_ids(connection, len(images))
+                    refs = file_refs + queries.image_refs(image_ids, images)
+                
+                query = queries.update_pereval_query(pereval_id, changes, refs, expected_version)
+                if query is None:
+                    return {"state": 0, "message": "Нет данных для обновления"}
+                cursor = await connection.execute(*query, prepare=True)
+                row = await cursor.fetchone()
+                
+                if row is None:
+                    await connection.rollback()
+                    cursor = await connection.execute(queries.SELECT_PEREVAL_STATUS, (pereval_id,))
+                    return self._update_refused(pereval_id, await cursor.fetchone())
+                
+                if images is not None:
+                    await self._insert_images(connection, pereval_id, image_ids, images)
+            
+            await self._invalidate(pereval_id)
+            logger.info(f"Обновлен перевал с ID: {pereval_id}")
+            return {"state": 1, "message": "Запись успешно обновлена", "version": row['version']}
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при обновлении перевала: {e}")
+            return {"state": 0, "message": f"Ошибка базы данных: {str(e)}"}
+        except (ValueError, KeyError) as e:
+            logger.error(f"Ошибка в данных перевала: {e}")
+            return {"state": 0, "message": f"Ошибка в данных: {str(e)}"}
+    
+    @staticmethod
+    def _update_refused(pereval_id: int, current: Optional[Dict[str, Any]]) -> dict:
+        """
+        Причина отказа в обновлении перевала
+        
+        Args:
+            pereval_id: ID перевала
+            current: Текущие status и version перевала или None
+        
+        Returns:
+            Dict: state 0, message и reason
+        """
+        if current is None:
+            return {"state": 0, "message": f"Перевал с ID {pereval_id} не найден", "reason": "not_found"}
+        if current['status'] != 'new':
+            return {
+                "state": 0,
+                "message": f"Перевал с ID {pereval_id} уже был обработан модератором",
+                "reason": "not_new"
+            }
+        return {
+            "state": 0,
+            "message": f"Перевал с ID {pereval_id} изменен другим запросом, текущая версия {current['version']}",
+            "reason": "version_mismatch",
+            "version": current['version']
+        }
+    
+    async def add_pereval_image(self, pereval_id: int, title: Optional[str], img_path: str) -> dict:
+        """
+        Добавление изображения, сохраненного в файл, к перевалу
+        
+        Args:
+            pereval_id: ID перевала
+            title: Название изображения
+            img_path: Путь к файлу в хранилище изображений
+        
+        Returns:
+            Dict: Результат с state, message и id изображения
+        """
+        if not self.pool:
+            return {"state": 0, "message": "Нет подключения к базе данных"}
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.INSERT_FILE_IMAGE, (title, img_path, pereval_id))
+                row = await cursor.fetchone()
+                if row:
+                    await self._invalidate(pereval_id)
+                    logger.info(f"Добавлено изображение {row['id']} к перевалу {pereval_id}")
+                    return {"state": 1, "message": "Изображение загружено", "id": row['id']}
+                
+                cursor = await connection.execute(queries.SELECT_PEREVAL_STATUS, (pereval_id,))
+                if not await cursor.fetchone():
+                    return {"state": 0, "message": f"Перевал с ID {pereval_id} не найден"}
+                return {"state": 0, "message": f"Перевал с ID {pereval_id} уже был обработан модератором"}
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при добавлении изображения: {e}")
+            return {"state": 0, "message": f"Ошибка базы данных: {str(e)}"}
+    
+    async def get_pereval_image(self, pereval_id: int, image_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение сведений об изображении без его данных
+        
+        Args:
+            pereval_id: ID перевала
+            image_id: ID изображения
+        
+        Returns:
+            Dict: id, title, img_path, size (для данных в БД) и первые байты head
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.SELECT_IMAGE, (image_id, pereval_id))
+                return await cursor.fetchone()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении изображения: {e}")
+            return None
+    
+    async def read_image_chunk(self, image_id: int, offset: int, length: int) -> bytes:
+        """
+        Чтение части изображения, хранящегося в БД
+        
+        Args:
+            image_id: ID изображения
+            offset: Смещение первого байта (с нуля)
+            length: Количество байт
+        
+        Returns:
+            bytes: Данные части изображения
+        """
+        async with self.pool.connection() as connection:
+            cursor = await connection.execute(queries.SELECT_IMAGE_CHUNK, (offset + 1, length, image_id))
+            row = await cursor.fetchone()
+            return row['chunk'] if row else b''
+    
+    async def get_pereval_by_user_email(
+        self,
+        email: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Получение страницы перевалов пользователя по email
+        
+        Args:
+            email: Email пользователя
+            limit: Размер страницы
+            cursor: Курсор, полученный с предыдущей страницей
+            status: Фильтр по статусу модерации
+            date_from: Начало периода по date_added (включительно)
+            date_to: Конец периода по date_added (не включительно)
+            fields: Имена возвращаемых полей, по умолчанию все
+        
+        Returns:
+            Tuple: Список перевалов и курсор следующей страницы (None, если это последняя)
+        
+        Raises:
+            ValueError: Если курсор или поля некорректны
+        """
+        if not self.pool:
+            return [], None
+        
+        after = queries.decode_cursor(cursor) if cursor else None
+        # Запрашиваем на одну строку больше, чтобы узнать о следующей странице
+        sql, params = queries.pereval_page_query(
+            email, limit + 1,
+            fields=tuple(fields) if fields else None,
+            status=status, date_from=date_from, date_to=date_to, after=after
+        )
+        
+        try:
+            async with self._read_connection() as connection:
+                db_cursor = await connection.execute(sql, params)
+                rows = await db_cursor.fetchall()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении перевалов пользователя: {e}")
+            return [], None
+        
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, queries.encode_cursor(rows[-1])
+        return rows, None
+    
+    async def search_pereval(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        near: Optional[Tuple[float, float]] = None,
+        radius: Optional[float] = None,
+        q: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> list:
+        """
+        Поиск перевалов по названию, области карты или рядом с точкой
+        
+        Args:
+            limit: Максимальное количество перевалов
+            offset: Количество пропускаемых перевалов
+            bbox: (min_lon, min_lat, max_lon, max_lat)
+            near: (широта, долгота) центра поиска, результаты по возрастанию расстояния
+            radius: Радиус поиска вокруг near в метрах
+            q: Строка поиска по названиям, результаты по убыванию релевантности
+            status: Фильтр по статусу модерации
+        
+        Returns:
+            List: Краткие данные о перевалах (с distance в метрах для near
+                и score для q)
+        """
+        if not self.pool:
+            return []
+        
+        sql, params = queries.search_query(
+            limit,
+            offset,
+            bbox=bbox,
+            near=near,
+            radius=radius,
+            q=q,
+            trigram=self.trigram,
+            status=status
+        )
+        
+        try:
+            async with self._read_connection() as connection:
+                cursor = await connection.execute(sql, params)
+                return await cursor.fetchall()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при поиске перевалов: {e}")
+            return []
+    
+    async def get_area(self, area_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение района по ID
+        
+        Args:
+            area_id: ID района
+        
+        Returns:
+            Dict: id, id_parent и title района или None
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self._read_connection() as connection:
+                cursor = await connection.execute(queries.SELECT_AREA, (area_id,))
+                return await cursor.fetchone()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении района: {e}")
+            return None
+    
+    async def get_pereval_by_area(self, area_id: int, limit: int = 50, cursor: Optional[int] = None) -> Tuple[list, Optional[int]]:
+        """
+        Получение страницы перевалов района, включая вложенные районы
+        
+        Args:
+            area_id: ID района
+            limit: Размер страницы
+            cursor: ID последнего перевала предыдущей страницы
+        
+        Returns:
+            Tuple: Список перевалов (новые сначала) и курсор следующей страницы
+        """
+        if not self.pool:
+            return [], None
+        
+        # Запрашиваем на одну строку больше, чтобы узнать о следующей странице
+        params = (area_id, cursor if cursor is not None else 2 ** 31, limit + 1)
+        
+        try:
+            async with self._read_connection() as connection:
+                db_cursor = await connection.execute(queries.SELECT_AREA_PEREVAL_PAGE, params)
+                rows = await db_cursor.fetchall()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении перевалов района: {e}")
+            return [], None
+        
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]['id']
+        return rows, None
+    
+    async def get_changes(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fields: Sequence[str] = queries.SUMMARY_FIELDS,
+        email: Optional[str] = None
+    ) -> Tuple[list, list, Optional[str], bool]:
+        """
+        Получение перевалов, измененных после курсора синхронизации
+        
+        Добавление, редактирование и смена статуса отмечаются в change_xid
+        триггером, поэтому в выдачу попадает любое изменение записи. В
+        секционированной базе в ту же страницу попадают перевалы, удаленные
+        архивацией старых секций (pereval_archived).
+        
+        Args:
+            cursor: Курсор из предыдущей синхронизации или None для первой
+            limit: Размер страницы
+            fields: Поля перевала в ответе
+            email: Ограничить перевалами пользователя
+        
+        Returns:
+            Tuple: Измененные перевалы, ID удаленных перевалов, курсор для
+                следующего запроса и признак того, что есть еще изменения
+        
+        Raises:
+            ValueError: Если курсор или поля некорректны
+        """
+        if not self.pool:
+            return [], [], cursor, False
+        
+        change_xid, last_id = queries.decode_sync_cursor(cursor)
+        sql = queries.sync_query(tuple(fields), email)
+        params = [change_xid, last_id] + ([email] if email else []) + [limit + 1]
+        
+        try:
+            async with self._read_connection() as connection:
+                db_cursor = await connection.execute(sql, params)
+                rows = await db_cursor.fetchall()
+                archived = []
+                if self.partitioned:
+                    db_cursor = await connection.execute(queries.sync_archived_query(email), params)
+                    archived = await db_cursor.fetchall()
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при получении изменений: {e}")
+            return [], [], cursor, False
+        
+        # Изменения и удаления выдаются в общем порядке (change_xid, id)
+        changes = sorted(
+            [(row, False) for row in rows] + [(row, True) for row in archived],
+            key=lambda change: (int(change[0]['change_xid']), change[0]['id'])
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        if changes:
+            cursor = queries.encode_sync_cursor(changes[-1][0])
+        
+        rows, archived = [], []
+        for row, is_archived in changes:
+            if is_archived:
+                archived.append(row['id'])
+            else:
+                del row['change_xid']
+                rows.append(row)
+        return rows, archived, cursor, has_more
+    
+    async def claim_pereval(self, moderator: str, limit: int) -> Optional[list]:
+        """
+        Закрепление новых перевалов за модератором
+        
+        Перевалы переводятся из new в pending атомарно; записи, которые
+        одновременно забирает другой модератор, пропускаются (SKIP LOCKED).
+        
+        Args:
+            moderator: Имя или email модератора
+            limit: Максимальное количество перевалов
+        
+        Returns:
+            List: Краткие данные закрепленных перевалов или None в случае ошибки
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.CLAIM_PEREVAL, (limit, moderator))
+                pereval_list = await cursor.fetchall()
+            
+            pereval_list.sort(key=lambda pereval_data: pereval_data['id'])
+            logger.info(f"Модератор {moderator} взял на проверку {len(pereval_list)} перевалов")
+            return pereval_list
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при закреплении перевалов: {e}")
+            return None
+    
+    async def resolve_claim(self, pereval_id: int, moderator: str, status: str) -> Optional[bool]:
+        """
+        Решение модератора по закрепленному за ним перевалу
+        
+        Args:
+            pereval_id: ID перевала
+            moderator: Модератор, за которым закреплен перевал
+            status: Итоговый статус ('accepted' или 'rejected')
+        
+        Returns:
+            bool: True если статус обновлен, False если перевал не закреплен
+                за модератором, None в случае ошибки
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.RESOLVE_CLAIM, (status, pereval_id, moderator))
+                row = await cursor.fetchone()
+            
+            if row is None:
+                return False
+            await self._invalidate(pereval_id)
+            logger.info(f"Модератор {moderator} перевел перевал {pereval_id} в статус {status}")
+            return True
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при обновлении статуса: {e}")
+            return None
+    
+    async def reclaim_stale_claims(self, older_than: float) -> Optional[List[int]]:
+        """
+        Возврат в очередь перевалов, которые слишком долго на проверке
+        
+        Args:
+            older_than: Время закрепления в секундах, после которого перевал
+                снова становится new
+        
+        Returns:
+            List[int]: ID возвращенных перевалов или None в случае ошибки
+        """
+        if not self.pool:
+            return None
+        
+        try:
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(queries.RECLAIM_STALE_CLAIMS, (older_than,))
+                pereval_ids = sorted(row['id'] for row in await cursor.fetchall())
+            
+            if pereval_ids:
+                logger.info(f"Возвращено в очередь модерации {len(pereval_ids)} перевалов")
+            return pereval_ids
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при возврате перевалов в очередь: {e}")
+            return None
+    
+    async def update_pereval_status(self, pereval_id: int, status: str) -> bool:
+        """
+        Обновление статуса модерации перевала
+        
+        Args:
+            pereval_id: ID перевала
+            status: Новый статус ('new', 'pending', 'accepted', 'rejected')
+        
+        Returns:
+            bool: True если обновление успешно
+        """
+        if not self.pool:
+            return False
+        
+        try:
+            async with self.pool.connection() as connection:
+                await connection.execute(queries.UPDATE_PEREVAL_STATUS, (status, pereval_id))
+            
+            await self._invalidate(pereval_id)
+            logger.info(f"Статус перевала {pereval_id} обновлен на {status}")
+            return True
+        
+        except psycopg.Error as e:
+            logger.error(f"Ошибка при обновлении статуса: {e}")
+            return False
@@ -0,0 +1,295 @@
+"""
+Кэш записей о перевалах
+Локальный LRU-кэш со сроком жизни или общий кэш в Redis
+"""
+
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, Tuple
+import orjson
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Статусы, после которых запись не меняется и ее можно кэшировать
+CACHEABLE_STATUSES = frozenset(('accepted', 'rejected'))
+
+
+def pereval_etag(version: int, fields: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    ETag для данных о перевале
+    
+    Тег строится из поля version, которое увеличивается при каждом изменении
+    записи, поэтому тот же тег принимается в If-Match при редактировании.
+    
+    Args:
+        version: Версия перевала
+        fields: Выбранные поля или None для полного представления
+    
+    Returns:
+        str: Слабый ETag: W/"<version>" или W/"<version>-<поля>" для выборки полей
+    """
+    if not fields:
+        return f'W/"{version}"'
+    selection = hashlib.blake2b(','.join(fields).encode(), digest_size=4).hexdigest()
+    return f'W/"{version}-{selection}"'
+
+
+def dump_row(row: Dict[str, Any]) -> bytes:
+    """
+    Сериализация записи о перевале в JSON для общего кэша
+    
+    Даты и Decimal (numeric) сохраняются строками, а их типы - отдельно,
+    чтобы при чтении вернуть запись в том же виде, что и из БД.
+    
+    Args:
+        row: Данные о перевале
+    
+    Returns:
+        bytes: JSON в UTF-8
+    """
+    values = {}
+    types = {}
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            types[key] = 'datetime'
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            types[key] = 'decimal'
+            value = str(value)
+        values[key] = value
+    return orjson.dumps({'row': values, 'types': types})
+
+
+def load_row(data: bytes) -> Dict[str, Any]:
+    """
+    Чтение записи, сохраненной dump_row
+    
+    Args:
+        data: JSON из общего кэша
+    
+    Returns:
+        Dict: Данные о перевале
+    """
+    value = orjson.loads(data)
+    row = value['row']
+    for key, kind in value['types'].items():
+        row[key] = datetime.fromisoformat(row[key]) if kind == 'datetime' else Decimal(row[key])
+    return row
+
+
+class LRUCacheBackend:
+    """Кэш в памяти процесса с вытеснением давно неиспользуемых записей"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Args:
+            max_size: Максимальное количество записей
+            ttl: Срок жизни записи в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Получение значения или None, если его нет или срок истек"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: Any):
+        """Сохранение значения с вытеснением самой старой записи"""
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+    
+    async def delete(self, key: str):
+        """Удаление значения"""
+        self._items.pop(key, None)
+    
+    def size(self) -> int:
+        """Текущее количество записей"""
+        return len(self._items)
+    
+    async def close(self):
+        """Освобождение ресурсов (для совместимости с общими кэшами)"""
+        self._items.clear()
+
+
+class RedisCacheBackend:
+    """
+    Общий кэш в Redis для нескольких процессов API
+    
+    Записи хранятся в JSON (dump_row), а не pickle: чтение из общего Redis
+    не должно исполнять код.
+    """
+    
+    def __init__(self, url: str, ttl: float):
+        """
+        Args:
+            url: Адрес Redis, например redis://localhost:6379/0
+            ttl: Срок жизни записи в секундах
+        """
+        import redis.asyncio as redis
+        
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Получение записи или None"""
+        value = await self.client.get(key)
+        return load_row(value) if value is not None else None
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Сохранение записи со сроком жизни"""
+        await self.client.set(key, dump_row(value), ex=max(1, int(self.ttl)))
+    
+    async def delete(self, key: str):
+        """Удаление значения"""
+        await self.client.delete(key)
+    
+    def size(self) -> Optional[int]:
+        """Размер общего кэша не отслеживается"""
+        return None
+    
+    async def close(self):
+        """Закрытие подключения к Redis"""
+        await self.client.aclose()
+
+
+class PerevalCache:
+    """Кэш перевалов по ID со статистикой попаданий"""
+    
+    def __init__(self, backend):
+        """
+        Args:
+            backend: LRUCacheBackend или RedisCacheBackend
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+    
+    @classmethod
+    def from_env(cls) -> Optional['PerevalCache']:
+        """
+        Создание кэша по переменным окружения
+        
+        FSTR_CACHE_SIZE - размер локального кэша (0 отключает кэш),
+        FSTR_CACHE_TTL - срок жизни записи в секундах,
+        FSTR_CACHE_URL - адрес Redis для общего кэша.
+        
+        Returns:
+            PerevalCache: Кэш или None, если он отключен
+        """
+        size = int(os.getenv('FSTR_CACHE_SIZE', '1000'))
+        ttl = float(os.getenv('FSTR_CACHE_TTL', '300'))
+        url = os.getenv('FSTR_CACHE_URL')
+        
+        if url:
+            try:
+                return cls(RedisCacheBackend(url, ttl))
+            except ImportError:
+                logger.error("Пакет redis не установлен, используется локальный кэш")
+        
+        if size <= 0:
+            return None
+        return cls(LRUCacheBackend(size, ttl))
+    
+    @staticmethod
+    def _key(pereval_id: int) -> str:
+        return f"pereval:{pereval_id}"
+    
+    async def get(self, pereval_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение перевала из кэша
+        
+        Args:
+            pereval_id: ID перевала
+        
+        Returns:
+            Dict: Копия данных о перевале или None при промахе
+        """
+        try:
+            value = await self.backend.get(self._key(pereval_id))
+        except Exception as e:
+            # Недоступность общего кэша не должна ломать чтение из БД
+            self.errors += 1
+            logger.error(f"Ошибка чтения из кэша: {e}")
+            value = None
+        
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(value)
+    
+    async def set(self, pereval_id: int, pereval_data: Dict[str, Any]):
+        """
+        Сохранение перевала, если его статус окончательный
+        
+        Args:
+            pereval_id: ID перевала
+            pereval_data: Полные данные о перевале
+        """
+        if pereval_data.get('status') not in CACHEABLE_STATUSES:
+            return
+        try:
+            await self.backend.set(self._key(pereval_id), dict(pereval_data))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи в кэш: {e}")
+    
+    async def invalidate(self, pereval_id: int):
+        """
+        Удаление перевала из кэша после изменения
+        
+        Args:
+            pereval_id: ID перевала
+        """
+        self.invalidations += 1
+        try:
+            await self.backend.delete(self._key(pereval_id))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка удаления из кэша: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика кэша
+        
+        Returns:
+            Dict: Попадания, промахи, инвалидации, ошибки и размер
+        """
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "size": self.backend.size(),
+        }
+    
+    async def close(self):
+        """Закрытие кэша"""
+        await self.backend.close()
@@ -4,14 +4,19 @@
 """
 
 import os
-import json
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Optional, Dict, Any, List
-from datetime import datetime
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.extras import RealDictCursor, execute_batch
 from dotenv import load_dotenv
 
+from database import queries
+from metrics import instrument
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -20,8 +25,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@instrument(exclude=('connect', 'disconnect', 'get_connection', 'pool_stats'))
 class DatabaseManager:
-    """Класс для управления подключением и операциями с базой данных"""
+    """
+    Класс для управления подключением и операциями с базой данных
+    
+    Синхронная версия для скриптов; API использует AsyncDatabaseManager
+    """
     
     def __init__(self):
         """Инициализация подключения к БД через переменные окружения"""
@@ -30,17 +40,32 @@ class DatabaseManager:
         self.login = os.getenv('FSTR_DB_LOGIN', 'postgres')
         self.password = os.getenv('FSTR_DB_PASS', 'password')
         self.database = os.getenv('FSTR_DB_NAME', 'pereval')
-        self.connection = None
+        self.pool_min = int(os.getenv('FSTR_DB_POOL_MIN', '1'))
+        self.pool_max = int(os.getenv('FSTR_DB_POOL_MAX', '10'))
+        # Ожидание свободного соединения в секундах, когда все заняты
+        self.pool_timeout = float(os.getenv('FSTR_DB_POOL_TIMEOUT', '30'))
+        self.pool = None
+        # ThreadedConnectionPool не ждет свободное соединение, а сразу бросает PoolError
+        self._slots = None
+        
+        # Счетчики для статистики пула
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._recycled = 0
+        self._exhausted = 0
     
     def connect(self) -> bool:
         """
-        Установка подключения к базе данных
+        Создание пула подключений к базе данных
         
         Returns:
             bool: True если подключение успешно, False в противном случае
         """
         try:
-            self.connection = psycopg2.connect(
+            self.pool = pool.ThreadedConnectionPool(
+                self.pool_min,
+                self.pool_max,
                 host=self.host,
                 port=self.port,
                 user=self.login,
@@ -48,18 +73,140 @@ class DatabaseManager:
                 database=self.database,
                 cursor_factory=RealDictCursor
             )
-            logger.info("Успешное подключение к базе данных")
+            self._slots = threading.BoundedSemaphore(self.pool_max)
+            logger.info(
+                f"Успешное подключение к базе данных "
+                f"(пул: {self.pool_min}-{self.pool_max})"
+            )
             return True
         except psycopg2.Error as e:
             logger.error(f"Ошибка подключения к базе данных: {e}")
             return False
     
     def disconnect(self):
-        """Закрытие подключения к базе данных"""
-        if self.connection:
-            self.connection.close()
+        """Закрытие всех подключений пула"""
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
             logger.info("Подключение к базе данных закрыто")
     
+    def _is_broken(self, connection) -> bool:
+        """Проверка, что соединение закрыто или находится в неизвестном состоянии"""
+        return bool(connection.closed) or \
+            connection.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN
+    
+    @contextmanager
+    def get_connection(self):
+        """
+        Получение соединения из пула на время одной операции
+        
+        Если все соединения заняты, ожидает свободное до pool_timeout секунд.
+        Сломанные соединения закрываются и заменяются новыми, незавершенная
+        транзакция откатывается перед возвратом соединения в пул.
+        
+        Yields:
+            connection: Соединение psycopg2 с RealDictCursor
+        
+        Raises:
+            pool.PoolError: Если свободное соединение не появилось за pool_timeout
+        """
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            with self._stats_lock:
+                self._exhausted += 1
+            logger.error(
+                f"Пул подключений исчерпан: все {self.pool_max} соединений заняты "
+                f"дольше {self.pool_timeout} с"
+            )
+            raise pool.PoolError("Нет свободного соединения в пуле")
+        
+        try:
+            connection = self.pool.getconn()
+            if self._is_broken(connection):
+                self.pool.putconn(connection, close=True)
+                with self._stats_lock:
+                    self._recycled += 1
+                connection = self.pool.getconn()
+        except psycopg2.Error:
+            self._slots.release()
+            raise
+        
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+        
+        broken = False
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            broken = broken or self._is_broken(connection)
+            if not broken and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self.pool.putconn(connection, close=broken)
+            self._slots.release()
+            with self._stats_lock:
+                self._in_use -= 1
+                if broken:
+                    self._recycled += 1
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Статистика пула подключений
+        
+        Returns:
+            Dict: Размеры пула, число занятых соединений и счетчики
+        """
+        with self._stats_lock:
+            return {
+                "min": self.pool_min,
+                "max": self.pool_max,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "recycled": self._recycled,
+                "exhausted": self._exhausted,
+            }
+    
+    def health_check(self) -> bool:
+        """
+        Проверка доступности базы данных через соединение из пула
+        
+        Returns:
+            bool: True если база данных отвечает
+        """
+        if not self.pool:
+            return False
+        
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            return True
+        except psycopg2.Error as e:
+            logger.error(f"Ошибка проверки подключения к БД: {e}")
+            return False
+    
+    def _next_image_ids(self, cursor, count: int) -> List[int]:
+        """Выделение ID для новых строк pereval_images"""
+        if not count:
+            return []
+        cursor.execute(queries.NEXT_IMAGE_IDS, (count,))
+        return [row['id'] for row in cursor.fetchall()]
+    
+    def _insert_images(self, cursor, pereval_id: int, image_ids: List[int], images: list):
+        """Сохранение изображений перевала в pereval_images"""
+        if not images:
+            return
+        execute_batch(cursor, queries.INSERT_IMAGE, [
+            (image_id, pereval_id, psycopg2.Binary(data), title)
+            for image_id, (title, data) in zip(image_ids, images)
+        ])
+    
     def get_or_create_user(self, user_data: Dict[str, Any]) -> Optional[int]:
         """
         Получение существующего пользователя или создание нового
@@ -70,44 +217,34 @@ class DatabaseManager:
         Returns:
             int: ID пользователя или None в случае ошибки
         """
-        if not self.connection:
+        if not self.pool:
             logger.error("Нет подключения к базе данных")
             return None
         
         try:
-            with self.connection.cursor() as cursor:
-                # Проверяем, существует ли пользователь с таким email
-                cursor.execute(
-                    "SELECT id FROM pereval_users WHERE email = %s",
-                    (user_data['email'],)
-                )
-                existing_user = cursor.fetchone()
-                
-                if existing_user:
-                    logger.info(f"Найден существующий пользователь с ID: {existing_user['id']}")
-                    return existing_user['id']
-                
-                # Создаем нового пользователя
-                cursor.execute("""
-                    INSERT INTO pereval_users (email, phone, fam, name, otc)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (
-                    user_data['email'],
-                    user_data['phone'],
-                    user_data['fam'],
-                    user_data['name'],
-                    user_data.get('otc', '')
-                ))
-                
-                user_id = cursor.fetchone()['id']
-                self.connection.commit()
-                logger.info(f"Создан новый пользователь с ID: {user_id}")
-                return user_id
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    # Проверяем, существует ли пользователь с таким email
+                    cursor.execute(
+                        queries.SELECT_USER_ID_BY_EMAIL,
+                        (user_data['email'],)
+                    )
+                    existing_user = cursor.fetchone()
+                    
+                    if existing_user:
+                        logger.info(f"Найден существующий пользователь с ID: {existing_user['id']}")
+                        return existing_user['id']
+                    
+                    # Создаем нового пользователя
+                    cursor.execute(queries.INSERT_USER, queries.user_values(user_data))
+                    
+                    user_id = cursor.fetchone()['id']
+                    connection.commit()
+                    logger.info(f"Создан новый пользователь с ID: {user_id}")
+                    return user_id
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при работе с пользователем: {e}")
-            self.connection.rollback()
             return None
     
     def add_pereval(self, pereval_data: Dict[str, Any]) -> Optional[int]:
@@ -120,63 +257,33 @@ class DatabaseManager:
         Returns:
             int: ID добавленного перевала или None в случае ошибки
         """
-        if not self.connection:
+        if not self.pool:
             logger.error("Нет подключения к базе данных")
             return None
         
         try:
-            with self.connection.cursor() as cursor:
-                # Получаем или создаем пользователя
-                user_id = self.get_or_create_user(pereval_data['user'])
-                if not user_id:
-                    return None
-                
-                # Подготавливаем данные для вставки
-                add_time = None
-                if pereval_data.get('add_time'):
-                    try:
-                        add_time = datetime.strptime(pereval_data['add_time'], '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        add_time = datetime.now()
-                else:
-                    add_time = datetime.now()
-                
-                # Вставляем данные о перевале
-                cursor.execute("""
-                    INSERT INTO pereval_added (
-                        beauty_title, title, other_titles, connect, add_time,
-                        user_id, latitude, longitude, height,
-                        level_winter, level_summer, level_autumn, level_spring,
-                        raw_data, images
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    ) RETURNING id
-                """, (
-                    pereval_data.get('beauty_title', ''),
-                    pereval_data['title'],
-                    pereval_data.get('other_titles', ''),
-                    pereval_data.get('connect', ''),
-                    add_time,
-                    user_id,
-                    float(pereval_data['coords']['latitude']),
-                    float(pereval_data['coords']['longitude']),
-                    int(pereval_data['coords']['height']),
-                    pereval_data.get('level', {}).get('winter', ''),
-                    pereval_data.get('level', {}).get('summer', ''),
-                    pereval_data.get('level', {}).get('autumn', ''),
-                    pereval_data.get('level', {}).get('spring', ''),
-                    json.dumps(pereval_data, ensure_ascii=False),
-                    json.dumps(pereval_data.get('images', []), ensure_ascii=False)
-                ))
-                
-                pereval_id = cursor.fetchone()['id']
-                self.connection.commit()
-                logger.info(f"Добавлен перевал с ID: {pereval_id}")
-                return pereval_id
+            images = queries.decode_images(pereval_data)
+            
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    # Пользователь, перевал и изображения сохраняются одной транзакцией
+                    image_ids = self._next_image_ids(cursor, len(images))
+                    params = queries.submit_values(pereval_data, queries.image_refs(image_ids, images))
+                    cursor.execute(queries.INSERT_PEREVAL_WITH_USER, params)
+                    row = cursor.fetchone()
+                    if row is None:
+                        # Пользователь создан параллельно, повторяем с его ID
+                        cursor.execute(queries.INSERT_PEREVAL_WITH_USER, params)
+                        row = cursor.fetchone()
+                    
+                    pereval_id = row['id']
+                    self._insert_images(cursor, pereval_id, image_ids, images)
+                    connection.commit()
+                    logger.info(f"Добавлен перевал с ID: {pereval_id}")
+                    return pereval_id
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при добавлении перевала: {e}")
-            self.connection.rollback()
             return None
         except (ValueError, KeyError) as e:
             logger.error(f"Ошибка в данных перевала: {e}")
@@ -192,20 +299,16 @@ class DatabaseManager:
         Returns:
             Dict: Данные о перевале или None
         """
-        if not self.connection:
+        if not self.pool:
             return None
         
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT p.*, u.email, u.phone, u.fam, u.name, u.otc
-                    FROM pereval_added p
-                    JOIN pereval_users u ON p.user_id = u.id
-                    WHERE p.id = %s
-                """, (pereval_id,))
-                
-                result = cursor.fetchone()
-                return dict(result) if result else None
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(queries.SELECT_PEREVAL_BY_ID, (pereval_id,))
+                    
+                    result = cursor.fetchone()
+                    return dict(result) if result else None
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при получении перевала: {e}")
@@ -222,79 +325,40 @@ class DatabaseManager:
         Returns:
             Dict: Результат обновления с state и message
         """
-        if not self.connection:
+        if not self.pool:
             return {"state": 0, "message": "Нет подключения к базе данных"}
         
         try:
-            with self.connection.cursor() as cursor:
-                # Проверяем, существует ли перевал и его статус
-                cursor.execute("""
-                    SELECT status FROM pereval_added WHERE id = %s
-                """, (pereval_id,))
-                
-                result = cursor.fetchone()
-                if not result:
-                    return {"state": 0, "message": f"Перевал с ID {pereval_id} не найден"}
-                
-                if result['status'] != 'new':
-                    return {"state": 0, "message": f"Перевал с ID {pereval_id} уже был обработан модератором"}
-                
-                # Подготавливаем данные для обновления
-                add_time = None
-                if pereval_data.get('add_time'):
-                    try:
-                        from datetime import datetime
-                        add_time = datetime.strptime(pereval_data['add_time'], '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        add_time = datetime.now()
-                else:
-                    from datetime import datetime
-                    add_time = datetime.now()
-                
-                # Обновляем данные о перевале
-                import json
-                cursor.execute("""
-                    UPDATE pereval_added SET
-                        beauty_title = %s,
-                        title = %s,
-                        other_titles = %s,
-                        connect = %s,
-                        add_time = %s,
-                        latitude = %s,
-                        longitude = %s,
-                        height = %s,
-                        level_winter = %s,
-                        level_summer = %s,
-                        level_autumn = %s,
-                        level_spring = %s,
-                        raw_data = %s,
-                        images = %s
-                    WHERE id = %s
-                """, (
-                    pereval_data.get('beauty_title', ''),
-                    pereval_data['title'],
-                    pereval_data.get('other_titles', ''),
-                    pereval_data.get('connect', ''),
-                    add_time,
-                    float(pereval_data['coords']['latitude']),
-                    float(pereval_data['coords']['longitude']),
-                    int(pereval_data['coords']['height']),
-                    pereval_data.get('level', {}).get('winter', ''),
-                    pereval_data.get('level', {}).get('summer', ''),
-                    pereval_data.get('level', {}).get('autumn', ''),
-                    pereval_data.get('level', {}).get('spring', ''),
-                    json.dumps(pereval_data, ensure_ascii=False),
-                    json.dumps(pereval_data.get('images', []), ensure_ascii=False),
-                    pereval_id
-                ))
-                
-                self.connection.commit()
-                logger.info(f"Обновлен перевал с ID: {pereval_id}")
-                return {"state": 1, "message": "Запись успешно обновлена"}
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    # Заменяем изображения и обновляем данные о перевале;
+                    # статус проверяется в условии UPDATE
+                    images = queries.decode_images(pereval_data)
+                    cursor.execute(queries.DELETE_PEREVAL_IMAGES, (pereval_id,))
+                    cursor.execute(queries.SELECT_FILE_IMAGE_REFS, (pereval_id,))
+                    file_refs = [dict(row) for row in cursor.fetchall()]
+                    image_ids = self._next_image_ids(cursor, len(images))
+                    cursor.execute(
+                        queries.UPDATE_PEREVAL,
+                        queries.pereval_values(pereval_data, file_refs + queries.image_refs(image_ids, images))
+                        + (pereval_id, None, None)
+                    )
+                    
+                    if cursor.fetchone() is None:
+                        connection.rollback()
+                        cursor.execute(queries.SELECT_PEREVAL_STATUS, (pereval_id,))
+                        if not cursor.fetchone():
+                            return {"state": 0, "message": f"Перевал с ID {pereval_id} не найден"}
+                        return {"state": 0, "message": f"Перевал с ID {pereval_id} уже был обработан модератором"}
+                    
+                    self._insert_images(cursor, pereval_id, image_ids, images)
+                    
+                    connection.commit()
+                    logger.info(f"Обновлен перевал с ID: {pereval_id}")
+                    return {"state": 1, "message": "Запись успешно обновлена"}
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при обновлении перевала: {e}")
-            self.connection.rollback()
             return {"state": 0, "message": f"Ошибка базы данных: {str(e)}"}
         except (ValueError, KeyError) as e:
             logger.error(f"Ошибка в данных перевала: {e}")
@@ -310,21 +374,16 @@ class DatabaseManager:
         Returns:
             List: Список перевалов пользователя
         """
-        if not self.connection:
+        if not self.pool:
             return []
         
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT p.*, u.email, u.phone, u.fam, u.name, u.otc
-                    FROM pereval_added p
-                    JOIN pereval_users u ON p.user_id = u.id
-                    WHERE u.email = %s
-                    ORDER BY p.date_added DESC
-                """, (email,))
-                
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(queries.SELECT_PEREVAL_BY_USER_EMAIL, (email,))
+                    
+                    results = cursor.fetchall()
+                    return [dict(row) for row in results]
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при получении перевалов пользователя: {e}")
@@ -341,22 +400,18 @@ class DatabaseManager:
         Returns:
             bool: True если обновление успешно
         """
-        if not self.connection:
+        if not self.pool:
             return False
         
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    UPDATE pereval_added 
-                    SET status = %s 
-                    WHERE id = %s
-                """, (status, pereval_id))
-                
-                self.connection.commit()
-                logger.info(f"Статус перевала {pereval_id} обновлен на {status}")
-                return True
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(queries.UPDATE_PEREVAL_STATUS, (status, pereval_id))
+                    
+                    connection.commit()
+                    logger.info(f"Статус перевала {pereval_id} обновлен на {status}")
+                    return True
                 
         except psycopg2.Error as e:
             logger.error(f"Ошибка при обновлении статуса: {e}")
-            self.connection.rollback()
             return False
@@ -0,0 +1,251 @@
+"""
+Файловое хранилище изображений перевалов
+Изображения пишутся и читаются частями, чтобы не держать их в памяти целиком
+"""
+
+import os
+import re
+import uuid
+import mimetypes
+import logging
+from typing import Optional, AsyncIterator, Dict, List, Tuple
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart до 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Размер части при записи и чтении изображений
+CHUNK_SIZE = 256 * 1024
+
+# Запас на заголовки частей и поле title сверх размера файла в теле multipart
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Сигнатуры форматов для изображений, хранящихся в БД без имени файла
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+)
+
+
+def guess_media_type(head: bytes = b'', name: Optional[str] = None) -> str:
+    """
+    Определение MIME-типа изображения
+    
+    Args:
+        head: Первые байты изображения
+        name: Имя или путь файла
+    
+    Returns:
+        str: MIME-тип или application/octet-stream
+    """
+    if name:
+        media_type, _ = mimetypes.guess_type(name)
+        if media_type:
+            return media_type
+    for signature, media_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    return 'application/octet-stream'
+
+
+class ImageTooLargeError(ValueError):
+    """Изображение превышает допустимый размер"""
+
+
+class ImageStorage:
+    """Хранение изображений на диске, в БД сохраняется путь (img_path)"""
+    
+    def __init__(self):
+        """Инициализация каталога и ограничений через переменные окружения"""
+        self.base_dir = os.getenv('FSTR_IMAGES_DIR', 'images')
+        self.max_size = int(os.getenv('FSTR_IMAGE_MAX_SIZE', str(20 * 1024 * 1024)))
+    
+    def full_path(self, img_path: str) -> str:
+        """Абсолютный путь к файлу по значению img_path"""
+        return os.path.join(self.base_dir, img_path)
+    
+    def _new_path(self, pereval_id: int, filename: str, content_type: str) -> str:
+        suffix = os.path.splitext(filename)[1].lower()
+        if not re.fullmatch(r'\.[a-z0-9]{1,5}', suffix):
+            suffix = mimetypes.guess_extension(content_type) or ''
+        return os.path.join(str(pereval_id), f"{uuid.uuid4().hex}{suffix}")
+    
+    async def save(
+        self,
+        pereval_id: int,
+        content_type: str,
+        content_length: Optional[int],
+        stream: AsyncIterator[bytes]
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Потоковое сохранение файла из тела запроса multipart/form-data
+        
+        Тело разбирается по мере получения, файл пишется на диск частями без
+        промежуточной копии. Размер проверяется по Content-Length до чтения
+        тела и по полученным байтам во время чтения.
+        
+        Args:
+            pereval_id: ID перевала
+            content_type: Заголовок Content-Type запроса с boundary
+            content_length: Заголовок Content-Length или None
+            stream: Тело запроса (Request.stream())
+        
+        Returns:
+            Tuple: Путь относительно каталога хранилища для img_path и
+                поля формы (имя файла в filename)
+        
+        Raises:
+            ImageTooLargeError: Если файл больше FSTR_IMAGE_MAX_SIZE
+            ValueError: Если тело не multipart/form-data или в нем нет поля file
+        """
+        limit = self.max_size + MULTIPART_OVERHEAD
+        if content_length is not None and content_length > limit:
+            raise ImageTooLargeError(f"Размер изображения превышает {self.max_size} байт")
+        
+        media_type, options = parse_options_header(content_type)
+        boundary = options.get(b'boundary')
+        if media_type != b'multipart/form-data' or not boundary:
+            raise ValueError("Ожидается тело multipart/form-data")
+        
+        # Парсер вызывает обработчики синхронно, события обрабатываются после каждой части тела
+        events: List[Tuple[str, bytes]] = []
+        
+        def on_data(name):
+            return lambda data, start, end: events.append((name, data[start:end]))
+        
+        def on_event(name):
+            return lambda: events.append((name, b''))
+        
+        parser = MultipartParser(boundary, {
+            'on_header_field': on_data('header_field'),
+            'on_header_value': on_data('header_value'),
+            'on_header_end': on_event('header_end'),
+            'on_headers_finished': on_event('headers_finished'),
+            'on_part_data': on_data('part_data'),
+            'on_part_end': on_event('part_end'),
+            'on_end': on_event('end'),
+        })
+        
+        fields: Dict[str, str] = {}
+        headers: Dict[bytes, bytes] = {}
+        header_field = header_value = b''
+        field_name = None
+        field_value = b''
+        img_path = None
+        in_file = finished = False
+        f = None
+        received = size = 0
+        try:
+            async for chunk in stream:
+                received += len(chunk)
+                if received > limit:
+                    raise ImageTooLargeError(f"Размер изображения превышает {self.max_size} байт")
+                parser.write(chunk)
+                
+                for event, data in events:
+                    if event == 'header_field':
+                        header_field += data
+                    elif event == 'header_value':
+                        header_value += data
+                    elif event == 'header_end':
+                        headers[header_field.lower()] = header_value
+                        header_field = header_value = b''
+                    elif event == 'headers_finished':
+                        _, disposition = parse_options_header(headers.get(b'content-disposition', b''))
+                        field_name = disposition.get(b'name', b'').decode('utf-8', 'replace')
+                        filename = disposition.get(b'filename')
+                        in_file = field_name == 'file' and filename is not None and f is None
+                        if in_file:
+                            fields['filename'] = filename.decode('utf-8', 'replace')
+                            img_path = self._new_path(
+                                pereval_id,
+                                fields['filename'],
+                                headers.get(b'content-type', b'').decode('latin-1')
+                            )
+                            full_path = self.full_path(img_path)
+                            await run_in_threadpool(os.makedirs, os.path.dirname(full_path), exist_ok=True)
+                            f = open(full_path, 'wb')
+                        headers = {}
+                    elif event == 'part_data':
+                        if in_file:
+                            size += len(data)
+                            if size > self.max_size:
+                                raise ImageTooLargeError(
+                                    f"Размер изображения превышает {self.max_size} байт"
+                                )
+                            await run_in_threadpool(f.write, data)
+                        else:
+                            field_value += data
+                    elif event == 'part_end':
+                        if not in_file and field_name:
+                            fields[field_name] = field_value.decode('utf-8', 'replace')
+                        in_file = False
+                        field_name = None
+                        field_value = b''
+                    elif event == 'end':
+                        finished = True
+                events.clear()
+            
+            parser.finalize()
+            if not finished:
+                raise ValueError("Тело multipart/form-data оборвано")
+            if f is None:
+                raise ValueError("В форме нет файла в поле file")
+            f.close()
+        except BaseException:
+            if f is not None:
+                f.close()
+                self.delete(img_path)
+            raise
+        
+        logger.info(f"Сохранено изображение {img_path} ({size} байт)")
+        return img_path, fields
+    
+    def delete(self, img_path: str):
+        """Удаление файла изображения"""
+        try:
+            os.remove(self.full_path(img_path))
+        except FileNotFoundError:
+            pass
+    
+    def size(self, img_path: str) -> Optional[int]:
+        """Размер файла изображения или None, если файла нет"""
+        try:
+            return os.path.getsize(self.full_path(img_path))
+        except OSError:
+            return None
+    
+    async def iter_file(self, img_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """
+        Чтение диапазона байт файла частями
+        
+        Args:
+            img_path: Путь из img_path
+            start: Первый байт диапазона
+            end: Последний байт диапазона включительно
+        
+        Yields:
+            bytes: Части файла не больше CHUNK_SIZE
+        """
+        with open(self.full_path(img_path), 'rb') as f:
+            await run_in_threadpool(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
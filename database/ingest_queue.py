@@ -0,0 +1,347 @@
+"""
+Очередь приема перевалов с отложенной записью в PostgreSQL
+Отправки сохраняются в локальный журнал SQLite (WAL) и записываются в БД фоновым обработчиком
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any, List
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from models.pereval_models import PerevalSubmitData
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Статусы отправки в очереди
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id TEXT PRIMARY KEY,
+        email TEXT NOT NULL,
+        idempotency_key TEXT,
+        payload TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        pereval_id INTEGER,
+        duplicate_of INTEGER,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS submissions_idempotency
+        ON submissions (email, idempotency_key) WHERE idempotency_key IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS submissions_queued
+        ON submissions (created_at) WHERE status = 'queued';
+"""
+
+
+class IngestQueue:
+    """Надежная очередь отправок в файле SQLite"""
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу очереди
+        """
+        self.path = path
+        # Одно подключение на процесс, запросы к нему выполняются в пуле потоков по очереди
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        # WAL и synchronous=FULL: принятая отправка записана на диск до ответа клиенту
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(SCHEMA)
+    
+    @classmethod
+    def from_env(cls) -> Optional['IngestQueue']:
+        """
+        Создание очереди по переменной окружения FSTR_INGEST_QUEUE
+        
+        Returns:
+            IngestQueue: Очередь или None, если прием через очередь отключен
+        """
+        path = os.getenv('FSTR_INGEST_QUEUE')
+        return cls(path) if path else None
+    
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+    
+    def _enqueue(self, pereval_data: Dict[str, Any], idempotency_key: Optional[str]) -> str:
+        email = pereval_data['user']['email']
+        now = time.time()
+        with self._lock:
+            if idempotency_key:
+                row = self._connection.execute(
+                    "SELECT id FROM submissions WHERE email = ? AND idempotency_key = ?",
+                    (email, idempotency_key)
+                ).fetchone()
+                if row:
+                    return row['id']
+            submission_id = uuid.uuid4().hex
+            self._connection.execute(
+                "INSERT INTO submissions (id, email, idempotency_key, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (submission_id, email, idempotency_key, json.dumps(pereval_data, ensure_ascii=False, default=str), QUEUED, now, now)
+            )
+            return submission_id
+    
+    async def enqueue(self, pereval_data: Dict[str, Any], idempotency_key: Optional[str] = None) -> str:
+        """
+        Сохранение отправки в очередь
+        
+        Args:
+            pereval_data: Проверенные данные о перевале
+            idempotency_key: Ключ повтора запроса от клиента
+        
+        Returns:
+            str: ID отправки; для повтора с тем же ключом - ID прежней отправки
+        """
+        return await run_in_threadpool(self._enqueue, pereval_data, idempotency_key)
+    
+    async def get(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Статус отправки
+        
+        Args:
+            submission_id: ID отправки
+        
+        Returns:
+            Dict: id, status, attempts, pereval_id, duplicate_of, error или None
+        """
+        rows = await run_in_threadpool(
+            self._execute,
+            "SELECT id, status, attempts, pereval_id, duplicate_of, error, created_at, updated_at "
+            "FROM submissions WHERE id = ?",
+            (submission_id,)
+        )
+        return dict(rows[0]) if rows else None
+    
+    async def next_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Самые старые отправки, ожидающие записи в БД
+        
+        Args:
+            limit: Максимальное количество отправок
+        
+        Returns:
+            List: Словари с id, idempotency_key, attempts и payload
+        """
+        rows = await run_in_threadpool(
+            self._execute,
+            "SELECT id, idempotency_key, attempts, payload FROM submissions "
+            "WHERE status = ? ORDER BY created_at LIMIT ?",
+            (QUEUED, limit)
+        )
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+    
+    async def mark_done(self, submission_id: str, pereval_id: int, duplicate_of: Optional[int]):
+        """Отправка записана в БД; данные из очереди больше не нужны"""
+        await run_in_threadpool(
+            self._execute,
+            "UPDATE submissions SET status = ?, pereval_id = ?, duplicate_of = ?, payload = NULL, "
+            "attempts = attempts + 1, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, pereval_id, duplicate_of, time.time(), submission_id)
+        )
+    
+    async def mark_attempt(self, submission_id: str, error: str, failed: bool = False):
+        """
+        Неудачная попытка записи в БД
+        
+        Args:
+            submission_id: ID отправки
+            error: Описание ошибки
+            failed: True - больше не пытаться, иначе отправка остается в очереди
+        """
+        await run_in_threadpool(
+            self._execute,
+            "UPDATE submissions SET status = ?, attempts = attempts + 1, error = ?, updated_at = ? WHERE id = ?",
+            (FAILED if failed else QUEUED, error, time.time(), submission_id)
+        )
+    
+    async def purge(self, older_than: float) -> int:
+        """
+        Удаление записанных отправок старше older_than секунд
+        
+        Returns:
+            int: Количество удаленных отправок
+        """
+        def purge():
+            with self._lock:
+                return self._connection.execute(
+                    "DELETE FROM submissions WHERE status = ? AND updated_at < ?",
+                    (DONE, time.time() - older_than)
+                ).rowcount
+        return await run_in_threadpool(purge)
+    
+    async def stats(self) -> Dict[str, int]:
+        """
+        Количество отправок по статусам
+        
+        Returns:
+            Dict: queued, done и failed
+        """
+        rows = await run_in_threadpool(
+            self._execute, "SELECT status, count(*) AS count FROM submissions GROUP BY status"
+        )
+        counts = {QUEUED: 0, DONE: 0, FAILED: 0}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
+    
+    def close(self):
+        """Закрытие файла очереди"""
+        with self._lock:
+            self._connection.close()
+
+
+class IngestWorker:
+    """Фоновая запись отправок из очереди в PostgreSQL"""
+    
+    def __init__(self, queue: IngestQueue, db_manager):
+        """
+        Args:
+            queue: Очередь отправок
+            db_manager: AsyncDatabaseManager для записи перевалов
+        """
+        self.queue = queue
+        self.db_manager = db_manager
+        self.batch_size = int(os.getenv('FSTR_INGEST_BATCH', '20'))
+        self.interval = float(os.getenv('FSTR_INGEST_INTERVAL', '1'))
+        self.max_attempts = int(os.getenv('FSTR_INGEST_MAX_ATTEMPTS', '5'))
+        # Сколько секунд хранить статус записанных отправок
+        self.retention = float(os.getenv('FSTR_INGEST_RETENTION', str(7 * 24 * 3600)))
+        self._purged_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+    
+    def start(self):
+        """Запуск обработчика в текущем цикле событий"""
+        self._task = asyncio.create_task(self._run())
+    
+    def notify(self):
+        """Сигнал о новой отправке, чтобы не ждать следующего опроса"""
+        self._wakeup.set()
+    
+    async def stop(self):
+        """Остановка обработчика; незаписанные отправки остаются в очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        while True:
+            try:
+                drained = await self.drain()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика очереди: {e}")
+                drained = 0
+            if not drained:
+                await self._purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+    
+    async def _purge(self):
+        # Очистка раз в час, пока очередь пуста
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        try:
+            removed = await self.queue.purge(self.retention)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка очистки очереди: {e}")
+            return
+        if removed:
+            logger.info(f"Из очереди удалено {removed} записанных отправок")
+    
+    async def drain(self) -> int:
+        """
+        Запись одной порции отправок в БД
+        
+        Порция записывается одной транзакцией через add_pereval_batch (COPY).
+        Если БД отклоняет порцию, отправки записываются по одной, чтобы
+        ошибка в одной из них не задерживала остальные.
+        
+        Returns:
+            int: Количество записанных отправок
+        """
+        batch = await self.queue.next_batch(self.batch_size)
+        if not batch:
+            return 0
+        
+        valid = []
+        for item in batch:
+            pereval_data = await self._validate(item)
+            if pereval_data is not None:
+                valid.append((item, pereval_data))
+        if not valid:
+            return 0
+        
+        results = await self.db_manager.add_pereval_batch(
+            [pereval_data for _, pereval_data in valid],
+            [self._idempotency_key(item) for item, _ in valid]
+        )
+        if results is not None:
+            for (item, _), result in zip(valid, results):
+                await self.queue.mark_done(item['id'], result['id'], result['duplicate_of'])
+            stored = len(valid)
+        elif not await self.db_manager.health_check():
+            # Недоступность БД - не ошибка данных, попытки не засчитываются
+            return 0
+        else:
+            stored = 0
+            for item, pereval_data in valid:
+                stored += await self._store(item, pereval_data)
+        
+        if stored:
+            logger.info(f"Из очереди записано {stored} перевалов")
+        return stored
+    
+    @staticmethod
+    def _idempotency_key(item: Dict[str, Any]) -> str:
+        # Ключ повтора сохраняется в БД вместе с перевалом: если процесс упадет
+        # после записи, но до отметки в очереди, повтор вернет ту же запись
+        return item['idempotency_key'] or f"ingest-{item['id']}"
+    
+    async def _validate(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # В очереди данные хранятся в JSON: координаты и время снова приводятся к типам модели
+        try:
+            return PerevalSubmitData.model_validate(item['payload']).model_dump()
+        except ValidationError as e:
+            await self.queue.mark_attempt(item['id'], f"Ошибка валидации данных: {e}", failed=True)
+            return None
+    
+    async def _store(self, item: Dict[str, Any], pereval_data: Dict[str, Any]) -> bool:
+        result = await self.db_manager.add_pereval(pereval_data, self._idempotency_key(item))
+        if result is not None:
+            await self.queue.mark_done(item['id'], result['id'], result['duplicate_of'])
+            return True
+        
+        # Недоступность БД - не ошибка данных, попытка не засчитывается
+        if not await self.db_manager.health_check():
+            return False
+        failed = item['attempts'] + 1 >= self.max_attempts
+        await self.queue.mark_attempt(item['id'], "Ошибка при сохранении данных в базу данных", failed)
+        return False
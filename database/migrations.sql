@@ -0,0 +1,144 @@
+-- Обновление существующей базы до текущей schema.sql
+-- Применяется python init_db.py, если таблица pereval_added уже создана
+-- (schema.sql выполняется только для пустой базы). Каждый шаг можно
+-- выполнять повторно; к секционированной таблице применяется так же.
+
+-- Столбцы перевала, добавленные после первой версии схемы
+UPDATE "public"."pereval_added" SET "date_added" = now() WHERE "date_added" IS NULL;
+ALTER TABLE "public"."pereval_added"
+    ALTER COLUMN "date_added" SET NOT NULL,
+    ADD COLUMN IF NOT EXISTS "area_id" int8,
+    ADD COLUMN IF NOT EXISTS "version" int4 NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS "change_xid" xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    ADD COLUMN IF NOT EXISTS "claimed_by" varchar(255),
+    ADD COLUMN IF NOT EXISTS "claimed_at" timestamp,
+    ADD COLUMN IF NOT EXISTS "duplicate_of" int4,
+    ADD COLUMN IF NOT EXISTS "idempotency_key" varchar(64);
+
+-- Изображения могут храниться в файле (img_path) без данных в БД
+ALTER TABLE "public"."pereval_images"
+    ADD COLUMN IF NOT EXISTS "img_path" varchar(500),
+    ALTER COLUMN "img" DROP NOT NULL;
+
+CREATE OR REPLACE FUNCTION track_pereval_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    NEW.change_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS pereval_added_change ON "public"."pereval_added";
+CREATE TRIGGER pereval_added_change
+BEFORE INSERT OR UPDATE ON "public"."pereval_added"
+FOR EACH ROW EXECUTE FUNCTION track_pereval_change();
+
+-- Иерархия районов (см. schema.sql)
+CREATE TABLE IF NOT EXISTS "public"."pereval_areas_closure" (
+    "ancestor_id" int8 NOT NULL,
+    "descendant_id" int8 NOT NULL,
+    "depth" int4 NOT NULL,
+    PRIMARY KEY ("ancestor_id", "descendant_id")
+);
+
+CREATE OR REPLACE FUNCTION rebuild_pereval_areas_closure() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM pereval_areas_closure;
+    INSERT INTO pereval_areas_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE tree AS (
+        SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+        FROM pereval_areas
+        UNION ALL
+        -- Корень ссылается сам на себя (id_parent = id), глубина ограничена от циклов
+        SELECT tree.ancestor_id, a.id, tree.depth + 1
+        FROM tree
+        JOIN pereval_areas a ON a.id_parent = tree.descendant_id AND a.id <> a.id_parent
+        WHERE tree.depth < 32
+    )
+    SELECT DISTINCT ON (ancestor_id, descendant_id) ancestor_id, descendant_id, depth
+    FROM tree
+    ORDER BY ancestor_id, descendant_id, depth;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS pereval_areas_closure_refresh ON "public"."pereval_areas";
+CREATE TRIGGER pereval_areas_closure_refresh
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "public"."pereval_areas"
+FOR EACH STATEMENT EXECUTE FUNCTION rebuild_pereval_areas_closure();
+
+-- Триггер уровня оператора срабатывает и без измененных строк: заполняет таблицу замыкания
+UPDATE "public"."pereval_areas" SET "id_parent" = "id_parent" WHERE false;
+
+-- Внешние ключи и уникальный индекс ключей повтора. На секционированную таблицу
+-- ссылаться нельзя, поэтому у duplicate_of ключ есть только в несекционированной
+DO $$
+DECLARE
+    partitioned boolean := (SELECT relkind = 'p' FROM pg_class WHERE oid = 'public.pereval_added'::regclass);
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.pereval_added'::regclass AND contype = 'f'
+            AND confrelid = 'public.pereval_areas'::regclass
+    ) THEN
+        ALTER TABLE "public"."pereval_added"
+            ADD FOREIGN KEY ("area_id") REFERENCES "public"."pereval_areas"("id");
+    END IF;
+
+    IF NOT partitioned AND NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.pereval_added'::regclass AND contype = 'f'
+            AND confrelid = 'public.pereval_added'::regclass
+    ) THEN
+        ALTER TABLE "public"."pereval_added"
+            ADD FOREIGN KEY ("duplicate_of") REFERENCES "public"."pereval_added"("id") ON DELETE SET NULL;
+    END IF;
+
+    -- В секционированной таблице индекс неуникальный, уникальность ключей
+    -- повтора обеспечивает pereval_idempotency_keys (partitioning.sql)
+    IF NOT partitioned THEN
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pereval_added_idempotency
+            ON "public"."pereval_added"("user_id", "idempotency_key")
+            WHERE "idempotency_key" IS NOT NULL;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.pereval_images'::regclass AND contype = 'c'
+    ) THEN
+        ALTER TABLE "public"."pereval_images"
+            ADD CHECK ("img" IS NOT NULL OR "img_path" IS NOT NULL);
+    END IF;
+END;
+$$;
+
+-- Индексы schema.sql
+CREATE INDEX IF NOT EXISTS idx_pereval_added_status ON "public"."pereval_added"("status");
+CREATE INDEX IF NOT EXISTS idx_pereval_added_moderation_queue ON "public"."pereval_added"("id") WHERE "status" = 'new';
+CREATE INDEX IF NOT EXISTS idx_pereval_added_claimed_at ON "public"."pereval_added"("claimed_at") WHERE "status" = 'pending';
+CREATE INDEX IF NOT EXISTS idx_pereval_added_user_id ON "public"."pereval_added"("user_id");
+CREATE INDEX IF NOT EXISTS idx_pereval_added_date_added ON "public"."pereval_added"("date_added");
+CREATE INDEX IF NOT EXISTS idx_pereval_added_user_date ON "public"."pereval_added"("user_id", "date_added" DESC, "id" DESC);
+CREATE INDEX IF NOT EXISTS idx_pereval_added_geo ON "public"."pereval_added" USING gist (point("longitude"::float8, "latitude"::float8));
+CREATE INDEX IF NOT EXISTS idx_pereval_added_change ON "public"."pereval_added"("change_xid", "id");
+CREATE INDEX IF NOT EXISTS idx_pereval_added_duplicate_of ON "public"."pereval_added"("duplicate_of") WHERE "duplicate_of" IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_pereval_added_area_id ON "public"."pereval_added"("area_id", "id" DESC);
+CREATE INDEX IF NOT EXISTS idx_pereval_areas_closure_descendant ON "public"."pereval_areas_closure"("descendant_id");
+CREATE INDEX IF NOT EXISTS idx_pereval_added_titles_fts ON "public"."pereval_added" USING gin (
+    to_tsvector('russian', coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", ''))
+);
+CREATE INDEX IF NOT EXISTS idx_pereval_images_pereval_id ON "public"."pereval_images"("pereval_id");
+CREATE INDEX IF NOT EXISTS idx_pereval_users_email ON "public"."pereval_users"("email");
+
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_pereval_added_titles_trgm ON "public"."pereval_added" USING gin (
+        lower(coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", '')) gin_trgm_ops
+    );
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm недоступно, нечеткий поиск отключен: %', SQLERRM;
+END;
+$$;
@@ -0,0 +1,182 @@
+-- Секционирование pereval_added по месяцам date_added
+-- Применяется после schema.sql (python init_db.py --partitioned), в том числе
+-- к работающей базе: существующие записи переносятся в секции своих месяцев.
+--
+-- Ограничения секционированной таблицы:
+--   * первичный ключ включает ключ секционирования - (id, date_added);
+--   * внешние ключи на pereval_added(id) невозможны, поэтому у pereval_images.pereval_id
+--     и pereval_added.duplicate_of их нет (перевалы удаляются только архивацией,
+--     которая удаляет и изображения);
+--   * уникальный индекс тоже должен включать date_added, поэтому ключи повтора
+--     запроса хранятся в отдельной таблице pereval_idempotency_keys.
+
+-- Ключи повтора запроса: вставка перевала с уже использованным ключом
+-- завершается ошибкой уникальности, как и с индексом в несекционированной таблице
+CREATE TABLE IF NOT EXISTS "public"."pereval_idempotency_keys" (
+    "user_id" int4 NOT NULL,
+    "idempotency_key" varchar(64) NOT NULL,
+    "pereval_id" int4 NOT NULL,
+    PRIMARY KEY ("user_id", "idempotency_key")
+);
+
+CREATE OR REPLACE FUNCTION register_pereval_idempotency_key() RETURNS trigger AS $$
+BEGIN
+    IF NEW.idempotency_key IS NOT NULL THEN
+        INSERT INTO pereval_idempotency_keys (user_id, idempotency_key, pereval_id)
+        VALUES (NEW.user_id, NEW.idempotency_key, NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перевалы, удаленные при архивации секций (archive_partitions.py).
+-- GET /sync выдает их ID в списке archived, чтобы приложение удалило их из своего кэша
+CREATE TABLE IF NOT EXISTS "public"."pereval_archived" (
+    "id" int4 NOT NULL,
+    "user_id" int4 NOT NULL,
+    "change_xid" xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    "archived_at" timestamp NOT NULL DEFAULT now(),
+    PRIMARY KEY ("id")
+);
+
+CREATE INDEX IF NOT EXISTS idx_pereval_archived_change ON "public"."pereval_archived"("change_xid", "id");
+
+-- Месячные секции с месяца since (по умолчанию текущего) по months_ahead месяцев вперед.
+-- Имя секции: pereval_added_y2024m01. Возвращает число созданных секций
+CREATE OR REPLACE FUNCTION create_pereval_partitions(months_ahead int DEFAULT 3, since timestamp DEFAULT NULL)
+RETURNS int AS $$
+DECLARE
+    month timestamp := date_trunc('month', coalesce(since, now()::timestamp));
+    last_month timestamp := date_trunc('month', now()::timestamp) + make_interval(months => months_ahead);
+    partition_name text;
+    created int := 0;
+BEGIN
+    WHILE month <= last_month LOOP
+        partition_name := 'pereval_added_' || to_char(month, '"y"YYYY"m"MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF pereval_added FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month, month + interval '1 month'
+            );
+            created := created + 1;
+        END IF;
+        month := month + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Закрытие прошедших месяцев: секция получает CHECK с диапазоном id своих записей.
+-- Исключение секций по CHECK выполняется при планировании и только для константы:
+-- запрос с id в тексте (синхронный DatabaseManager) читает нужную секцию и открытые
+-- месяцы. AsyncDatabaseManager читает диапазоны (database/partitions.py) и добавляет
+-- к подготовленному запросу по id границы date_added его месяцев константами.
+-- Месяц закрывается через сутки после окончания, когда в него уже никто не пишет
+CREATE OR REPLACE FUNCTION seal_pereval_partitions() RETURNS int AS $$
+DECLARE
+    part record;
+    lo int4;
+    hi int4;
+    sealed int := 0;
+BEGIN
+    FOR part IN
+        SELECT c.oid::regclass AS rel, c.relname || '_id_range' AS conname,
+            (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamp AS upper_bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.pereval_added'::regclass
+    LOOP
+        CONTINUE WHEN part.upper_bound > now()::timestamp - interval '1 day'
+            OR EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = part.rel AND conname = part.conname);
+        EXECUTE format('SELECT min(id), max(id) FROM %s', part.rel) INTO lo, hi;
+        -- Пустой месяц получает пустой диапазон и всегда исключается
+        EXECUTE format(
+            'ALTER TABLE %s ADD CONSTRAINT %I CHECK (id BETWEEN %s AND %s)',
+            part.rel, part.conname, coalesce(lo, 0), coalesce(hi, -1)
+        );
+        sealed := sealed + 1;
+    END LOOP;
+    RETURN sealed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Периодическое обслуживание (вызывается API, database/partitions.py):
+-- будущие секции и закрытие прошедших месяцев
+CREATE OR REPLACE FUNCTION maintain_pereval_partitions(months_ahead int DEFAULT 3)
+RETURNS TABLE (created int, sealed int) AS $$
+BEGIN
+    -- Несколько экземпляров API обслуживают секции по очереди
+    PERFORM pg_advisory_xact_lock(hashtext('maintain_pereval_partitions'));
+    created := create_pereval_partitions(months_ahead);
+    sealed := seal_pereval_partitions();
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    fk record;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'public.pereval_added'::regclass) = 'p' THEN
+        RAISE NOTICE 'pereval_added уже секционирована';
+        RETURN;
+    END IF;
+
+    FOR fk IN
+        SELECT conrelid::regclass AS rel, conname FROM pg_constraint
+        WHERE confrelid = 'public.pereval_added'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.rel, fk.conname);
+    END LOOP;
+
+    ALTER TABLE "public"."pereval_added" RENAME TO "pereval_added_heap";
+    CREATE TABLE "public"."pereval_added" (LIKE "public"."pereval_added_heap" INCLUDING DEFAULTS)
+        PARTITION BY RANGE ("date_added");
+
+    PERFORM create_pereval_partitions(3, (SELECT min(date_added) FROM pereval_added_heap));
+
+    -- Перенос до создания триггеров: version и change_xid записей сохраняются
+    INSERT INTO pereval_added SELECT * FROM pereval_added_heap;
+    INSERT INTO pereval_idempotency_keys (user_id, idempotency_key, pereval_id)
+    SELECT user_id, idempotency_key, id FROM pereval_added_heap WHERE idempotency_key IS NOT NULL;
+    DROP TABLE pereval_added_heap;
+
+    ALTER TABLE "public"."pereval_added"
+        ADD PRIMARY KEY ("id", "date_added"),
+        ADD FOREIGN KEY ("user_id") REFERENCES "public"."pereval_users"("id") ON DELETE CASCADE,
+        ADD FOREIGN KEY ("area_id") REFERENCES "public"."pereval_areas"("id");
+
+    CREATE TRIGGER pereval_added_change
+    BEFORE INSERT OR UPDATE ON "public"."pereval_added"
+    FOR EACH ROW EXECUTE FUNCTION track_pereval_change();
+
+    CREATE TRIGGER pereval_added_idempotency_key
+    AFTER INSERT ON "public"."pereval_added"
+    FOR EACH ROW EXECUTE FUNCTION register_pereval_idempotency_key();
+
+    -- Индексы schema.sql; создаются на каждой секции, в том числе будущих
+    CREATE INDEX idx_pereval_added_status ON "public"."pereval_added"("status");
+    CREATE INDEX idx_pereval_added_moderation_queue ON "public"."pereval_added"("id") WHERE "status" = 'new';
+    CREATE INDEX idx_pereval_added_claimed_at ON "public"."pereval_added"("claimed_at") WHERE "status" = 'pending';
+    CREATE INDEX idx_pereval_added_user_id ON "public"."pereval_added"("user_id");
+    CREATE INDEX idx_pereval_added_date_added ON "public"."pereval_added"("date_added");
+    CREATE INDEX idx_pereval_added_user_date ON "public"."pereval_added"("user_id", "date_added" DESC, "id" DESC);
+    CREATE INDEX idx_pereval_added_geo ON "public"."pereval_added" USING gist (point("longitude"::float8, "latitude"::float8));
+    CREATE INDEX idx_pereval_added_change ON "public"."pereval_added"("change_xid", "id");
+    CREATE INDEX idx_pereval_added_duplicate_of ON "public"."pereval_added"("duplicate_of") WHERE "duplicate_of" IS NOT NULL;
+    CREATE INDEX idx_pereval_added_idempotency ON "public"."pereval_added"("user_id", "idempotency_key")
+        WHERE "idempotency_key" IS NOT NULL;
+    CREATE INDEX idx_pereval_added_area_id ON "public"."pereval_added"("area_id", "id" DESC);
+    CREATE INDEX idx_pereval_added_titles_fts ON "public"."pereval_added" USING gin (
+        to_tsvector('russian', coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", ''))
+    );
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX idx_pereval_added_titles_trgm ON "public"."pereval_added" USING gin (
+            lower(coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", '')) gin_trgm_ops
+        );
+    END IF;
+
+    PERFORM seal_pereval_partitions();
+    ANALYZE "public"."pereval_added";
+END;
+$$;
@@ -0,0 +1,115 @@
+"""
+Обслуживание секций pereval_added
+Фоновое создание секций будущих месяцев и закрытие прошедших (database/partitioning.sql),
+выбор секций для чтения перевала по ID
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PartitionMap:
+    """
+    Месяцы, в которых может быть перевал с данным ID
+    
+    Закрытая секция хранит только id из своего CHECK (seal_pereval_partitions),
+    поэтому перевал из закрытого месяца ищется в секциях, чей диапазон содержит
+    его id (соседние диапазоны могут пересекаться). Любой другой id может быть
+    только в открытых секциях. Карта устаревает безопасно: месяц, закрытый после
+    ее загрузки, остается в ней открытым и просто не отсекается.
+    """
+    
+    def __init__(self, partitions: List[Dict[str, Any]]):
+        """
+        Args:
+            partitions: Строки queries.SELECT_PEREVAL_PARTITIONS (since, until, lo, hi)
+        """
+        self.sealed = [
+            (partition['lo'], partition['hi'], partition['since'], partition['until'])
+            for partition in partitions
+            if partition['lo'] is not None and partition['lo'] <= partition['hi']
+        ]
+        open_months = [partition['since'] for partition in partitions if partition['lo'] is None]
+        # Начало первого открытого месяца (None, если открытых секций нет)
+        self.open_since = min(open_months) if open_months else None
+    
+    def bounds(self, pereval_id: int) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """
+        Границы date_added, в которых может быть перевал
+        
+        Args:
+            pereval_id: ID перевала
+        
+        Returns:
+            Tuple: Начало первого и конец последнего подходящего месяца (None - без границы)
+        """
+        months = [(since, until) for lo, hi, since, until in self.sealed if lo <= pereval_id <= hi]
+        if months:
+            return min(since for since, _ in months), max(until for _, until in months)
+        return self.open_since, None
+
+
+class PartitionMaintainer:
+    """
+    Периодический вызов maintain_pereval_partitions()
+    
+    Секции создаются на months_ahead месяцев вперед, поэтому вставка не остается
+    без секции, даже если API какое-то время не работал. Несколько экземпляров
+    API обслуживают секции по очереди (advisory lock в функции).
+    """
+    
+    def __init__(self, db_manager):
+        """
+        Args:
+            db_manager: AsyncDatabaseManager секционированной базы
+        """
+        self.db_manager = db_manager
+        self.months_ahead = int(os.getenv('FSTR_PARTITION_MONTHS_AHEAD', '3'))
+        # Пауза между проверками в секундах
+        self.interval = float(os.getenv('FSTR_PARTITION_INTERVAL', '3600'))
+        self._task = None
+    
+    def start(self):
+        """Запуск обслуживания в текущем цикле событий"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка обслуживания"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        while True:
+            await self.maintain()
+            await asyncio.sleep(self.interval)
+    
+    async def maintain(self) -> bool:
+        """
+        Создание будущих секций и закрытие прошедших месяцев
+        
+        Returns:
+            bool: True если обслуживание выполнено
+        """
+        result = await self.db_manager.maintain_partitions(self.months_ahead)
+        if result is None:
+            return False
+        if result['created'] or result['sealed']:
+            logger.info(
+                f"Секции pereval_added: создано {result['created']}, закрыто {result['sealed']}"
+            )
+        return True
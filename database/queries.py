@@ -0,0 +1,946 @@
+"""
+SQL-запросы и подготовка параметров для работы с перевалами
+Общие для синхронного и асинхронного менеджеров БД
+"""
+
+import json
+import math
+import base64
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple, List, Sequence
+from datetime import datetime
+
+
+SELECT_USER_ID_BY_EMAIL = "SELECT id FROM pereval_users WHERE email = %s"
+
+INSERT_USER = """
+    INSERT INTO pereval_users (email, phone, fam, name, otc)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id
+"""
+
+INSERT_PEREVAL = """
+    INSERT INTO pereval_added (
+        beauty_title, title, other_titles, connect, add_time,
+        latitude, longitude, height,
+        level_winter, level_summer, level_autumn, level_spring, area_id,
+        raw_data, images, user_id
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    ) RETURNING id
+"""
+
+# Пользователь и перевал в одном выражении: upsert по email и вставка перевала.
+# Если пользователь вставлен параллельной транзакцией после начала выражения,
+# CTE вернет пустой результат, и выражение нужно повторить.
+INSERT_PEREVAL_WITH_USER = """
+    WITH new_user AS (
+        INSERT INTO pereval_users (email, phone, fam, name, otc)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id
+    ), pereval_user AS (
+        SELECT id FROM new_user
+        UNION ALL
+        SELECT id FROM pereval_users WHERE email = %s
+        LIMIT 1
+    )
+    INSERT INTO pereval_added (
+        beauty_title, title, other_titles, connect, add_time,
+        latitude, longitude, height,
+        level_winter, level_summer, level_autumn, level_spring, area_id,
+        raw_data, images, duplicate_of, idempotency_key, user_id
+    )
+    SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, pereval_user.id
+    FROM pereval_user
+    RETURNING id
+"""
+
+# Перевал, ранее сохраненный пользователем с тем же ключом повтора
+SELECT_PEREVAL_BY_IDEMPOTENCY_KEY = """
+    SELECT p.id, p.duplicate_of
+    FROM pereval_added p
+    JOIN pereval_users u ON u.id = p.user_id
+    WHERE u.email = %s AND p.idempotency_key = %s
+"""
+
+# Пакетная загрузка: пользователи вставляются одним выражением из массивов,
+# ID перевалов выделяются заранее, чтобы сопоставить их с элементами пакета
+INSERT_USERS_BATCH = """
+    INSERT INTO pereval_users (email, phone, fam, name, otc)
+    SELECT * FROM unnest(
+        %s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[]
+    )
+    ON CONFLICT (email) DO NOTHING
+"""
+
+SELECT_USER_IDS_BY_EMAILS = "SELECT id, email FROM pereval_users WHERE email = ANY(%s)"
+
+NEXT_PEREVAL_IDS = "SELECT nextval('pereval_id_seq') AS id FROM generate_series(1, %s)"
+
+COPY_PEREVAL_BATCH = """
+    COPY pereval_added (
+        beauty_title, title, other_titles, connect, add_time,
+        latitude, longitude, height,
+        level_winter, level_summer, level_autumn, level_spring, area_id,
+        raw_data, images, duplicate_of, idempotency_key, user_id, id
+    ) FROM STDIN
+"""
+
+# Перевалы повторно отправленного пакета: пары (email, ключ повтора элемента)
+SELECT_PEREVALS_BY_IDEMPOTENCY_KEYS = """
+    SELECT p.id, p.duplicate_of, p.idempotency_key
+    FROM unnest(%s::varchar[], %s::varchar[]) AS k(email, idempotency_key)
+    JOIN pereval_users u ON u.email = k.email
+    JOIN pereval_added p ON p.user_id = u.id AND p.idempotency_key = k.idempotency_key
+"""
+
+# Изображения хранятся в pereval_images в двоичном виде, в pereval_added
+# остаются только ссылки на них (id и title)
+NEXT_IMAGE_IDS = "SELECT nextval('pereval_images_id_seq') AS id FROM generate_series(1, %s)"
+
+INSERT_IMAGE = """
+    INSERT INTO pereval_images (id, pereval_id, img, title)
+    VALUES (%s, %s, %s, %s)
+"""
+
+COPY_IMAGES_BATCH = "COPY pereval_images (id, pereval_id, img, title) FROM STDIN"
+
+# При редактировании заменяются только изображения из JSON (img), файлы,
+# загруженные отдельно (img_path), остаются
+DELETE_PEREVAL_IMAGES = "DELETE FROM pereval_images WHERE pereval_id = %s AND img_path IS NULL"
+
+SELECT_FILE_IMAGE_REFS = """
+    SELECT id, title FROM pereval_images
+    WHERE pereval_id = %s AND img_path IS NOT NULL
+    ORDER BY id
+"""
+
+# Загруженный файл добавляется только к перевалу в статусе 'new',
+# ссылка на него дописывается в pereval_added.images
+INSERT_FILE_IMAGE = """
+    WITH image AS (
+        INSERT INTO pereval_images (pereval_id, title, img_path)
+        SELECT id, %s, %s FROM pereval_added
+        WHERE id = %s AND status = 'new'
+        RETURNING id, pereval_id, title
+    )
+    UPDATE pereval_added p SET images = (
+        COALESCE(p.images::jsonb, '[]'::jsonb)
+        || jsonb_build_array(jsonb_build_object('id', image.id, 'title', image.title))
+    )::json
+    FROM image
+    WHERE p.id = image.pereval_id
+    RETURNING image.id
+"""
+
+SELECT_IMAGE = """
+    SELECT id, title, img_path, octet_length(img) AS size, substring(img from 1 for 16) AS head
+    FROM pereval_images
+    WHERE id = %s AND pereval_id = %s
+"""
+
+SELECT_IMAGE_CHUNK = "SELECT substring(img from %s for %s) AS chunk FROM pereval_images WHERE id = %s"
+
+# Поля, которые можно запросить у GET /pereval/{id} и GET /submitData/{id}.
+# Выражения берутся только из этого словаря, поэтому их можно подставлять в SQL
+PEREVAL_FIELDS = {
+    'id': 'p.id',
+    'date_added': 'p.date_added',
+    'beauty_title': 'p.beauty_title',
+    'title': 'p.title',
+    'other_titles': 'p.other_titles',
+    'connect': 'p.connect',
+    'add_time': 'p.add_time',
+    'user_id': 'p.user_id',
+    'latitude': 'p.latitude',
+    'longitude': 'p.longitude',
+    'height': 'p.height',
+    'level_winter': 'p.level_winter',
+    'level_summer': 'p.level_summer',
+    'level_autumn': 'p.level_autumn',
+    'level_spring': 'p.level_spring',
+    'area_id': 'p.area_id',
+    'status': 'p.status',
+    'version': 'p.version',
+    'claimed_by': 'p.claimed_by',
+    'claimed_at': 'p.claimed_at',
+    'duplicate_of': 'p.duplicate_of',
+    'raw_data': 'p.raw_data',
+    'images': 'p.images',
+    'email': 'u.email',
+    'phone': 'u.phone',
+    'fam': 'u.fam',
+    'name': 'u.name',
+    'otc': 'u.otc',
+}
+
+USER_FIELDS = frozenset(('email', 'phone', 'fam', 'name', 'otc'))
+
+# Краткое представление: без raw_data, данных пользователя и уровней сложности
+SUMMARY_FIELDS = ('id', 'title', 'beauty_title', 'latitude', 'longitude', 'height', 'status', 'images')
+
+SELECT_PEREVAL_STATUS = "SELECT status, version FROM pereval_added WHERE id = %s"
+
+UPDATE_PEREVAL = """
+    UPDATE pereval_added SET
+        beauty_title = %s,
+        title = %s,
+        other_titles = %s,
+        connect = %s,
+        add_time = %s,
+        latitude = %s,
+        longitude = %s,
+        height = %s,
+        level_winter = %s,
+        level_summer = %s,
+        level_autumn = %s,
+        level_spring = %s,
+        area_id = %s,
+        raw_data = %s,
+        images = %s
+    WHERE id = %s AND status = 'new' AND (%s::int4 IS NULL OR version = %s)
+    RETURNING version
+"""
+
+# Поля перевала, которые PATCH меняет напрямую, и столбцы вложенных объектов
+UPDATE_SIMPLE_FIELDS = ('beauty_title', 'title', 'other_titles', 'connect', 'area_id')
+UPDATE_COORD_COLUMNS = ('latitude', 'longitude', 'height')
+LEVEL_SEASONS = ('winter', 'summer', 'autumn', 'spring')
+
+
+def update_pereval_query(
+    pereval_id: int,
+    changes: Dict[str, Any],
+    images: Optional[Sequence[Dict[str, Any]]] = None,
+    expected_version: Optional[int] = None
+) -> Optional[Tuple[str, list]]:
+    """
+    Запрос частичного обновления перевала
+    
+    Записываются только переданные поля; raw_data дополняется изменениями
+    на месте, images меняется только вместе с изображениями. Как и
+    UPDATE_PEREVAL, запрос обновляет только перевал в статусе new и
+    возвращает новую версию.
+    
+    Args:
+        pereval_id: ID перевала
+        changes: Переданные клиентом поля (coords и level могут быть неполными)
+        images: Новые ссылки на изображения или None, если они не меняются
+        expected_version: Ожидаемая версия перевала или None
+    
+    Returns:
+        Tuple: SQL и список параметров или None, если менять нечего
+    """
+    assignments = []
+    params = []
+    raw_changes = {}
+    
+    for name in UPDATE_SIMPLE_FIELDS:
+        if name in changes:
+            assignments.append(f"{name} = %s")
+            params.append(changes[name])
+            raw_changes[name] = changes[name]
+    if 'add_time' in changes:
+        assignments.append("add_time = %s")
+        params.append(changes['add_time'] or datetime.now())
+        raw_changes['add_time'] = changes['add_time']
+    
+    coords = changes.get('coords') or {}
+    for name in UPDATE_COORD_COLUMNS:
+        if name in coords:
+            assignments.append(f"{name} = %s")
+            params.append(coords[name])
+    level = changes.get('level') or {}
+    for season in LEVEL_SEASONS:
+        if season in level:
+            assignments.append(f"level_{season} = %s")
+            params.append(level[season])
+    
+    if images is not None:
+        images = list(images)
+        assignments.append("images = %s")
+        params.append(json.dumps(images, ensure_ascii=False))
+        raw_changes['images'] = images
+    
+    # raw_data хранит исходную отправку: меняются только переданные ключи
+    raw_sql = "coalesce(raw_data::jsonb, '{}'::jsonb)"
+    raw_params = []
+    if raw_changes:
+        raw_sql = f"({raw_sql} || %s::jsonb)"
+        raw_params.append(json.dumps(raw_changes, ensure_ascii=False, default=str))
+    for key, nested in (('coords', coords), ('level', level)):
+        if nested:
+            raw_sql = (
+                f"jsonb_set({raw_sql}, '{{{key}}}', "
+                f"coalesce(raw_data::jsonb -> '{key}', '{{}}'::jsonb) || %s::jsonb)"
+            )
+            raw_params.append(json.dumps(nested, ensure_ascii=False))
+    
+    if not assignments:
+        return None
+    assignments.append(f"raw_data = {raw_sql}::json")
+    params.extend(raw_params)
+    
+    sql = f"""
+        UPDATE pereval_added SET {', '.join(assignments)}
+        WHERE id = %s AND status = 'new' AND (%s::int4 IS NULL OR version = %s)
+        RETURNING version
+    """
+    params.extend((pereval_id, expected_version, expected_version))
+    return sql, params
+
+
+UPDATE_PEREVAL_STATUS = """
+    UPDATE pereval_added
+    SET status = %s
+    WHERE id = %s
+"""
+
+
+def _select_pereval(fields: Tuple[str, ...], join_user: bool = False, extra_columns: Tuple[str, ...] = ()) -> str:
+    """
+    SELECT ... FROM для указанных полей перевала
+    
+    Args:
+        fields: Имена полей из PEREVAL_FIELDS
+        join_user: Присоединять pereval_users независимо от полей
+        extra_columns: Дополнительные выражения столбцов (не из запроса клиента)
+    
+    Returns:
+        str: Начало запроса без WHERE
+    
+    Raises:
+        ValueError: Если запрошено неизвестное поле
+    """
+    unknown = [field for field in fields if field not in PEREVAL_FIELDS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    
+    # id возвращается всегда, повторы убираются с сохранением порядка
+    names = dict.fromkeys(('id',) + fields)
+    columns = ', '.join([f"{PEREVAL_FIELDS[name]} AS {name}" for name in names] + list(extra_columns))
+    sql = f"SELECT {columns} FROM pereval_added p"
+    if join_user or USER_FIELDS.intersection(names):
+        sql += " JOIN pereval_users u ON p.user_id = u.id"
+    return sql
+
+
+# Полные данные перевала: все поля PEREVAL_FIELDS, служебные столбцы
+# (ключ повтора, отметка изменения) клиенту не отдаются
+SELECT_PEREVAL_BY_ID = f"""
+    {_select_pereval(tuple(PEREVAL_FIELDS))}
+    WHERE p.id = %s
+"""
+
+SELECT_PEREVAL_BY_USER_EMAIL = f"""
+    {_select_pereval(tuple(PEREVAL_FIELDS))}
+    WHERE u.email = %s
+    ORDER BY p.date_added DESC
+"""
+
+
+@lru_cache(maxsize=128)
+def select_pereval_fields(fields: Tuple[str, ...]) -> str:
+    """
+    Запрос перевала по ID, выбирающий только указанные поля
+    
+    Args:
+        fields: Имена полей из PEREVAL_FIELDS
+    
+    Returns:
+        str: SQL с параметром ID перевала
+    
+    Raises:
+        ValueError: Если запрошено неизвестное поле
+    """
+    return _select_pereval(fields) + " WHERE p.id = %s"
+
+
+def pereval_page_query(
+    email: str,
+    limit: int,
+    fields: Optional[Tuple[str, ...]] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None
+) -> Tuple[str, list]:
+    """
+    Запрос страницы перевалов пользователя с курсорной пагинацией
+    
+    Порядок (date_added DESC, id DESC) совпадает с индексом
+    idx_pereval_added_user_date, поэтому страница читается без сортировки
+    и без пропуска предыдущих строк.
+    
+    Args:
+        email: Email пользователя
+        limit: Количество строк
+        fields: Имена полей из PEREVAL_FIELDS, по умолчанию все
+        status: Фильтр по статусу модерации
+        date_from: Начало периода по date_added (включительно)
+        date_to: Конец периода по date_added (не включительно)
+        after: (date_added, id) последней строки предыдущей страницы
+    
+    Returns:
+        Tuple: SQL и список параметров
+    """
+    fields = tuple(fields or PEREVAL_FIELDS)
+    sql = _select_pereval(fields + ('date_added',), join_user=True)
+    conditions = ["u.email = %s"]
+    params = [email]
+    if status:
+        conditions.append("p.status = %s")
+        params.append(status)
+    if date_from:
+        conditions.append("p.date_added >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("p.date_added < %s")
+        params.append(date_to)
+    if after:
+        conditions.append("(p.date_added, p.id) < (%s, %s)")
+        params.extend(after)
+    params.append(limit)
+    sql += f" WHERE {' AND '.join(conditions)} ORDER BY p.date_added DESC, p.id DESC LIMIT %s"
+    return sql, params
+
+
+# Координаты перевала как point(долгота, широта); выражение совпадает с индексом
+# idx_pereval_added_geo в schema.sql, поэтому поиск по области использует GiST
+GEO_POINT = "point(p.longitude::float8, p.latitude::float8)"
+
+# Названия перевала для поиска; выражения совпадают с индексами
+# idx_pereval_added_titles_fts и idx_pereval_added_titles_trgm в schema.sql
+TITLES_TEXT = "lower(coalesce(p.title, '') || ' ' || coalesce(p.beauty_title, '') || ' ' || coalesce(p.other_titles, ''))"
+TITLES_TSVECTOR = (
+    "to_tsvector('russian', coalesce(p.title, '') || ' ' || coalesce(p.beauty_title, '') "
+    "|| ' ' || coalesce(p.other_titles, ''))"
+)
+
+# Минимальное сходство названий (pg_trgm word_similarity) для дубликата
+DUPLICATE_SIMILARITY = 0.6
+
+SELECT_TRIGRAM_AVAILABLE = "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS available"
+
+# pereval_added секционирована по месяцам (database/partitioning.sql)
+SELECT_PARTITIONED = "SELECT relkind = 'p' AS partitioned FROM pg_class WHERE oid = 'public.pereval_added'::regclass"
+
+# Будущие секции и закрытие прошедших месяцев
+MAINTAIN_PARTITIONS = "SELECT created, sealed FROM maintain_pereval_partitions(%s)"
+
+# Секции pereval_added: границы месяца и диапазон id из CHECK закрытой секции
+# (lo и hi NULL у открытых месяцев), см. seal_pereval_partitions()
+SELECT_PEREVAL_PARTITIONS = r"""
+    SELECT
+        (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::timestamp AS since,
+        (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamp AS until,
+        r.id_range[1]::int4 AS lo,
+        r.id_range[2]::int4 AS hi
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    LEFT JOIN pg_constraint con ON con.conrelid = c.oid AND con.conname = c.relname || '_id_range'
+    LEFT JOIN LATERAL (
+        SELECT regexp_match(pg_get_constraintdef(con.oid), 'id >= (-?\d+)\) AND \(id <= (-?\d+)') AS id_range
+    ) r ON true
+    WHERE i.inhparent = 'public.pereval_added'::regclass
+    ORDER BY since
+"""
+
+
+def date_added_bounds(sql: str, since: Optional[datetime], until: Optional[datetime]) -> str:
+    """
+    Добавление границ date_added к запросу перевала по id
+    
+    Границы пишутся в текст запроса константами: тогда и общий план подготовленного
+    запроса содержит только секции этих месяцев. С параметрами секции отсекаются
+    только при выполнении, а PostgreSQL до 17 версии все равно блокирует каждую.
+    
+    Args:
+        sql: Запрос с условием WHERE по p.id в конце
+        since: Начало первого месяца или None
+        until: Конец последнего месяца (не включая) или None
+    
+    Returns:
+        str: Запрос с условиями на p.date_added
+    """
+    if since:
+        sql = f"{sql.rstrip()} AND p.date_added >= '{since.isoformat()}'::timestamp"
+    if until:
+        sql = f"{sql.rstrip()} AND p.date_added < '{until.isoformat()}'::timestamp"
+    return sql
+
+# Позиция WAL основного сервера для токена согласованности
+SELECT_CURRENT_LSN = "SELECT pg_current_wal_lsn()::text AS lsn"
+
+# Реплика воспроизвела WAL до позиции токена (на основном сервере функция возвращает NULL)
+SELECT_REPLICA_CAUGHT_UP = "SELECT coalesce(pg_last_wal_replay_lsn() >= %s::pg_lsn, true) AS caught_up"
+
+# Средний радиус Земли и длина градуса широты в метрах
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE = 111320
+
+# Расстояние по формуле гаверсинусов от точки (%s широта, %s долгота)
+DISTANCE_M = f"""
+    2 * {EARTH_RADIUS_M} * asin(sqrt(
+        power(sin(radians(p.latitude::float8 - %s) / 2), 2)
+        + cos(radians(%s)) * cos(radians(p.latitude::float8))
+        * power(sin(radians(p.longitude::float8 - %s) / 2), 2)
+    ))
+"""
+
+
+def near_bbox(latitude: float, longitude: float, radius: float) -> Tuple[float, float, float, float]:
+    """
+    Прямоугольник в градусах, заведомо содержащий круг радиуса radius метров
+    
+    Args:
+        latitude: Широта центра
+        longitude: Долгота центра
+        radius: Радиус в метрах
+    
+    Returns:
+        Tuple: (min_lon, min_lat, max_lon, max_lat)
+    """
+    dlat = radius / METERS_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius / (METERS_PER_DEGREE * cos_lat), 180.0)
+    return (
+        longitude - dlon,
+        max(latitude - dlat, -90.0),
+        longitude + dlon,
+        min(latitude + dlat, 90.0)
+    )
+
+
+def duplicate_query(
+    latitude: float,
+    longitude: float,
+    radius: float,
+    title: str,
+    trigram: bool = False
+) -> Tuple[str, list]:
+    """
+    Запрос вероятного оригинала для нового перевала
+    
+    Кандидаты отбираются GiST-индексом по координатам в пределах radius,
+    затем сравниваются названия: по сходству триграмм, если доступно
+    расширение pg_trgm, иначе полнотекстовым совпадением всех слов title.
+    Отклоненные перевалы не учитываются, для дубликата возвращается его оригинал.
+    
+    Args:
+        latitude: Широта нового перевала
+        longitude: Долгота нового перевала
+        radius: Расстояние в метрах, на котором перевалы считаются одним
+        title: Название нового перевала
+        trigram: Доступно ли расширение pg_trgm
+    
+    Returns:
+        Tuple: SQL и список параметров
+    """
+    if trigram:
+        name_condition = f"word_similarity(lower(%s), {TITLES_TEXT}) >= {DUPLICATE_SIMILARITY}"
+    else:
+        name_condition = f"{TITLES_TSVECTOR} @@ plainto_tsquery('russian', %s)"
+    
+    sql = f"""
+        SELECT * FROM (
+            SELECT coalesce(p.duplicate_of, p.id) AS id, {DISTANCE_M} AS distance
+            FROM pereval_added p
+            WHERE {GEO_POINT} <@ box(point(%s, %s), point(%s, %s))
+                AND p.status <> 'rejected'
+                AND {name_condition}
+        ) found
+        WHERE distance <= %s
+        ORDER BY distance, id
+        LIMIT 1
+    """
+    params = [latitude, latitude, longitude, *near_bbox(latitude, longitude, radius), title, radius]
+    return sql, params
+
+
+def search_query(
+    limit: int,
+    offset: int = 0,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    near: Optional[Tuple[float, float]] = None,
+    radius: Optional[float] = None,
+    q: Optional[str] = None,
+    trigram: bool = False,
+    status: Optional[str] = None
+) -> Tuple[str, list]:
+    """
+    Запрос поиска перевалов по названию, области или расстоянию от точки
+    
+    Результаты упорядочены по релевантности, если задан q, иначе по
+    расстоянию для near или по ID.
+    
+    Args:
+        limit: Максимальное количество строк
+        offset: Количество пропускаемых строк
+        bbox: (min_lon, min_lat, max_lon, max_lat)
+        near: (широта, долгота) центра поиска
+        radius: Радиус поиска вокруг near в метрах
+        q: Строка поиска по title, beauty_title и other_titles
+        trigram: Доступно ли расширение pg_trgm для нечеткого поиска
+        status: Фильтр по статусу модерации
+    
+    Returns:
+        Tuple: SQL и список параметров
+    """
+    columns = [f"{PEREVAL_FIELDS[name]} AS {name}" for name in SUMMARY_FIELDS]
+    sources = ["pereval_added p"]
+    conditions = []
+    column_params = []
+    source_params = []
+    condition_params = []
+    
+    if near:
+        latitude, longitude = near
+        columns.append(f"{DISTANCE_M} AS distance")
+        column_params.extend((latitude, latitude, longitude))
+        # Грубый отбор по индексу, точное расстояние считается только для кандидатов
+        bbox = near_bbox(latitude, longitude, radius)
+    
+    if q:
+        sources.append("websearch_to_tsquery('russian', %s) query")
+        source_params.append(q)
+        if trigram:
+            columns.append(f"ts_rank({TITLES_TSVECTOR}, query) + word_similarity(lower(%s), {TITLES_TEXT}) AS score")
+            column_params.append(q)
+            conditions.append(f"({TITLES_TSVECTOR} @@ query OR lower(%s) <%% {TITLES_TEXT})")
+            condition_params.append(q)
+        else:
+            columns.append(f"ts_rank({TITLES_TSVECTOR}, query) AS score")
+            conditions.append(f"{TITLES_TSVECTOR} @@ query")
+    
+    if bbox:
+        conditions.append(f"{GEO_POINT} <@ box(point(%s, %s), point(%s, %s))")
+        condition_params.extend(bbox)
+    if status:
+        conditions.append("p.status = %s")
+        condition_params.append(status)
+    
+    sql = f"SELECT {', '.join(columns)} FROM {', '.join(sources)}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    params = column_params + source_params + condition_params
+    
+    order = "score DESC, id" if q else "distance, id" if near else "id"
+    if near:
+        sql = f"SELECT * FROM ({sql}) found WHERE distance <= %s"
+        params.append(radius)
+    else:
+        sql = f"SELECT * FROM ({sql}) found"
+    sql += f" ORDER BY {order} LIMIT %s OFFSET %s"
+    params.extend((limit, offset))
+    return sql, params
+
+
+SELECT_AREA = "SELECT id, id_parent, title FROM pereval_areas WHERE id = %s"
+
+# Перевалы района и всех вложенных районов через таблицу замыкания
+SELECT_AREA_PEREVAL_PAGE = f"""
+    {_select_pereval(SUMMARY_FIELDS + ('area_id',))}
+    JOIN pereval_areas_closure c ON c.descendant_id = p.area_id
+    WHERE c.ancestor_id = %s AND p.id < %s
+    ORDER BY p.id DESC
+    LIMIT %s
+"""
+
+# Очередь модерации: модератор забирает до N новых перевалов (new -> pending).
+# SKIP LOCKED пропускает строки, которые в этот момент забирает другой модератор,
+# поэтому параллельные запросы не ждут друг друга и не получают одни и те же записи
+CLAIM_PEREVAL = f"""
+    WITH claimed AS (
+        SELECT id FROM pereval_added
+        WHERE status = 'new'
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE pereval_added p
+    SET status = 'pending', claimed_by = %s, claimed_at = now()
+    FROM claimed
+    WHERE p.id = claimed.id
+    RETURNING {', '.join(f"{PEREVAL_FIELDS[name]} AS {name}" for name in SUMMARY_FIELDS)},
+        p.duplicate_of, p.claimed_by, p.claimed_at
+"""
+
+# Решение модератора принимается, только пока перевал закреплен за ним
+RESOLVE_CLAIM = """
+    UPDATE pereval_added
+    SET status = %s, claimed_by = NULL, claimed_at = NULL
+    WHERE id = %s AND status = 'pending' AND claimed_by = %s
+    RETURNING id, status
+"""
+
+# Возврат в очередь перевалов, закрепленных дольше заданного числа секунд
+RECLAIM_STALE_CLAIMS = """
+    UPDATE pereval_added
+    SET status = 'new', claimed_by = NULL, claimed_at = NULL
+    WHERE status = 'pending' AND claimed_at < now() - %s * interval '1 second'
+    RETURNING id
+"""
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """
+    Курсор следующей страницы по последней строке текущей
+    
+    Args:
+        row: Строка с date_added и id
+    
+    Returns:
+        str: Непрозрачный курсор для передачи клиенту
+    """
+    value = json.dumps([row['date_added'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Разбор курсора, полученного от клиента
+    
+    Args:
+        cursor: Значение из encode_cursor
+    
+    Returns:
+        Tuple: (date_added, id)
+    
+    Raises:
+        ValueError: Если курсор некорректен
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_added, pereval_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(date_added), int(pereval_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def sync_query(fields: Tuple[str, ...], email: Optional[str] = None) -> str:
+    """
+    Запрос страницы изменений перевалов после курсора
+    
+    Перевалы упорядочены по транзакции последнего изменения (change_xid).
+    Выдаются только изменения транзакций, завершенных раньше всех текущих
+    (меньше xmin снимка), поэтому медленная транзакция не окажется позади
+    курсора, уже выданного клиенту.
+    
+    Параметры: change_xid и id курсора, [email], размер страницы.
+    
+    Args:
+        fields: Имена полей из PEREVAL_FIELDS
+        email: Ограничить перевалами пользователя (параметр добавляется в запрос)
+    
+    Returns:
+        str: SQL запроса
+    """
+    sql = f"""
+        {_select_pereval(fields, join_user=bool(email), extra_columns=("p.change_xid::text AS change_xid",))}
+        WHERE (p.change_xid, p.id) > (%s::xid8, %s)
+            AND p.change_xid < pg_snapshot_xmin(pg_current_snapshot())
+    """
+    if email:
+        sql += " AND u.email = %s"
+    return sql + " ORDER BY p.change_xid, p.id LIMIT %s"
+
+
+def sync_archived_query(email: Optional[str] = None) -> str:
+    """
+    Запрос страницы перевалов, удаленных архивацией после курсора
+    
+    Отметки pereval_archived упорядочены так же, как изменения в sync_query,
+    и выдаются вместе с ними по общему курсору. Параметры те же.
+    
+    Args:
+        email: Ограничить перевалами пользователя (параметр добавляется в запрос)
+    
+    Returns:
+        str: SQL запроса
+    """
+    sql = """
+        SELECT a.id, a.change_xid::text AS change_xid
+        FROM pereval_archived a
+    """
+    if email:
+        sql += " JOIN pereval_users u ON u.id = a.user_id"
+    sql += """
+        WHERE (a.change_xid, a.id) > (%s::xid8, %s)
+            AND a.change_xid < pg_snapshot_xmin(pg_current_snapshot())
+    """
+    if email:
+        sql += " AND u.email = %s"
+    return sql + " ORDER BY a.change_xid, a.id LIMIT %s"
+
+
+def encode_sync_cursor(row: Dict[str, Any]) -> str:
+    """
+    Курсор синхронизации по последнему выданному изменению
+    
+    Args:
+        row: Строка с change_xid и id
+    
+    Returns:
+        str: Непрозрачный курсор для передачи клиенту
+    """
+    value = json.dumps([row['change_xid'], row['id']])
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_sync_cursor(cursor: Optional[str]) -> Tuple[str, int]:
+    """
+    Разбор курсора синхронизации
+    
+    Args:
+        cursor: Значение из encode_sync_cursor или None для первой синхронизации
+    
+    Returns:
+        Tuple: (change_xid, id)
+    
+    Raises:
+        ValueError: Если курсор некорректен
+    """
+    if not cursor:
+        return '0', 0
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        change_xid, pereval_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(int(change_xid)), int(pereval_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def batch_idempotency_key(idempotency_key: str, index: int) -> str:
+    """
+    Ключ повтора элемента пакета
+    
+    Args:
+        idempotency_key: Ключ повтора пакета
+        index: Позиция элемента в запросе
+    
+    Returns:
+        str: Ключ, сохраняемый в pereval_added.idempotency_key
+    """
+    return f"{idempotency_key}:{index}"
+
+
+def user_values(user_data: Dict[str, Any]) -> Tuple:
+    """
+    Параметры для вставки пользователя (порядок INSERT_USER)
+    
+    Args:
+        user_data: Словарь с данными пользователя
+    
+    Returns:
+        Tuple: Значения email, phone, fam, name, otc
+    """
+    return (
+        user_data['email'],
+        user_data['phone'],
+        user_data['fam'],
+        user_data['name'],
+        user_data.get('otc', '')
+    )
+
+
+def submit_values(
+    pereval_data: Dict[str, Any],
+    images: Sequence[Dict[str, Any]] = (),
+    duplicate_of: Optional[int] = None,
+    idempotency_key: Optional[str] = None
+) -> Tuple:
+    """
+    Параметры для INSERT_PEREVAL_WITH_USER
+    
+    Args:
+        pereval_data: Словарь с данными о перевале и пользователе
+        images: Ссылки на сохраненные изображения
+        duplicate_of: ID вероятного оригинала перевала
+        idempotency_key: Ключ повтора запроса
+    
+    Returns:
+        Tuple: Данные пользователя, email для поиска и данные перевала
+    """
+    user_data = pereval_data['user']
+    return (
+        user_values(user_data)
+        + (user_data['email'],)
+        + pereval_values(pereval_data, images)
+        + (duplicate_of, idempotency_key)
+    )
+
+
+def decode_images(pereval_data: Dict[str, Any]) -> List[Tuple[str, bytes]]:
+    """
+    Декодирование изображений из base64
+    
+    Args:
+        pereval_data: Словарь с данными о перевале
+    
+    Returns:
+        List: Пары (название, двоичные данные)
+    
+    Raises:
+        ValueError: Если данные изображения не являются корректным base64
+    """
+    images = []
+    for image in pereval_data.get('images') or []:
+        data = image['data']
+        # Допускаем data URL вида data:image/jpeg;base64,...
+        if data.startswith('data:'):
+            data = data.partition(',')[2]
+        images.append((image.get('title'), base64.b64decode(data, validate=True)))
+    return images
+
+
+def image_refs(image_ids: Sequence[int], images: Sequence[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """
+    Ссылки на изображения для хранения в pereval_added
+    
+    Args:
+        image_ids: ID строк pereval_images
+        images: Пары (название, двоичные данные)
+    
+    Returns:
+        List: Словари с id и title
+    """
+    return [{"id": image_id, "title": title} for image_id, (title, _) in zip(image_ids, images)]
+
+
+def pereval_values(pereval_data: Dict[str, Any], images: Sequence[Dict[str, Any]] = ()) -> Tuple:
+    """
+    Параметры перевала в порядке столбцов INSERT_PEREVAL и UPDATE_PEREVAL
+    
+    Данные изображений в raw_data и images не попадают, только ссылки.
+    Координаты и add_time уже разобраны моделью и передаются в БД как есть;
+    в raw_data время записывается в исходном формате 'YYYY-MM-DD HH:MM:SS'.
+    
+    Args:
+        pereval_data: Словарь с данными о перевале
+        images: Ссылки на сохраненные изображения
+    
+    Returns:
+        Tuple: Значения столбцов без user_id и id
+    """
+    level = pereval_data.get('level') or {}
+    images = list(images)
+    raw_data = dict(pereval_data, images=images)
+    return (
+        pereval_data.get('beauty_title', ''),
+        pereval_data['title'],
+        pereval_data.get('other_titles', ''),
+        pereval_data.get('connect', ''),
+        pereval_data.get('add_time') or datetime.now(),
+        pereval_data['coords']['latitude'],
+        pereval_data['coords']['longitude'],
+        pereval_data['coords']['height'],
+        level.get('winter', ''),
+        level.get('summer', ''),
+        level.get('autumn', ''),
+        level.get('spring', ''),
+        pereval_data.get('area_id'),
+        json.dumps(raw_data, ensure_ascii=False, default=str),
+        json.dumps(images, ensure_ascii=False)
+    )
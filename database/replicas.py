@@ -0,0 +1,134 @@
+"""
+Реплики PostgreSQL для чтения
+Состояние реплик и токен согласованности чтения после записи (LSN основного сервера)
+"""
+
+import re
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Callable
+from psycopg.conninfo import conninfo_to_dict
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Заголовок с позицией WAL основного сервера после записи
+CONSISTENCY_HEADER = 'X-Consistency-Token'
+
+LSN_PATTERN = re.compile(r'^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$')
+
+# Токен текущего запроса: чтение идет с реплики, которая воспроизвела WAL до этой позиции
+_read_after: ContextVar[Optional[str]] = ContextVar('read_after', default=None)
+
+
+def read_after() -> Optional[str]:
+    """
+    Токен согласованности текущего запроса
+    
+    Returns:
+        str: LSN, до которого реплика должна догнать основной сервер, или None
+    """
+    return _read_after.get()
+
+
+class Replica:
+    """Реплика для чтения: пул подключений и признак доступности"""
+    
+    def __init__(self, dsn: str, pool):
+        """
+        Args:
+            dsn: Строка подключения к реплике
+            pool: AsyncConnectionPool реплики
+        """
+        params = conninfo_to_dict(dsn)
+        self.name = f"{params.get('host', 'localhost')}:{params.get('port', '5432')}"
+        self.pool = pool
+        self.reads = 0
+        self.failures = 0
+        self.lagging = 0
+        self._down_until = 0.0
+    
+    def available(self) -> bool:
+        """Реплика не отключена после ошибки"""
+        return time.monotonic() >= self._down_until
+    
+    def mark_down(self, retry: float, error: Exception):
+        """
+        Отключение реплики на retry секунд после ошибки подключения
+        
+        Args:
+            retry: Через сколько секунд снова пробовать реплику
+            error: Ошибка подключения
+        """
+        self.failures += 1
+        self._down_until = time.monotonic() + retry
+        logger.warning(f"Реплика {self.name} недоступна, чтение с других серверов {retry:.0f} с: {error}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика реплики для /health
+        
+        Returns:
+            Dict: name, available, reads, lagging, failures и размер пула
+        """
+        pool_stats = self.pool.get_stats()
+        return {
+            "name": self.name,
+            "available": self.available(),
+            "reads": self.reads,
+            "lagging": self.lagging,
+            "failures": self.failures,
+            "size": pool_stats.get("pool_size", 0),
+            "available_connections": pool_stats.get("pool_available", 0),
+        }
+
+
+class ConsistencyMiddleware:
+    """
+    ASGI-middleware согласованности чтения после записи
+    
+    Ответ на изменяющий запрос получает заголовок X-Consistency-Token с текущим LSN
+    основного сервера. Клиент передает его в следующих запросах на чтение, и они
+    выполняются только на репликах, которые уже воспроизвели эту запись.
+    """
+    
+    def __init__(self, app, get_manager: Callable[[], Any]):
+        """
+        Args:
+            app: ASGI-приложение
+            get_manager: Функция, возвращающая текущий AsyncDatabaseManager
+        """
+        self.app = app
+        self.get_manager = get_manager
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        token = dict(scope['headers']).get(CONSISTENCY_HEADER.lower().encode(), b'').decode('latin-1')
+        reset = _read_after.set(token if LSN_PATTERN.match(token) else None)
+        
+        manager = self.get_manager()
+        respond = send
+        if scope['method'] not in ('GET', 'HEAD', 'OPTIONS') and manager and manager.replicas:
+            async def respond(message):
+                # Ответ отправляется после фиксации транзакции, LSN уже включает запись
+                if message['type'] == 'http.response.start' and message['status'] < 400:
+                    lsn = await manager.current_lsn()
+                    if lsn:
+                        message['headers'] = list(message.get('headers', [])) + [
+                            (CONSISTENCY_HEADER.lower().encode(), lsn.encode())
+                        ]
+                await send(message)
+        
+        try:
+            await self.app(scope, receive, respond)
+        finally:
+            _read_after.reset(reset)
@@ -26,7 +26,7 @@ CREATE TABLE "public"."pereval_users" (
 -- Таблица перевалов (основная таблица)
 CREATE TABLE "public"."pereval_added" (
     "id" int4 NOT NULL DEFAULT nextval('pereval_id_seq'::regclass),
-    "date_added" timestamp DEFAULT now(),
+    "date_added" timestamp NOT NULL DEFAULT now(),
     "beauty_title" varchar(255),
     "title" varchar(255) NOT NULL,
     "other_titles" varchar(255),
@@ -40,22 +40,47 @@ CREATE TABLE "public"."pereval_added" (
     "level_summer" varchar(10),
     "level_autumn" varchar(10),
     "level_spring" varchar(10),
+    "area_id" int8,
     "status" pereval_status DEFAULT 'new',
+    "version" int4 NOT NULL DEFAULT 1, -- увеличивается при каждом изменении записи
+    "change_xid" xid8 NOT NULL DEFAULT pg_current_xact_id(), -- транзакция последнего изменения (для /sync)
+    "claimed_by" varchar(255),      -- модератор, взявший перевал на проверку
+    "claimed_at" timestamp,         -- время, когда перевал взят на проверку
+    "duplicate_of" int4,            -- вероятный оригинал, если перевал уже был отправлен
+    "idempotency_key" varchar(64),  -- ключ повтора запроса от клиента
     "raw_data" json, -- оставляем для совместимости
     "images" json,   -- оставляем для совместимости
     PRIMARY KEY ("id"),
-    FOREIGN KEY ("user_id") REFERENCES "public"."pereval_users"("id") ON DELETE CASCADE
+    FOREIGN KEY ("user_id") REFERENCES "public"."pereval_users"("id") ON DELETE CASCADE,
+    FOREIGN KEY ("duplicate_of") REFERENCES "public"."pereval_added"("id") ON DELETE SET NULL
 );
 
+-- Учет изменений перевала: версия для оптимистичной блокировки (If-Match при
+-- редактировании) и транзакция изменения для выдачи изменений через /sync
+CREATE OR REPLACE FUNCTION track_pereval_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    NEW.change_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pereval_added_change
+BEFORE INSERT OR UPDATE ON "public"."pereval_added"
+FOR EACH ROW EXECUTE FUNCTION track_pereval_change();
+
 -- Таблица изображений (улучшенная структура)
 CREATE TABLE "public"."pereval_images" (
     "id" int4 NOT NULL DEFAULT nextval('pereval_images_id_seq'::regclass),
     "pereval_id" int4 NOT NULL,
     "date_added" timestamp DEFAULT now(),
-    "img" bytea NOT NULL,
+    "img" bytea,             -- NULL, если изображение хранится в файле
     "title" varchar(255),
     "img_path" varchar(500), -- путь к файлу изображения
     PRIMARY KEY ("id"),
+    CHECK ("img" IS NOT NULL OR "img_path" IS NOT NULL),
     FOREIGN KEY ("pereval_id") REFERENCES "public"."pereval_added"("id") ON DELETE CASCADE
 );
 
@@ -67,6 +92,43 @@ CREATE TABLE "public"."pereval_areas" (
     PRIMARY KEY ("id")
 );
 
+-- Таблица замыкания иерархии районов: все пары (предок, потомок),
+-- включая сам район с глубиной 0. Перестраивается триггером при изменении pereval_areas
+CREATE TABLE "public"."pereval_areas_closure" (
+    "ancestor_id" int8 NOT NULL,
+    "descendant_id" int8 NOT NULL,
+    "depth" int4 NOT NULL,
+    PRIMARY KEY ("ancestor_id", "descendant_id")
+);
+
+CREATE OR REPLACE FUNCTION rebuild_pereval_areas_closure() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM pereval_areas_closure;
+    INSERT INTO pereval_areas_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE tree AS (
+        SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+        FROM pereval_areas
+        UNION ALL
+        -- Корень ссылается сам на себя (id_parent = id), глубина ограничена от циклов
+        SELECT tree.ancestor_id, a.id, tree.depth + 1
+        FROM tree
+        JOIN pereval_areas a ON a.id_parent = tree.descendant_id AND a.id <> a.id_parent
+        WHERE tree.depth < 32
+    )
+    SELECT DISTINCT ON (ancestor_id, descendant_id) ancestor_id, descendant_id, depth
+    FROM tree
+    ORDER BY ancestor_id, descendant_id, depth;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pereval_areas_closure_refresh
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "public"."pereval_areas"
+FOR EACH STATEMENT EXECUTE FUNCTION rebuild_pereval_areas_closure();
+
+ALTER TABLE "public"."pereval_added"
+    ADD FOREIGN KEY ("area_id") REFERENCES "public"."pereval_areas"("id");
+
 -- Таблица типов активности (без изменений)
 CREATE TABLE "public"."spr_activities_types" (
     "id" int4 NOT NULL DEFAULT nextval('activities_types_id_seq'::regclass),
@@ -76,8 +138,28 @@ CREATE TABLE "public"."spr_activities_types" (
 
 -- Создание индексов для улучшения производительности
 CREATE INDEX idx_pereval_added_status ON "public"."pereval_added"("status");
+-- Очередь модерации: новые перевалы по порядку поступления и закрепленные по времени
+CREATE INDEX idx_pereval_added_moderation_queue ON "public"."pereval_added"("id") WHERE "status" = 'new';
+CREATE INDEX idx_pereval_added_claimed_at ON "public"."pereval_added"("claimed_at") WHERE "status" = 'pending';
 CREATE INDEX idx_pereval_added_user_id ON "public"."pereval_added"("user_id");
 CREATE INDEX idx_pereval_added_date_added ON "public"."pereval_added"("date_added");
+-- Курсорная пагинация списка перевалов пользователя (date_added DESC, id DESC)
+CREATE INDEX idx_pereval_added_user_date ON "public"."pereval_added"("user_id", "date_added" DESC, "id" DESC);
+-- Поиск по области карты и ближайших перевалов (встроенный тип point, без PostGIS)
+CREATE INDEX idx_pereval_added_geo ON "public"."pereval_added" USING gist (point("longitude"::float8, "latitude"::float8));
+-- Синхронизация GET /sync: изменения по порядку транзакций (change_xid, id)
+CREATE INDEX idx_pereval_added_change ON "public"."pereval_added"("change_xid", "id");
+CREATE INDEX idx_pereval_added_duplicate_of ON "public"."pereval_added"("duplicate_of") WHERE "duplicate_of" IS NOT NULL;
+-- Повтор запроса с тем же ключом от того же пользователя не создает вторую запись
+CREATE UNIQUE INDEX idx_pereval_added_idempotency ON "public"."pereval_added"("user_id", "idempotency_key")
+    WHERE "idempotency_key" IS NOT NULL;
+-- Перевалы района постранично (id DESC)
+CREATE INDEX idx_pereval_added_area_id ON "public"."pereval_added"("area_id", "id" DESC);
+CREATE INDEX idx_pereval_areas_closure_descendant ON "public"."pereval_areas_closure"("descendant_id");
+-- Полнотекстовый поиск по названиям перевала с русской морфологией
+CREATE INDEX idx_pereval_added_titles_fts ON "public"."pereval_added" USING gin (
+    to_tsvector('russian', coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", ''))
+);
 CREATE INDEX idx_pereval_images_pereval_id ON "public"."pereval_images"("pereval_id");
 CREATE INDEX idx_pereval_users_email ON "public"."pereval_users"("email");
 
@@ -110,3 +192,16 @@ INSERT INTO "public"."pereval_areas" ("id", "id_parent", "title") VALUES
 (399, 384, 'Восточный Саян'),
 (402, 384, 'Кузнецкий Алатау'),
 (459, 65, 'Курайский хребет');
+
+-- Нечеткий поиск по названиям (опечатки, другие написания). Расширение pg_trgm
+-- входит в contrib; если оно недоступно, API ищет только полнотекстовым индексом
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX idx_pereval_added_titles_trgm ON "public"."pereval_added" USING gin (
+        lower(coalesce("title", '') || ' ' || coalesce("beauty_title", '') || ' ' || coalesce("other_titles", '')) gin_trgm_ops
+    );
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm недоступно, нечеткий поиск отключен: %', SQLERRM;
+END;
+$$;
@@ -1,9 +1,15 @@
 """
 Скрипт для инициализации базы данных
-Создает таблицы и заполняет справочные данные
+Создает таблицы и заполняет справочные данные, существующую базу обновляет
+до текущей схемы (database/migrations.sql)
+
+Запуск: python init_db.py [--partitioned]
+С --partitioned таблица pereval_added секционируется по месяцам date_added
+(database/partitioning.sql); так же можно секционировать уже созданную базу.
 """
 
 import os
+import sys
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from dotenv import load_dotenv
@@ -12,8 +18,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def init_database():
-    """Инициализация базы данных"""
+def init_database(partitioned: bool = False):
+    """
+    Инициализация базы данных
+    
+    Args:
+        partitioned: Секционировать pereval_added по месяцам date_added
+    """
     
     # Параметры подключения
     host = os.getenv('FSTR_DB_HOST', 'localhost')
@@ -55,14 +66,31 @@ def init_database():
         )
         cursor = conn.cursor()
         
-        # Читаем и выполняем SQL скрипт
-        with open('database/schema.sql', 'r', encoding='utf-8') as f:
-            sql_script = f.read()
-        
-        cursor.execute(sql_script)
-        conn.commit()
+        # Читаем и выполняем SQL скрипт, если схема еще не создана
+        cursor.execute("SELECT to_regclass('public.pereval_added')")
+        if cursor.fetchone()[0] is None:
+            with open('database/schema.sql', 'r', encoding='utf-8') as f:
+                sql_script = f.read()
+            
+            cursor.execute(sql_script)
+            conn.commit()
+            
+            print("Схема базы данных создана успешно")
+        else:
+            # Существующая база получает столбцы, индексы и триггеры новых версий схемы
+            with open('database/migrations.sql', 'r', encoding='utf-8') as f:
+                cursor.execute(f.read())
+            conn.commit()
+            
+            print("Схема базы данных обновлена")
         
-        print("Схема базы данных создана успешно")
+        if partitioned:
+            # Существующие записи переносятся в секции одной транзакцией
+            with open('database/partitioning.sql', 'r', encoding='utf-8') as f:
+                cursor.execute(f.read())
+            conn.commit()
+            
+            print("Таблица pereval_added секционирована по месяцам")
         
         cursor.close()
         conn.close()
@@ -76,7 +104,7 @@ def init_database():
 
 if __name__ == "__main__":
     print("Инициализация базы данных...")
-    if init_database():
+    if init_database(partitioned='--partitioned' in sys.argv[1:]):
         print("База данных инициализирована успешно!")
     else:
         print("Ошибка при инициализации базы данных")
@@ -4,12 +4,25 @@ REST API для ФСТР - система управления перевала
 """
 
 import logging
-from fastapi import FastAPI, HTTPException, status
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from fastapi import FastAPI, HTTPException, Query, Header, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from contextlib import asynccontextmanager
 
-from database.db_manager import DatabaseManager
-from models.pereval_models import PerevalSubmitData, PerevalResponse
+from database import queries
+from database.async_db_manager import AsyncDatabaseManager
+from database.cache import pereval_etag
+from database.ingest_queue import IngestQueue, IngestWorker
+from database.partitions import PartitionMaintainer
+from database.replicas import ConsistencyMiddleware, CONSISTENCY_HEADER
+from database.image_storage import ImageStorage, ImageTooLargeError, guess_media_type, CHUNK_SIZE
+from serialization import FastJSONResponse, CompressionMiddleware
+import metrics
+from pydantic import ValidationError
+
+from models.pereval_models import PerevalSubmitData, PerevalUpdateData, PerevalResponse, PerevalBatchResponse
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -18,24 +31,256 @@ logger = logging.getLogger(__name__)
 # Глобальная переменная для менеджера БД
 db_manager = None
 
+# Очередь приема перевалов и ее обработчик (включаются через FSTR_INGEST_QUEUE)
+ingest_queue = None
+ingest_worker = None
+
+# Обслуживание секций pereval_added (если таблица секционирована)
+partition_maintainer = None
+
+# Максимальное количество перевалов в одном пакете
+MAX_BATCH_SIZE = 500
+
+# Ключ повтора пакета: к нему добавляется позиция элемента (":499"), а ключ
+# перевала хранится в столбце varchar(64)
+MAX_BATCH_KEY_LENGTH = 64 - len(f":{MAX_BATCH_SIZE - 1}")
+
+# Максимальный размер страницы списка перевалов
+MAX_PAGE_SIZE = 200
+
+# Радиус поиска ближайших перевалов в метрах: по умолчанию и максимальный
+DEFAULT_SEARCH_RADIUS = 10000
+MAX_SEARCH_RADIUS = 500000
+MAX_SEARCH_OFFSET = 10000
+
+# Максимальное количество перевалов, которое модератор берет на проверку за раз
+MAX_CLAIM_SIZE = 100
+
+
+def parse_numbers(value: str, count: int, name: str) -> List[float]:
+    """
+    Разбор списка чисел через запятую из параметра запроса
+    
+    Args:
+        value: Значение параметра
+        count: Ожидаемое количество чисел
+        name: Имя параметра для сообщения об ошибке
+    
+    Returns:
+        List: Числа
+    
+    Raises:
+        HTTPException: 400 при неверном формате
+    """
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Параметр {name} должен содержать {count} числа через запятую"
+        )
+    return numbers
+
+
+def check_coordinates(latitude: float, longitude: float):
+    """Проверка диапазонов широты и долготы"""
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Широта должна быть в пределах [-90, 90], долгота в пределах [-180, 180]"
+        )
+
+
+def submit_message(result: Dict[str, Any]) -> str:
+    """Сообщение об отправке перевала по результату add_pereval или add_pereval_batch"""
+    if not result['created']:
+        return "Запрос уже обработан"
+    if result['duplicate_of']:
+        return "Отправлено успешно, возможно, перевал уже добавлен"
+    return "Отправлено успешно"
+
+# Хранилище загружаемых файлов изображений
+image_storage = ImageStorage()
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбор заголовка Range с одним диапазоном байт
+    
+    Args:
+        range_header: Значение заголовка Range
+        size: Полный размер ресурса
+    
+    Returns:
+        Tuple: Первый и последний байт диапазона или None, если отдается весь ресурс
+    
+    Raises:
+        ValueError: Если диапазон не может быть удовлетворен
+    """
+    if not range_header:
+        return None
+    
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Суффиксный диапазон: последние N байт
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    
+    if start > end or start >= size:
+        raise ValueError(f"Диапазон {range_header} вне размера {size}")
+    return start, end
+
+
+def add_image_urls(pereval_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Добавление URL для загрузки к ссылкам на изображения перевала
+    
+    Записи, сохраненные до переноса изображений в pereval_images, хранят их
+    в прежнем виде ({data, title}); такие элементы отдаются без изменений.
+    """
+    if pereval_data.get('images'):
+        pereval_data['images'] = [
+            dict(image, url=f"/pereval/{pereval_data['id']}/images/{image['id']}") if 'id' in image else image
+            for image in pereval_data['images']
+        ]
+    return pereval_data
+
+
+def etag_response(pereval_data: Dict[str, Any], etag: str, if_none_match: Optional[str]) -> Response:
+    """
+    Ответ с ETag или 304, если у клиента актуальная версия
+    
+    Args:
+        pereval_data: Данные о перевале
+        etag: ETag данных (pereval_etag)
+        if_none_match: Значение заголовка If-None-Match
+    
+    Returns:
+        Данные о перевале в FastJSONResponse или пустой ответ 304
+    """
+    if if_none_match:
+        # Слабое сравнение: префикс W/ не учитывается
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if '*' in tags or etag.removeprefix('W/') in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return FastJSONResponse(pereval_data, headers={"ETag": etag})
+
+
+async def load_pereval(
+    pereval_id: int,
+    view: str = "full",
+    fields: Optional[str] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Получение перевала по ID в запрошенном представлении
+    
+    Args:
+        pereval_id: ID перевала
+        view: full - все поля, summary - queries.SUMMARY_FIELDS
+        fields: Список полей через запятую, имеет приоритет над view
+    
+    Returns:
+        Tuple: Данные о перевале и их ETag
+    
+    Raises:
+        HTTPException: 400 для неизвестных полей, 404 если перевал не найден
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    if fields:
+        selected = tuple(field.strip() for field in fields.split(',') if field.strip())
+    elif view == "summary":
+        selected = queries.SUMMARY_FIELDS
+    else:
+        selected = None
+    
+    # version нужна для ETag, даже если клиент ее не запрашивал
+    query_fields = selected + ('version',) if selected and 'version' not in selected else selected
+    try:
+        pereval_data = await db_manager.get_pereval_by_id(pereval_id, query_fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if not pereval_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Перевал с ID {pereval_id} не найден"
+        )
+    
+    etag = pereval_etag(pereval_data['version'], selected)
+    if query_fields is not selected:
+        pereval_data = dict(pereval_data)
+        del pereval_data['version']
+    return add_image_urls(pereval_data), etag
+
+
+async def iter_db_image(image_id: int, start: int, end: int) -> AsyncIterator[bytes]:
+    """Чтение изображения из БД частями по CHUNK_SIZE"""
+    offset = start
+    while offset <= end:
+        chunk = await db_manager.read_image_chunk(image_id, offset, min(CHUNK_SIZE, end - offset + 1))
+        if not chunk:
+            break
+        offset += len(chunk)
+        yield chunk
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
-    global db_manager
+    global db_manager, ingest_queue, ingest_worker, partition_maintainer
     
     # Инициализация при запуске
-    db_manager = DatabaseManager()
-    if not db_manager.connect():
+    db_manager = AsyncDatabaseManager()
+    if not await db_manager.connect():
         logger.error("Не удалось подключиться к базе данных")
         raise Exception("Ошибка подключения к БД")
     
+    # Отправки, принятые до перезапуска, дописываются в БД обработчиком
+    ingest_queue = IngestQueue.from_env()
+    if ingest_queue:
+        ingest_worker = IngestWorker(ingest_queue, db_manager)
+        ingest_worker.start()
+        logger.info(f"Прием перевалов через очередь {ingest_queue.path}")
+    
+    # Секции будущих месяцев создаются заранее, прошедшие месяцы закрываются
+    if db_manager.partitioned:
+        partition_maintainer = PartitionMaintainer(db_manager)
+        partition_maintainer.start()
+    
     logger.info("Приложение запущено")
     yield
     
     # Очистка при завершении
+    if partition_maintainer:
+        await partition_maintainer.stop()
+    if ingest_worker:
+        await ingest_worker.stop()
+    if ingest_queue:
+        ingest_queue.close()
     if db_manager:
-        db_manager.disconnect()
+        await db_manager.disconnect()
     logger.info("Приложение остановлено")
 
 
@@ -44,7 +289,8 @@ app = FastAPI(
     title="ФСТР API - Система управления перевалами",
     description="REST API для мобильного приложения ФСТР по управлению базой горных перевалов",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Настройка CORS для работы с мобильными приложениями
@@ -54,8 +300,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки ответа, доступные клиенту в браузере: ETag для If-Match и токен согласованности
+    expose_headers=["ETag", CONSISTENCY_HEADER],
 )
 
+# Сжатие больших ответов gzip/brotli по Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Токен согласованности: чтение после записи не попадает на отстающую реплику
+app.add_middleware(ConsistencyMiddleware, get_manager=lambda: db_manager)
+
+# Замер времени ответа; добавляется последним, чтобы учитывать и сжатие
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 @app.get("/")
 async def root():
@@ -72,36 +329,98 @@ async def health_check():
     """Проверка состояния API и подключения к БД"""
     global db_manager
     
-    if not db_manager or not db_manager.connection:
+    if not db_manager or not db_manager.pool:
         return {
             "status": "error",
             "message": "Нет подключения к базе данных"
         }
     
-    try:
-        # Проверяем подключение к БД
-        with db_manager.connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-        
-        return {
-            "status": "ok",
-            "message": "API и база данных работают корректно"
-        }
-    except Exception as e:
+    if not await db_manager.health_check():
         return {
             "status": "error",
-            "message": f"Ошибка подключения к БД: {str(e)}"
+            "message": "Ошибка подключения к БД",
+            "pool": db_manager.pool_stats(),
+            "cache": db_manager.cache_stats()
         }
+    
+    result = {
+        "status": "ok",
+        "message": "API и база данных работают корректно",
+        "pool": db_manager.pool_stats(),
+        "cache": db_manager.cache_stats()
+    }
+    if db_manager.replicas:
+        result["replicas"] = db_manager.replica_stats()
+    if ingest_queue:
+        result["ingest_queue"] = await ingest_queue.stats()
+    return result
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(
+        metrics.render(db_manager.pool_stats() if db_manager else None),
+        media_type=metrics.CONTENT_TYPE
+    )
+
+
+async def enqueue_pereval(
+    pereval_dict: Dict[str, Any],
+    idempotency_key: Optional[str],
+    response: Response
+) -> PerevalResponse:
+    """
+    Сохранение перевала в очередь приема
+    
+    Args:
+        pereval_dict: Проверенные данные о перевале
+        idempotency_key: Ключ повтора запроса
+        response: Ответ FastAPI для установки кода 202
+    
+    Returns:
+        Ответ с ID отправки в submission_id
+    """
+    try:
+        # Некорректные изображения отклоняются сразу, а не при записи в БД
+        queries.decode_images(pereval_dict)
+    except ValueError as e:
+        return PerevalResponse(
+            status=400,
+            message=f"Некорректные данные изображения: {e}",
+            id=None
+        )
+    
+    submission_id = await ingest_queue.enqueue(pereval_dict, idempotency_key)
+    ingest_worker.notify()
+    
+    response.status_code = status.HTTP_202_ACCEPTED
+    return PerevalResponse(
+        status=202,
+        message="Принято в очередь",
+        id=None,
+        submission_id=submission_id
+    )
 
 
 @app.post("/submitData", response_model=PerevalResponse)
-async def submit_data(pereval_data: PerevalSubmitData):
+async def submit_data(
+    pereval_data: PerevalSubmitData,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=64, description="Ключ повтора: повторный запрос с тем же ключом не создает запись"
+    )
+):
     """
     Метод для отправки данных о перевале
     
     Принимает JSON с информацией о перевале и сохраняет в базу данных.
-    Возвращает статус операции и ID созданной записи.
+    Возвращает статус операции и ID созданной записи. Если рядом уже есть
+    перевал с похожим названием, в duplicate_of возвращается его ID.
+    
+    При включенной очереди (FSTR_INGEST_QUEUE) перевал сохраняется в нее и
+    сразу возвращается 202 с submission_id; статус записи в БД -
+    GET /submitData/queue/{submission_id}.
     """
     global db_manager
     
@@ -136,12 +455,15 @@ async def submit_data(pereval_data: PerevalSubmitData):
             )
         
         # Преобразуем Pydantic модель в словарь
-        pereval_dict = pereval_data.dict()
+        pereval_dict = pereval_data.model_dump()
+        
+        if ingest_queue:
+            return await enqueue_pereval(pereval_dict, idempotency_key, response)
         
         # Добавляем перевал в базу данных
-        pereval_id = db_manager.add_pereval(pereval_dict)
+        result = await db_manager.add_pereval(pereval_dict, idempotency_key)
         
-        if pereval_id is None:
+        if result is None:
             logger.error("Не удалось добавить перевал в БД")
             return PerevalResponse(
                 status=500,
@@ -149,13 +471,14 @@ async def submit_data(pereval_data: PerevalSubmitData):
                 id=None
             )
         
-        logger.info(f"Успешно добавлен перевал с ID: {pereval_id}")
+        logger.info(f"Успешно добавлен перевал с ID: {result['id']}")
         return PerevalResponse(
             status=200,
-            message="Отправлено успешно",
-            id=pereval_id
+            message=submit_message(result),
+            id=result['id'],
+            duplicate_of=result['duplicate_of']
         )
-        
+    
     except Exception as e:
         logger.error(f"Ошибка при обработке запроса: {str(e)}")
         return PerevalResponse(
@@ -165,16 +488,277 @@ async def submit_data(pereval_data: PerevalSubmitData):
         )
 
 
+@app.get("/submitData/queue/{submission_id}")
+async def get_submission_status(submission_id: str):
+    """
+    Статус отправки, принятой через очередь
+    
+    Args:
+        submission_id: ID отправки из ответа POST /submitData
+    
+    Returns:
+        status (queued, done, failed), число попыток, ID перевала и
+        duplicate_of после записи в БД, описание ошибки
+    """
+    if not ingest_queue:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Прием перевалов через очередь не включен"
+        )
+    
+    submission = await ingest_queue.get(submission_id)
+    if not submission:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Отправка {submission_id} не найдена"
+        )
+    return submission
+
+
+@app.post("/submitData/batch", response_model=PerevalBatchResponse)
+async def submit_data_batch(
+    pereval_list: List[Dict[str, Any]],
+    idempotency_key: Optional[str] = Header(
+        None, max_length=MAX_BATCH_KEY_LENGTH,
+        description="Ключ повтора: повторный запрос с тем же ключом не создает записи"
+    )
+):
+    """
+    Пакетная отправка данных о перевалах
+    
+    Используется мобильным приложением для синхронизации перевалов,
+    накопленных без связи. Каждый элемент проверяется отдельно, корректные
+    сохраняются одной транзакцией: ошибка БД на любом из них (например,
+    несуществующий area_id) отклоняет все, и ответ получает статус 500.
+    Повтор с тем же Idempotency-Key возвращает ID ранее сохраненных перевалов,
+    а элементы, для которых перевал по ключу не найден, сохраняет.
+    Возвращает статус, ID и duplicate_of для каждого элемента.
+    """
+    global db_manager
+    
+    if not db_manager:
+        logger.error("Менеджер БД не инициализирован")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    if len(pereval_list) > MAX_BATCH_SIZE:
+        return PerevalBatchResponse(
+            status=400,
+            message=f"Слишком много перевалов в пакете, максимум {MAX_BATCH_SIZE}",
+            items=[]
+        )
+    
+    # Проверяем каждый элемент отдельно, чтобы одна ошибка не отклоняла весь пакет
+    items = []
+    valid = []
+    for item in pereval_list:
+        try:
+            pereval_data = PerevalSubmitData.model_validate(item)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = '.'.join(str(part) for part in error['loc'])
+            items.append(PerevalResponse(status=400, message=f"Ошибка валидации данных: {field}: {error['msg']}", id=None))
+            continue
+        
+        if not pereval_data.title:
+            items.append(PerevalResponse(status=400, message="Отсутствует обязательное поле: title", id=None))
+            continue
+        
+        items.append(None)
+        valid.append((len(items) - 1, pereval_data.model_dump()))
+    
+    if valid:
+        keys = [queries.batch_idempotency_key(idempotency_key, index) for index, _ in valid] if idempotency_key else None
+        results = await db_manager.add_pereval_batch([pereval_dict for _, pereval_dict in valid], keys)
+        if results is None:
+            # Корректные перевалы сохраняются вместе, поэтому не сохранен ни один
+            for index, _ in valid:
+                items[index] = PerevalResponse(status=500, message="Ошибка при сохранении данных в базу данных", id=None)
+            logger.error("Пакетная отправка не сохранена")
+            return PerevalBatchResponse(
+                status=500,
+                message="Пакет не сохранен: ошибка базы данных, ни один перевал не записан",
+                items=items
+            )
+        
+        for (index, _), result in zip(valid, results):
+            items[index] = PerevalResponse(
+                status=200,
+                message=submit_message(result),
+                id=result['id'],
+                duplicate_of=result['duplicate_of']
+            )
+    
+    saved = sum(1 for item in items if item.status == 200)
+    logger.info(f"Пакетная отправка: сохранено {saved} из {len(items)}")
+    return PerevalBatchResponse(
+        status=200 if saved == len(items) else 207,
+        message=f"Сохранено {saved} из {len(items)}",
+        items=items
+    )
+
+
+@app.get("/pereval/search")
+async def search_pereval(
+    q: Optional[str] = Query(None, min_length=2, max_length=200, description="Поиск по названиям перевала"),
+    bbox: Optional[str] = Query(None, description="Область карты: min_lon,min_lat,max_lon,max_lat"),
+    near: Optional[str] = Query(None, description="Центр поиска: lat,lon"),
+    radius: float = Query(DEFAULT_SEARCH_RADIUS, gt=0, le=MAX_SEARCH_RADIUS, description="Радиус поиска в метрах"),
+    pereval_status: Optional[str] = Query(
+        None, alias="status", pattern="^(new|pending|accepted|rejected)$", description="Статус модерации"
+    ),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Максимальное количество перевалов"),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET, description="Количество пропускаемых перевалов")
+):
+    """
+    Поиск перевалов по названию, области карты или рядом с точкой
+    
+    Нужно указать q, bbox или near; bbox и near вместе не допускаются.
+    Поиск по q учитывает русскую морфологию и опечатки, результаты идут по
+    убыванию релевантности (поле score). Для near без q перевалы
+    возвращаются по возрастанию расстояния, в поле distance - расстояние в метрах.
+    
+    Args:
+        q: Поиск по title, beauty_title и other_titles
+        bbox: Область карты: min_lon,min_lat,max_lon,max_lat
+        near: Центр поиска: lat,lon
+        radius: Радиус поиска вокруг near в метрах
+        pereval_status: Фильтр по статусу модерации
+        limit: Максимальное количество перевалов
+        offset: Количество пропускаемых перевалов
+    
+    Returns:
+        Список найденных перевалов в кратком представлении
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    q = q.strip() if q else None
+    if bbox and near:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите только один из параметров: bbox или near"
+        )
+    if not (q or bbox or near):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите хотя бы один из параметров: q, bbox или near"
+        )
+    
+    bbox_values = None
+    near_values = None
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = parse_numbers(bbox, 4, "bbox")
+        check_coordinates(min_lat, min_lon)
+        check_coordinates(max_lat, max_lon)
+        if min_lon > max_lon or min_lat > max_lat:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="В bbox минимальные координаты должны быть не больше максимальных"
+            )
+        bbox_values = (min_lon, min_lat, max_lon, max_lat)
+    elif near:
+        latitude, longitude = parse_numbers(near, 2, "near")
+        check_coordinates(latitude, longitude)
+        near_values = (latitude, longitude)
+    
+    pereval_list = await db_manager.search_pereval(
+        limit=limit,
+        offset=offset,
+        bbox=bbox_values,
+        near=near_values,
+        radius=radius if near_values else None,
+        q=q,
+        status=pereval_status
+    )
+    
+    for pereval_data in pereval_list:
+        add_image_urls(pereval_data)
+        if 'distance' in pereval_data:
+            pereval_data['distance'] = round(pereval_data['distance'], 1)
+        if 'score' in pereval_data:
+            pereval_data['score'] = round(pereval_data['score'], 4)
+    
+    return FastJSONResponse({
+        "message": f"Найдено {len(pereval_list)} перевалов",
+        "pereval_list": pereval_list,
+        "next_offset": offset + limit if len(pereval_list) == limit else None
+    })
+
+
 @app.get("/pereval/{pereval_id}")
-async def get_pereval(pereval_id: int):
+async def get_pereval(
+    pereval_id: int,
+    view: str = Query("full", pattern="^(full|summary)$", description="Представление: full или summary"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую"),
+    if_none_match: Optional[str] = Header(None, description="ETag ранее полученной версии")
+):
     """
     Получение данных о перевале по ID
     
     Args:
         pereval_id: ID перевала
-        
+        view: full - все поля, summary - название, координаты и статус
+        fields: Список полей через запятую, имеет приоритет над view
+        if_none_match: ETag ранее полученной версии
+    
     Returns:
-        Данные о перевале или ошибку
+        Данные о перевале или ошибку, 304 если данные не изменились
+    """
+    pereval_data, etag = await load_pereval(pereval_id, view, fields)
+    return etag_response(pereval_data, etag, if_none_match)
+
+
+# Форма загрузки изображения для документации OpenAPI: тело разбирается вручную
+IMAGE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary", "description": "Файл изображения"},
+                        "title": {"type": "string", "description": "Название изображения"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@app.post("/pereval/{pereval_id}/images", openapi_extra=IMAGE_UPLOAD_BODY)
+async def upload_pereval_image(
+    pereval_id: int,
+    request: Request,
+    content_type: str = Header("", include_in_schema=False),
+    content_length: Optional[int] = Header(None, include_in_schema=False)
+):
+    """
+    Загрузка изображения перевала через multipart/form-data (поля file и title)
+    
+    Тело запроса разбирается по мере получения, и файл записывается в
+    хранилище частями, без base64 и без промежуточной копии. Слишком большой
+    файл отклоняется по Content-Length до чтения тела или во время чтения.
+    Добавлять изображения можно только к записям со статусом 'new'.
+    
+    Args:
+        pereval_id: ID перевала
+        request: Запрос с телом multipart/form-data
+        content_type: Заголовок Content-Type с boundary
+        content_length: Заголовок Content-Length
+    
+    Returns:
+        Результат с state, message и id изображения
     """
     global db_manager
     
@@ -184,27 +768,43 @@ async def get_pereval(pereval_id: int):
             detail="Ошибка инициализации базы данных"
         )
     
-    pereval_data = db_manager.get_pereval_by_id(pereval_id)
-    
-    if not pereval_data:
+    try:
+        img_path, fields = await image_storage.save(pereval_id, content_type, content_length, request.stream())
+    except ImageTooLargeError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Перевал с ID {pereval_id} не найден"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
     
-    return pereval_data
+    result = await db_manager.add_pereval_image(pereval_id, fields.get('title') or fields['filename'], img_path)
+    if not result["state"]:
+        image_storage.delete(img_path)
+    return result
 
 
-@app.get("/submitData/{pereval_id}")
-async def get_pereval_by_id(pereval_id: int):
+@app.get("/pereval/{pereval_id}/images/{image_id}")
+async def get_pereval_image(
+    pereval_id: int,
+    image_id: int,
+    range_header: Optional[str] = Header(None, alias="Range")
+):
     """
-    Получение записи о перевале по ID
+    Получение изображения перевала потоком
+    
+    Поддерживает заголовок Range для частичной загрузки и докачки.
     
     Args:
         pereval_id: ID перевала
-        
+        image_id: ID изображения
+        range_header: Запрошенный диапазон байт
+    
     Returns:
-        Данные о перевале с полной информацией включая статус модерации
+        Данные изображения (200 или 206 для диапазона)
     """
     global db_manager
     
@@ -214,31 +814,126 @@ async def get_pereval_by_id(pereval_id: int):
             detail="Ошибка инициализации базы данных"
         )
     
-    pereval_data = db_manager.get_pereval_by_id(pereval_id)
+    image = await db_manager.get_pereval_image(pereval_id, image_id)
+    size = None
+    if image:
+        if image['img_path']:
+            size = image_storage.size(image['img_path'])
+            media_type = guess_media_type(name=image['img_path'])
+        else:
+            size = image['size']
+            media_type = guess_media_type(image['head'])
     
-    if not pereval_data:
+    if size is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Перевал с ID {pereval_id} не найден"
+            detail=f"Изображение с ID {image_id} не найдено"
         )
     
-    return pereval_data
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    start, end = byte_range or (0, size - 1)
+    if image['img_path']:
+        body = image_storage.iter_file(image['img_path'], start, end)
+    else:
+        body = iter_db_image(image_id, start, end)
+    
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return StreamingResponse(
+        body,
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+@app.get("/submitData/{pereval_id}")
+async def get_pereval_by_id(
+    pereval_id: int,
+    view: str = Query("full", pattern="^(full|summary)$", description="Представление: full или summary"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую"),
+    if_none_match: Optional[str] = Header(None, description="ETag ранее полученной версии")
+):
+    """
+    Получение записи о перевале по ID
+    
+    Args:
+        pereval_id: ID перевала
+        view: full - все поля, summary - название, координаты и статус
+        fields: Список полей через запятую, имеет приоритет над view
+        if_none_match: ETag ранее полученной версии
+    
+    Returns:
+        Данные о перевале с полной информацией включая статус модерации,
+        304 если данные не изменились
+    """
+    pereval_data, etag = await load_pereval(pereval_id, view, fields)
+    return etag_response(pereval_data, etag, if_none_match)
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Версия перевала из заголовка If-Match
+    
+    Args:
+        if_match: Значение заголовка: ETag из ответа GET (W/"<version>" или
+            W/"<version>-<поля>"), версия в кавычках или без, либо *
+    
+    Returns:
+        Ожидаемая версия или None, если проверка не нужна
+    """
+    if not if_match or if_match.strip() == '*':
+        return None
+    try:
+        return int(if_match.strip().removeprefix('W/').strip('"').split('-')[0])
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match должен содержать ETag перевала или его версию из поля version"
+        )
+
+
+# Коды ответа при отказе в редактировании перевала
+UPDATE_REFUSED_STATUS = {
+    "not_found": status.HTTP_404_NOT_FOUND,
+    "not_new": status.HTTP_409_CONFLICT,
+    "version_mismatch": status.HTTP_412_PRECONDITION_FAILED,
+}
 
 
 @app.patch("/submitData/{pereval_id}")
-async def update_pereval(pereval_id: int, pereval_data: PerevalSubmitData):
+async def update_pereval(
+    pereval_id: int,
+    pereval_data: PerevalUpdateData,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="Версия перевала (поле version), которую редактирует клиент")
+):
     """
     Редактирование существующей записи о перевале
     
-    Редактировать можно только записи со статусом 'new'.
+    Редактировать можно только записи со статусом 'new'. Изменяются только
+    переданные поля; изображения заменяются, только если передан images.
     Нельзя редактировать ФИО, email и телефон пользователя.
+    С заголовком If-Match запись обновляется, только если ее версия не
+    изменилась, иначе ответ 412 с текущей версией.
     
     Args:
         pereval_id: ID перевала для редактирования
-        pereval_data: Новые данные о перевале
-        
+        pereval_data: Изменяемые поля перевала
+        if_match: Ожидаемая версия перевала
+    
     Returns:
-        Результат обновления с state и message
+        Результат обновления с state, message и новой version; 404, если
+        перевала нет, 409, если он уже обработан модератором
     """
     global db_manager
     
@@ -249,38 +944,28 @@ async def update_pereval(pereval_id: int, pereval_data: PerevalSubmitData):
         )
     
     try:
-        # Валидация обязательных полей
-        if not pereval_data.title or not pereval_data.title.strip():
-            return {
-                "state": 0,
-                "message": "Отсутствует обязательное поле: title"
-            }
+        # Только переданные клиентом поля; данные пользователя не редактируются
+        pereval_dict = pereval_data.model_dump(exclude_unset=True)
+        pereval_dict.pop('user', None)
         
-        if not pereval_data.coords:
+        if not pereval_dict:
             return {
                 "state": 0,
-                "message": "Отсутствуют обязательные поля: coords"
+                "message": "Нет данных для обновления"
             }
         
-        # Дополнительная валидация координат
-        try:
-            float(pereval_data.coords.latitude)
-            float(pereval_data.coords.longitude)
-            int(pereval_data.coords.height)
-        except (ValueError, TypeError):
-            return {
-                "state": 0,
-                "message": "Некорректные данные координат"
-            }
-        
-        # Преобразуем Pydantic модель в словарь
-        pereval_dict = pereval_data.dict()
-        
         # Обновляем перевал в базе данных
-        result = db_manager.update_pereval(pereval_id, pereval_dict)
+        result = await db_manager.update_pereval(pereval_id, pereval_dict, parse_if_match(if_match))
         
+        reason = result.pop('reason', None)
+        if reason:
+            response.status_code = UPDATE_REFUSED_STATUS[reason]
+        if 'version' in result:
+            response.headers["ETag"] = pereval_etag(result["version"])
         return result
-        
+    
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Ошибка валидации данных: {str(e)}")
         return {
@@ -296,15 +981,31 @@ async def update_pereval(pereval_id: int, pereval_data: PerevalSubmitData):
 
 
 @app.get("/submitData/")
-async def get_pereval_by_user_email(user__email: str = Query(..., description="Email пользователя")):
+async def get_pereval_by_user_email(
+    user__email: str = Query(..., description="Email пользователя"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+    pereval_status: Optional[str] = Query(
+        None, alias="status", pattern="^(new|pending|accepted|rejected)$", description="Статус модерации"
+    ),
+    date_from: Optional[datetime] = Query(None, description="Добавлены не раньше"),
+    date_to: Optional[datetime] = Query(None, description="Добавлены раньше"),
+    view: str = Query("full", pattern="^(full|summary)$", description="Представление: full или summary")
+):
     """
-    Получение списка всех перевалов пользователя по email
+    Получение списка перевалов пользователя по email постранично
     
     Args:
         user__email: Email пользователя
-        
+        limit: Размер страницы
+        cursor: Курсор из next_cursor предыдущей страницы
+        pereval_status: Фильтр по статусу модерации
+        date_from: Начало периода по дате добавления
+        date_to: Конец периода по дате добавления
+        view: full - все поля, summary - название, координаты и статус
+    
     Returns:
-        Список всех перевалов пользователя
+        Страница перевалов пользователя и курсор следующей страницы
     """
     global db_manager
     
@@ -314,20 +1015,263 @@ async def get_pereval_by_user_email(user__email: str = Query(..., description="E
             detail="Ошибка инициализации базы данных"
         )
     
-    pereval_list = db_manager.get_pereval_by_user_email(user__email)
+    try:
+        pereval_list, next_cursor = await db_manager.get_pereval_by_user_email(
+            user__email,
+            limit=limit,
+            cursor=cursor,
+            status=pereval_status,
+            date_from=date_from,
+            date_to=date_to,
+            fields=queries.SUMMARY_FIELDS if view == "summary" else None
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     if not pereval_list:
         return {
             "message": f"Перевалы для пользователя с email {user__email} не найдены",
-            "pereval_list": []
+            "pereval_list": [],
+            "next_cursor": None
         }
     
-    return {
+    return FastJSONResponse({
         "message": f"Найдено {len(pereval_list)} перевалов для пользователя {user__email}",
-        "pereval_list": pereval_list
-    }
+        "pereval_list": [add_image_urls(pereval_data) for pereval_data in pereval_list],
+        "next_cursor": next_cursor
+    })
+
+
+@app.get("/areas/{area_id}/pereval")
+async def get_pereval_by_area(
+    area_id: int,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[int] = Query(None, description="Курсор следующей страницы из next_cursor")
+):
+    """
+    Получение перевалов района, включая все вложенные районы, постранично
+    
+    Args:
+        area_id: ID района из pereval_areas
+        limit: Размер страницы
+        cursor: Курсор из next_cursor предыдущей страницы
+    
+    Returns:
+        Район, страница перевалов (новые сначала) и курсор следующей страницы
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    area = await db_manager.get_area(area_id)
+    if not area:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Район с ID {area_id} не найден"
+        )
+    
+    pereval_list, next_cursor = await db_manager.get_pereval_by_area(area_id, limit=limit, cursor=cursor)
+    
+    return FastJSONResponse({
+        "message": f"Найдено {len(pereval_list)} перевалов в районе {area['title']}",
+        "area": area,
+        "pereval_list": [add_image_urls(pereval_data) for pereval_data in pereval_list],
+        "next_cursor": next_cursor
+    })
 
 
+@app.get("/sync")
+async def sync_pereval(
+    since: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей синхронизации"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    view: str = Query("summary", pattern="^(full|summary)$", description="Представление: full или summary"),
+    user_email: Optional[str] = Query(None, alias="user__email", description="Только перевалы пользователя")
+):
+    """
+    Перевалы, добавленные или измененные после курсора
+    
+    Мобильное приложение хранит next_cursor и при следующей синхронизации
+    получает только изменения, включая смену статуса модерации. Без since
+    выдаются все перевалы; пока has_more равно true, следующую страницу
+    запрашивают сразу. Перевалы, перенесенные в архив, приходят в списке
+    archived, и приложение удаляет их у себя.
+    
+    Args:
+        since: Курсор из предыдущего ответа
+        limit: Размер страницы
+        view: Представление перевалов
+        user_email: Email пользователя
+    
+    Returns:
+        Измененные перевалы (с полем version), ID архивированных, курсор и признак has_more
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    fields = tuple(queries.PEREVAL_FIELDS) if view == "full" else queries.SUMMARY_FIELDS + ('version',)
+    try:
+        pereval_list, archived, next_cursor, has_more = await db_manager.get_changes(
+            since, limit=limit, fields=fields, email=user_email
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return FastJSONResponse({
+        "pereval_list": [add_image_urls(pereval_data) for pereval_data in pereval_list],
+        "archived": archived,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
+
+
+@app.post("/moderation/claim")
+async def claim_pereval(
+    moderator: str = Query(..., min_length=1, max_length=255, description="Имя или email модератора"),
+    n: int = Query(10, ge=1, le=MAX_CLAIM_SIZE, description="Сколько перевалов взять на проверку")
+):
+    """
+    Получение новых перевалов на проверку
+    
+    До n перевалов со статусом new переводятся в pending и закрепляются за
+    модератором. Параллельные модераторы получают разные перевалы.
+    
+    Args:
+        moderator: Имя или email модератора
+        n: Сколько перевалов взять на проверку
+    
+    Returns:
+        Список закрепленных перевалов в кратком представлении
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    pereval_list = await db_manager.claim_pereval(moderator, n)
+    if pereval_list is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при получении перевалов на проверку"
+        )
+    
+    return FastJSONResponse({
+        "message": f"Взято на проверку {len(pereval_list)} перевалов",
+        "pereval_list": [add_image_urls(pereval_data) for pereval_data in pereval_list]
+    })
+
+
+async def resolve_claim(pereval_id: int, moderator: str, new_status: str) -> Dict[str, Any]:
+    """Решение модератора по перевалу для accept/reject"""
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    resolved = await db_manager.resolve_claim(pereval_id, moderator, new_status)
+    if resolved is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при обновлении статуса"
+        )
+    if not resolved:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Перевал с ID {pereval_id} не закреплен за модератором {moderator}"
+        )
+    
+    return {"state": 1, "message": f"Перевал {pereval_id} переведен в статус {new_status}"}
+
+
+@app.post("/moderation/{pereval_id}/accept")
+async def accept_pereval(
+    pereval_id: int,
+    moderator: str = Query(..., min_length=1, max_length=255, description="Имя или email модератора")
+):
+    """
+    Принятие перевала, закрепленного за модератором
+    
+    Args:
+        pereval_id: ID перевала
+        moderator: Модератор, взявший перевал на проверку
+    
+    Returns:
+        Результат операции; 409, если перевал не закреплен за модератором
+    """
+    return await resolve_claim(pereval_id, moderator, "accepted")
+
+
+@app.post("/moderation/{pereval_id}/reject")
+async def reject_pereval(
+    pereval_id: int,
+    moderator: str = Query(..., min_length=1, max_length=255, description="Имя или email модератора")
+):
+    """
+    Отклонение перевала, закрепленного за модератором
+    
+    Args:
+        pereval_id: ID перевала
+        moderator: Модератор, взявший перевал на проверку
+    
+    Returns:
+        Результат операции; 409, если перевал не закреплен за модератором
+    """
+    return await resolve_claim(pereval_id, moderator, "rejected")
+
+
+@app.post("/moderation/reclaim")
+async def reclaim_stale_claims(
+    older_than: Optional[int] = Query(None, ge=0, description="Время на проверке в секундах")
+):
+    """
+    Возврат в очередь перевалов, проверка которых не завершена вовремя
+    
+    Args:
+        older_than: Время на проверке в секундах (по умолчанию FSTR_CLAIM_TIMEOUT)
+    
+    Returns:
+        ID перевалов, снова получивших статус new
+    """
+    global db_manager
+    
+    if not db_manager:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка инициализации базы данных"
+        )
+    
+    if older_than is None:
+        older_than = db_manager.claim_timeout
+    
+    pereval_ids = await db_manager.reclaim_stale_claims(older_than)
+    if pereval_ids is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при возврате перевалов в очередь"
+        )
+    
+    return {
+        "message": f"Возвращено в очередь {len(pereval_ids)} перевалов",
+        "pereval_ids": pereval_ids
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,241 @@
+"""
+Метрики API в текстовом формате Prometheus
+Время ответа по маршрутам, запросы в обработке и время методов менеджеров БД
+"""
+
+import os
+import time
+import inspect
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from typing import Dict, Tuple, Sequence, Optional
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Вызовы методов БД дольше этого порога в миллисекундах пишутся в лог (0 - не писать)
+SLOW_QUERY_MS = float(os.getenv('FSTR_SLOW_QUERY_MS', '500'))
+
+# Границы корзин гистограмм в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Гистограмма с метками; наблюдение - поиск корзины и два сложения"""
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Args:
+            name: Имя метрики
+            documentation: Описание для # HELP
+            labels: Имена меток
+            buckets: Верхние границы корзин
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Значения меток -> [счетчики корзин (последняя - +Inf), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values: str):
+        """Учет одного наблюдения"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def render(self) -> list:
+        """Строки метрики в формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Значение с метками, которое растет и уменьшается"""
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+    
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = value
+    
+    def render(self) -> list:
+        """Строки метрики в формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'fstr_http_request_duration_seconds',
+    'Время обработки HTTP-запроса',
+    ('method', 'route', 'status')
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'fstr_http_requests_in_progress',
+    'Запросы в обработке',
+    ('method',)
+)
+DB_DURATION = Histogram(
+    'fstr_db_call_duration_seconds',
+    'Время вызова метода менеджера БД, включая ожидание подключения из пула',
+    ('manager', 'method')
+)
+DB_POOL = Gauge(
+    'fstr_db_pool',
+    'Состояние пула подключений на момент запроса метрик',
+    ('stat',)
+)
+
+
+def _observe_call(manager: str, method: str, started: float):
+    elapsed = time.perf_counter() - started
+    DB_DURATION.observe(elapsed, manager, method)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f"Медленный вызов БД {manager}.{method}: {elapsed * 1000:.1f} мс")
+
+
+def instrument(exclude: Sequence[str] = ()):
+    """
+    Декоратор класса менеджера БД: время и количество вызовов каждого публичного метода
+    
+    Args:
+        exclude: Методы, которые не замеряются (подключение, статистика)
+    """
+    def decorate(cls):
+        manager = cls.__name__
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not inspect.isfunction(method):
+                continue
+            setattr(cls, name, _timed(manager, name, method))
+        return cls
+    return decorate
+
+
+def _timed(manager: str, name: str, method):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _observe_call(manager, name, started)
+    else:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _observe_call(manager, name, started)
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware замера времени ответа
+    
+    Метка route - шаблон пути маршрута (/pereval/{pereval_id}), а не сам путь,
+    чтобы число рядов не росло с количеством перевалов.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope['method']
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+        
+        REQUESTS_IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method,
+                getattr(route, 'path', 'unmatched'),
+                str(status_code)
+            )
+            REQUESTS_IN_PROGRESS.dec(method)
+
+
+def render(pool_stats: Optional[Dict[str, int]] = None) -> str:
+    """
+    Все метрики в текстовом формате Prometheus
+    
+    Args:
+        pool_stats: Статистика пула подключений из AsyncDatabaseManager.pool_stats()
+    
+    Returns:
+        str: Тело ответа GET /metrics
+    """
+    for stat, value in (pool_stats or {}).items():
+        DB_POOL.set(value, stat)
+    lines = []
+    for metric in (REQUEST_DURATION, REQUESTS_IN_PROGRESS, DB_DURATION, DB_POOL):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -4,10 +4,33 @@
 """
 
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
 from datetime import datetime
 
 
+# Единственный принимаемый формат времени добавления
+ADD_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def validate_add_time(v, handler):
+    """
+    Разбор времени добавления: строка 'YYYY-MM-DD HH:MM:SS' разбирается один раз в datetime
+    
+    Пустая строка, как и раньше, означает отсутствие времени. Другие форматы
+    (дата без времени, ISO со смещением, unix-время) не принимаются.
+    """
+    if v is None or v == '':
+        return None
+    if isinstance(v, datetime):
+        return handler(v)
+    if isinstance(v, str):
+        try:
+            return datetime.strptime(v, ADD_TIME_FORMAT)
+        except ValueError:
+            pass
+    raise ValueError('Некорректный формат времени. Используйте: YYYY-MM-DD HH:MM:SS')
+
+
 class UserData(BaseModel):
     """Модель данных пользователя"""
     email: str = Field(..., description="Email пользователя")
@@ -16,13 +39,15 @@ class UserData(BaseModel):
     name: str = Field(..., description="Имя")
     otc: Optional[str] = Field(None, description="Отчество")
     
-    @validator('email')
+    @field_validator('email')
+    @classmethod
     def validate_email(cls, v):
         if '@' not in v:
             raise ValueError('Некорректный email')
         return v
     
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
         # Убираем все нецифровые символы для проверки
         digits_only = ''.join(filter(str.isdigit, v))
@@ -32,18 +57,25 @@ class UserData(BaseModel):
 
 
 class Coordinates(BaseModel):
-    """Модель координат перевала"""
-    latitude: str = Field(..., description="Широта")
-    longitude: str = Field(..., description="Долгота")
-    height: str = Field(..., description="Высота")
+    """
+    Модель координат перевала
     
-    @validator('latitude', 'longitude', 'height')
-    def validate_coordinates(cls, v):
+    Принимаются и строки ("45.3842"), и числа; значения разбираются один раз
+    в float и int и в таком виде передаются в БД.
+    """
+    model_config = ConfigDict(allow_inf_nan=False)
+    
+    latitude: float = Field(..., description="Широта")
+    longitude: float = Field(..., description="Долгота")
+    height: int = Field(..., description="Высота")
+    
+    @field_validator('latitude', 'longitude', 'height', mode='wrap')
+    @classmethod
+    def validate_coordinates(cls, v, handler):
         try:
-            float(v)
-        except ValueError:
+            return handler(v)
+        except ValidationError:
             raise ValueError('Координаты должны быть числовыми')
-        return v
 
 
 class Level(BaseModel):
@@ -66,20 +98,51 @@ class PerevalSubmitData(BaseModel):
     title: str = Field(..., description="Название перевала")
     other_titles: Optional[str] = Field(None, description="Другие названия")
     connect: Optional[str] = Field(None, description="Что соединяет")
-    add_time: Optional[str] = Field(None, description="Время добавления")
+    add_time: Optional[datetime] = Field(None, description="Время добавления")
     user: UserData = Field(..., description="Данные пользователя")
     coords: Coordinates = Field(..., description="Координаты")
     level: Level = Field(..., description="Категории трудности")
+    area_id: Optional[int] = Field(None, description="ID района из pereval_areas")
     images: List[ImageData] = Field(default=[], description="Изображения")
     
-    @validator('add_time')
-    def validate_add_time(cls, v):
-        if v:
-            try:
-                datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                raise ValueError('Некорректный формат времени. Используйте: YYYY-MM-DD HH:MM:SS')
+    _validate_add_time = field_validator('add_time', mode='wrap')(validate_add_time)
+
+
+class CoordinatesUpdate(Coordinates):
+    """Модель изменяемых координат: передаются только изменившиеся значения, null не допускается"""
+    latitude: float = Field(None, description="Широта")
+    longitude: float = Field(None, description="Долгота")
+    height: int = Field(None, description="Высота")
+
+
+class PerevalUpdateData(BaseModel):
+    """Модель частичного редактирования перевала: изменяются только переданные поля"""
+    beauty_title: Optional[str] = Field(None, description="Красивое название")
+    title: Optional[str] = Field(None, description="Название перевала")
+    other_titles: Optional[str] = Field(None, description="Другие названия")
+    connect: Optional[str] = Field(None, description="Что соединяет")
+    add_time: Optional[datetime] = Field(None, description="Время добавления")
+    user: Optional[Dict[str, Any]] = Field(None, description="Данные пользователя (не изменяются)")
+    coords: Optional[CoordinatesUpdate] = Field(None, description="Координаты")
+    level: Optional[Level] = Field(None, description="Категории трудности")
+    area_id: Optional[int] = Field(None, description="ID района из pereval_areas")
+    images: Optional[List[ImageData]] = Field(None, description="Новый список изображений взамен прежнего")
+    
+    @field_validator('title')
+    @classmethod
+    def validate_title(cls, v):
+        if v is None or not v.strip():
+            raise ValueError('Название перевала не может быть пустым')
         return v
+    
+    @field_validator('coords', 'images')
+    @classmethod
+    def validate_not_null(cls, v):
+        if v is None:
+            raise ValueError('Поле не может быть null')
+        return v
+    
+    _validate_add_time = field_validator('add_time', mode='wrap')(validate_add_time)
 
 
 class PerevalResponse(BaseModel):
@@ -87,6 +150,15 @@ class PerevalResponse(BaseModel):
     status: int = Field(..., description="HTTP статус код")
     message: Optional[str] = Field(None, description="Сообщение")
     id: Optional[int] = Field(None, description="ID созданной записи")
+    duplicate_of: Optional[int] = Field(None, description="ID вероятного оригинала, если перевал уже был добавлен")
+    submission_id: Optional[str] = Field(None, description="ID отправки в очереди приема")
+
+
+class PerevalBatchResponse(BaseModel):
+    """Модель ответа на пакетную отправку перевалов"""
+    status: int = Field(..., description="HTTP статус код")
+    message: Optional[str] = Field(None, description="Сообщение")
+    items: List[PerevalResponse] = Field(default=[], description="Результаты по каждому перевалу в порядке отправки")
 
 
 class PerevalStatus(str):
@@ -0,0 +1,172 @@
+"""
+Быстрая сериализация и сжатие ответов API
+JSON формируется через orjson без обхода jsonable_encoder, большие ответы сжимаются gzip или brotli
+"""
+
+import os
+import gzip
+import logging
+from decimal import Decimal
+from typing import Any, Optional
+import orjson
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ответы меньше этого размера в байтах не сжимаются
+COMPRESS_MIN_SIZE = int(os.getenv('FSTR_COMPRESS_MIN_SIZE', '1024'))
+
+# Уровни сжатия: компромисс между размером и временем на запрос
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Сжимаемые типы содержимого; изображения уже сжаты
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые orjson не сериализует сам (Decimal из столбцов numeric)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Сериализация в JSON
+    
+    datetime, UUID и dataclass orjson обрабатывает сам, Decimal - через _default.
+    
+    Args:
+        content: Данные ответа
+    
+    Returns:
+        bytes: JSON в UTF-8
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ через orjson; возвращенный из обработчика, минует jsonable_encoder"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Выбор сжатия по заголовку Accept-Encoding
+    
+    Выбирается метод с наибольшим весом q; brotli предпочитается gzip
+    только при равном весе.
+    
+    Args:
+        accept_encoding: Значение заголовка
+    
+    Returns:
+        str: 'br', 'gzip' или None, если клиент не принимает сжатие
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    qualities = {'gzip': accepted.get('gzip', wildcard)}
+    if brotli is not None:
+        qualities['br'] = accepted.get('br', wildcard)
+    # Метод с наибольшим q; при равном q выбирается brotli
+    encoding = max(qualities, key=lambda name: (qualities[name], name == 'br'))
+    return encoding if qualities[encoding] > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Сжатие тела ответа выбранным методом"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware сжатия ответов gzip или brotli
+    
+    Сжимаются только ответы целиком (не потоковые) сжимаемых типов размером
+    от COMPRESS_MIN_SIZE байт. Brotli используется, если установлен пакет brotli.
+    """
+    
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope['headers'])
+        encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            
+            body = message.get('body', b'')
+            response_headers = dict(start['headers'])
+            content_type = response_headers.get(b'content-type', b'').decode('latin-1')
+            if (
+                message.get('more_body', False)
+                or b'content-encoding' in response_headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+                or len(body) < self.minimum_size
+            ):
+                # Потоковые, уже сжатые и маленькие ответы отдаются как есть
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            
+            body = compress(body, encoding)
+            vary = response_headers.get(b'vary')
+            start['headers'] = [
+                (name, value) for name, value in start['headers']
+                if name not in (b'content-length', b'vary')
+            ] + [
+                (b'content-encoding', encoding.encode()),
+                (b'content-length', str(len(body)).encode()),
+                (b'vary', vary + b', Accept-Encoding' if vary else b'Accept-Encoding'),
+            ]
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+        
+        await self.app(scope, receive, send_compressed)
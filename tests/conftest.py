@@ -0,0 +1,85 @@
+"""
+Общие фикстуры тестов
+Тесты API работают с БД из переменных окружения FSTR_DB_* и пропускаются,
+если PostgreSQL недоступен
+"""
+
+import os
+import sys
+import uuid
+import random
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient приложения с открытым пулом подключений"""
+    from fastapi.testclient import TestClient
+    import main
+    
+    try:
+        with TestClient(main.app) as test_client:
+            yield test_client
+    except Exception as e:
+        pytest.skip(f"База данных недоступна: {e}")
+
+
+@pytest.fixture
+def pereval_payload() -> dict:
+    """Данные нового перевала с уникальным email и координатами"""
+    return {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {
+            "email": f"test-{uuid.uuid4().hex}@example.com",
+            "fam": "Пупкин",
+            "name": "Василий",
+            "otc": "Иванович",
+            "phone": "+7 555 55 55 55"
+        },
+        "coords": {
+            "latitude": round(random.uniform(-80, 80), 6),
+            "longitude": round(random.uniform(-170, 170), 6),
+            "height": 1200
+        },
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": []
+    }
+
+
+def connect(database: str):
+    """Подключение psycopg2 к базе database с параметрами FSTR_DB_*"""
+    return psycopg2.connect(
+        host=os.getenv('FSTR_DB_HOST', 'localhost'),
+        port=os.getenv('FSTR_DB_PORT', '5432'),
+        user=os.getenv('FSTR_DB_LOGIN', 'postgres'),
+        password=os.getenv('FSTR_DB_PASS', 'password'),
+        database=database
+    )
+
+
+@pytest.fixture
+def temp_database(monkeypatch) -> str:
+    """Временная база данных, созданная init_db.py; FSTR_DB_NAME указывает на нее"""
+    from init_db import init_database
+    
+    try:
+        connect('postgres').close()
+    except psycopg2.Error as e:
+        pytest.skip(f"База данных недоступна: {e}")
+    name = f"pereval_test_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setenv("FSTR_DB_NAME", name)
+    assert init_database()
+    yield name
+    conn = connect('postgres')
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE {name} WITH (FORCE)")
+    conn.close()
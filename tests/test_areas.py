@@ -0,0 +1,69 @@
+"""
+Перевалы района вместе с вложенными районами (таблица замыкания pereval_areas_closure)
+"""
+
+import os
+import random
+
+import pytest
+
+from tests.conftest import connect
+
+
+@pytest.fixture
+def areas(client):
+    """Два корневых района и подрайон первого; удаляются вместе со своими перевалами"""
+    base = random.randint(10 ** 8, 2 * 10 ** 9)
+    ids = {"parent": base, "child": base + 1, "other": base + 2}
+    conn = connect(os.getenv('FSTR_DB_NAME', 'pereval'))
+    with conn, conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO pereval_areas (id, id_parent, title) VALUES (%s, 0, 'Хребет'), (%s, %s, 'Отрог'), (%s, 0, 'Массив')",
+            (ids["parent"], ids["child"], ids["parent"], ids["other"])
+        )
+    yield ids, conn
+    with conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM pereval_added WHERE area_id = ANY(%s)", (list(ids.values()),))
+        cursor.execute("DELETE FROM pereval_areas WHERE id = ANY(%s)", (list(ids.values()),))
+    conn.close()
+
+
+def area_ids(client, area_id: int, **params) -> list:
+    response = client.get(f"/areas/{area_id}/pereval", params=params)
+    assert response.status_code == 200, response.text
+    return [pereval["id"] for pereval in response.json()["pereval_list"]]
+
+
+def test_subtree_listing(client, areas, pereval_payload):
+    ids, _ = areas
+    pereval_id = client.post("/submitData", json=dict(pereval_payload, area_id=ids["child"])).json()["id"]
+    
+    assert area_ids(client, ids["child"]) == [pereval_id]
+    assert area_ids(client, ids["parent"]) == [pereval_id]
+    assert area_ids(client, ids["other"]) == []
+    assert client.get("/areas/1/pereval").status_code == 200
+    assert client.get(f"/areas/{ids['other'] + 1}/pereval").status_code == 404
+
+
+def test_closure_rebuilt_after_reparenting(client, areas, pereval_payload):
+    ids, conn = areas
+    pereval_id = client.post("/submitData", json=dict(pereval_payload, area_id=ids["child"])).json()["id"]
+    
+    with conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE pereval_areas SET id_parent = %s WHERE id = %s", (ids["other"], ids["child"]))
+    
+    assert area_ids(client, ids["other"]) == [pereval_id]
+    assert area_ids(client, ids["parent"]) == []
+
+
+def test_pages_by_cursor(client, areas, pereval_payload):
+    ids, _ = areas
+    submitted = [
+        client.post("/submitData", json=dict(pereval_payload, area_id=ids["parent"], title=title)).json()["id"]
+        for title in ("Пхия", "Кавказский", "Тепли")
+    ]
+    
+    response = client.get(f"/areas/{ids['parent']}/pereval", params={"limit": 2}).json()
+    first = [pereval["id"] for pereval in response["pereval_list"]]
+    assert first == sorted(submitted, reverse=True)[:2]
+    assert area_ids(client, ids["parent"], limit=2, cursor=response["next_cursor"]) == [min(submitted)]
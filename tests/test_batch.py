@@ -0,0 +1,70 @@
+"""
+Пакетная отправка: пакет сохраняется целиком, повтор с ключом не создает записи
+"""
+
+import copy
+import uuid
+
+
+def batch(pereval_payload: dict, count: int) -> list:
+    items = []
+    for _ in range(count):
+        item = copy.deepcopy(pereval_payload)
+        item["user"]["email"] = f"test-{uuid.uuid4().hex}@example.com"
+        # Разнесены дальше радиуса поиска дубликатов
+        item["coords"]["longitude"] += len(items) * 0.1
+        items.append(item)
+    return items
+
+
+def test_repeat_with_idempotency_key(client, pereval_payload):
+    items = batch(pereval_payload, 2) + [{"title": "без координат"}]
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    
+    first = client.post("/submitData/batch", json=items, headers=headers).json()
+    assert first["status"] == 207
+    ids = [item["id"] for item in first["items"]]
+    assert all(ids[:2]) and ids[2] is None
+    
+    repeat = client.post("/submitData/batch", json=items, headers=headers).json()
+    assert [item["id"] for item in repeat["items"]] == ids
+    assert repeat["items"][0]["message"] == "Запрос уже обработан"
+    
+    other = client.post("/submitData/batch", json=items, headers={"Idempotency-Key": uuid.uuid4().hex}).json()
+    assert set(item["id"] for item in other["items"][:2]).isdisjoint(ids)
+
+
+def test_database_error_rejects_whole_batch(client, pereval_payload):
+    items = batch(pereval_payload, 2)
+    items[1]["area_id"] = 999999
+    
+    response = client.post("/submitData/batch", json=items).json()
+    assert response["status"] == 500
+    assert [item["status"] for item in response["items"]] == [500, 500]
+    
+    # Корректный первый перевал тоже не сохранен
+    response = client.get("/submitData/", params={"user__email": items[0]["user"]["email"]})
+    assert response.json()["pereval_list"] == []
+
+
+def test_batch_key_length(client, pereval_payload):
+    response = client.post("/submitData/batch", json=batch(pereval_payload, 1), headers={"Idempotency-Key": "k" * 61})
+    assert response.status_code == 422
+
+
+def test_retry_saves_items_rejected_before(client, pereval_payload):
+    items = batch(pereval_payload, 2)
+    invalid = copy.deepcopy(items)
+    del invalid[1]["coords"]
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    
+    first = client.post("/submitData/batch", json=invalid, headers=headers).json()
+    assert [item["status"] for item in first["items"]] == [200, 400]
+    
+    # Исправленный элемент сохраняется, первый уже обработан
+    retry = client.post("/submitData/batch", json=items, headers=headers).json()
+    assert [item["status"] for item in retry["items"]] == [200, 200]
+    assert retry["items"][0]["id"] == first["items"][0]["id"]
+    assert retry["items"][0]["message"] == "Запрос уже обработан"
+    assert retry["items"][1]["id"] is not None
+    assert retry["items"][1]["message"] == "Отправлено успешно"
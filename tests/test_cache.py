@@ -0,0 +1,29 @@
+"""
+Сериализация записей для общего кэша
+"""
+
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from database.cache import dump_row, load_row
+
+
+def test_row_round_trip():
+    row = {
+        "id": 1,
+        "date_added": datetime(2024, 1, 2, 3, 4, 5, 678901),
+        "claimed_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "add_time": None,
+        "latitude": Decimal("45.3842000"),
+        "title": "Пхия",
+        "raw_data": {"coords": {"latitude": "45.3842"}, "date": "2024-01-02T03:04:05"},
+        "images": [{"id": 7, "title": "Седловина"}],
+    }
+    restored = load_row(dump_row(row))
+    assert restored == row
+    assert type(restored["latitude"]) is Decimal
+    assert restored["raw_data"]["date"] == "2024-01-02T03:04:05"
+
+
+def test_json_not_pickle():
+    assert dump_row({"id": 1}).startswith(b"{")
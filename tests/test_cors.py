@@ -0,0 +1,9 @@
+"""
+Заголовки ответа, доступные клиенту в браузере
+"""
+
+
+def test_exposed_headers(client):
+    response = client.get("/health", headers={"Origin": "https://example.com"})
+    exposed = {name.strip().lower() for name in response.headers["access-control-expose-headers"].split(",")}
+    assert {"etag", "x-consistency-token"} <= exposed
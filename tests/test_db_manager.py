@@ -0,0 +1,57 @@
+"""
+Пул подключений синхронного менеджера: ожидание свободного соединения
+"""
+
+import threading
+import time
+
+import pytest
+from psycopg2 import pool
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("FSTR_DB_POOL_MIN", "1")
+    monkeypatch.setenv("FSTR_DB_POOL_MAX", "2")
+    monkeypatch.setenv("FSTR_DB_POOL_TIMEOUT", "0.5")
+    db_manager = DatabaseManager()
+    if not db_manager.connect():
+        pytest.skip("База данных недоступна")
+    yield db_manager
+    db_manager.disconnect()
+
+
+def test_waits_for_free_connection(manager):
+    released = threading.Event()
+    
+    def hold():
+        with manager.get_connection():
+            time.sleep(0.2)
+        released.set()
+    
+    with manager.get_connection():
+        thread = threading.Thread(target=hold)
+        thread.start()
+        time.sleep(0.05)
+        # Оба соединения заняты: третье выдается после возврата второго
+        started = time.monotonic()
+        assert manager.health_check()
+        assert released.is_set()
+        assert time.monotonic() - started < 0.5
+        thread.join()
+
+
+def test_exhausted_pool_raises_after_timeout(manager):
+    with manager.get_connection(), manager.get_connection():
+        started = time.monotonic()
+        with pytest.raises(pool.PoolError):
+            with manager.get_connection():
+                pass
+        assert time.monotonic() - started >= 0.5
+        assert not manager.health_check()
+    
+    assert manager.pool_stats()["exhausted"] == 2
+    assert manager.pool_stats()["in_use"] == 0
+    assert manager.health_check()
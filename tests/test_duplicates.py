@@ -0,0 +1,63 @@
+"""
+Вероятные дубликаты и повтор одиночной отправки с ключом
+"""
+
+import copy
+import uuid
+
+
+def near(pereval_payload: dict) -> dict:
+    """Тот же перевал от другого пользователя в нескольких метрах от исходного"""
+    item = copy.deepcopy(pereval_payload)
+    item["user"]["email"] = f"test-{uuid.uuid4().hex}@example.com"
+    item["coords"]["latitude"] += 0.0001
+    return item
+
+
+def test_duplicate_of_nearby_pereval(client, pereval_payload):
+    original = client.post("/submitData", json=pereval_payload).json()
+    assert original["duplicate_of"] is None
+    
+    response = client.post("/submitData", json=near(pereval_payload)).json()
+    assert response["status"] == 200
+    assert response["duplicate_of"] == original["id"]
+    assert response["message"] == "Отправлено успешно, возможно, перевал уже добавлен"
+    
+    # Другое название в той же точке дубликатом не считается
+    other = near(pereval_payload)
+    other["title"] = "Кавказский"
+    other["other_titles"] = ""
+    assert client.post("/submitData", json=other).json()["duplicate_of"] is None
+
+
+def test_duplicate_of_in_batch(client, pereval_payload):
+    original = client.post("/submitData", json=pereval_payload).json()
+    far = near(pereval_payload)
+    far["coords"]["latitude"] = -far["coords"]["latitude"]
+    
+    response = client.post("/submitData/batch", json=[near(pereval_payload), far]).json()
+    assert [item["status"] for item in response["items"]] == [200, 200]
+    assert response["items"][0]["duplicate_of"] == original["id"]
+    assert response["items"][0]["message"] == "Отправлено успешно, возможно, перевал уже добавлен"
+    assert response["items"][1]["duplicate_of"] is None
+    
+    pereval = client.get(f"/submitData/{response['items'][0]['id']}").json()
+    assert pereval["duplicate_of"] == original["id"]
+
+
+def test_repeat_with_idempotency_key(client, pereval_payload):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    first = client.post("/submitData", json=pereval_payload, headers=headers).json()
+    assert first["message"] == "Отправлено успешно"
+    
+    repeat = client.post("/submitData", json=pereval_payload, headers=headers).json()
+    assert repeat["status"] == 200
+    assert repeat["id"] == first["id"]
+    assert repeat["message"] == "Запрос уже обработан"
+    
+    # Ключ действует только для своего пользователя
+    other = near(pereval_payload)
+    assert client.post("/submitData", json=other, headers=headers).json()["id"] != first["id"]
+    
+    response = client.get("/submitData/", params={"user__email": pereval_payload["user"]["email"]})
+    assert len(response.json()["pereval_list"]) == 1
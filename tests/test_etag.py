@@ -0,0 +1,60 @@
+"""
+ETag перевала: тег из GET принимается в If-None-Match и If-Match
+"""
+
+
+def submit(client, payload: dict) -> int:
+    response = client.post("/submitData", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_patch_with_etag_from_get(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    
+    response = client.get(f"/submitData/{pereval_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    
+    response = client.patch(f"/submitData/{pereval_id}", json={"title": "Пхия 2"}, headers={"If-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.json()["state"] == 1
+    assert response.headers["ETag"] != etag
+    
+    # Тег до изменения устарел
+    response = client.patch(f"/submitData/{pereval_id}", json={"title": "Пхия 3"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+
+
+def test_etag_after_patch_matches_get(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    
+    response = client.patch(f"/submitData/{pereval_id}", json={"title": "Пхия 2"})
+    etag = response.headers["ETag"]
+    
+    response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_summary_etag_accepted_in_if_match(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    
+    response = client.get(f"/pereval/{pereval_id}", params={"view": "summary"})
+    assert "version" not in response.json()
+    full_etag = client.get(f"/pereval/{pereval_id}").headers["ETag"]
+    # Разные представления одной версии имеют разные теги
+    assert response.headers["ETag"] != full_etag
+    
+    response = client.patch(
+        f"/submitData/{pereval_id}",
+        json={"title": "Пхия 2"},
+        headers={"If-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_invalid_if_match(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    
+    response = client.patch(f"/submitData/{pereval_id}", json={"title": "Пхия 2"}, headers={"If-Match": '"abc"'})
+    assert response.status_code == 400
@@ -0,0 +1,95 @@
+"""
+Изображения перевала: ссылки в ответе и потоковая загрузка файла
+"""
+
+import pytest
+
+from main import add_image_urls
+
+
+def test_image_refs_get_urls():
+    data = add_image_urls({"id": 42, "images": [{"id": 7, "title": "Седловина"}]})
+    assert data["images"] == [{"id": 7, "title": "Седловина", "url": "/pereval/42/images/7"}]
+
+
+def test_legacy_inline_images_kept():
+    legacy = {"data": "aGVsbG8=", "title": "Седловина"}
+    data = add_image_urls({"id": 42, "images": [legacy, {"id": 7, "title": "Подъем"}]})
+    assert data["images"][0] == legacy
+    assert data["images"][1]["url"] == "/pereval/42/images/7"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Хранилище во временном каталоге с лимитом 1 КБ"""
+    import main
+    monkeypatch.setattr(main.image_storage, "base_dir", str(tmp_path))
+    monkeypatch.setattr(main.image_storage, "max_size", 1024)
+    return tmp_path
+
+
+def stored_files(directory) -> list:
+    return [path for path in directory.rglob("*") if path.is_file()]
+
+
+def test_upload_and_download(client, storage, pereval_payload):
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    data = b"\x89PNG\r\n\x1a\n" + b"x" * 1000
+    
+    response = client.post(
+        f"/pereval/{pereval_id}/images",
+        files={"file": ("saddle.png", data, "image/png")},
+        data={"title": "Седловина"}
+    )
+    assert response.json()["state"] == 1, response.text
+    image_id = response.json()["id"]
+    
+    response = client.get(f"/pereval/{pereval_id}/images/{image_id}")
+    assert response.content == data
+    assert response.headers["content-type"] == "image/png"
+    images = client.get(f"/submitData/{pereval_id}").json()["images"]
+    assert images[-1]["title"] == "Седловина"
+
+
+def test_too_large_by_content_length(client, storage, pereval_payload):
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    
+    def body():
+        raise AssertionError("Тело не должно читаться")
+        yield b""
+    
+    response = client.post(
+        f"/pereval/{pereval_id}/images",
+        content=body(),
+        headers={"Content-Type": "multipart/form-data; boundary=x", "Content-Length": str(10 ** 9)}
+    )
+    assert response.status_code == 413
+
+
+def test_too_large_while_reading(client, storage, pereval_payload):
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    
+    # Без Content-Length лимит проверяется по полученным байтам
+    def body():
+        yield b'--x\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n\r\n'
+        for _ in range(10):
+            yield b"x" * 512
+        yield b"\r\n--x--\r\n"
+    
+    response = client.post(
+        f"/pereval/{pereval_id}/images",
+        content=body(),
+        headers={"Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
+    assert stored_files(storage) == []
+
+
+def test_upload_without_file(client, storage, pereval_payload):
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    
+    response = client.post(f"/pereval/{pereval_id}/images", data={"title": "Седловина"}, files={"other": ("a", b"")})
+    assert response.status_code == 400
+    response = client.post(f"/pereval/{pereval_id}/images", json={"file": "x"})
+    assert response.status_code == 400
+    assert stored_files(storage) == []
@@ -0,0 +1,96 @@
+"""
+Очередь приема: ответ 202, статус отправки, запись порциями и учет попыток
+"""
+
+import copy
+import uuid
+
+import pytest
+
+import main
+from database.ingest_queue import IngestQueue, IngestWorker, QUEUED, DONE, FAILED
+
+
+@pytest.fixture
+def queue(client, tmp_path, monkeypatch):
+    """Очередь в отдельном файле, подключенная к приложению без фонового обработчика"""
+    ingest_queue = IngestQueue(str(tmp_path / "ingest.db"))
+    monkeypatch.setattr(main, "ingest_queue", ingest_queue)
+    monkeypatch.setattr(main, "ingest_worker", IngestWorker(ingest_queue, main.db_manager))
+    yield ingest_queue
+    ingest_queue.close()
+
+
+def submission(client, submission_id: str) -> dict:
+    response = client.get(f"/submitData/queue/{submission_id}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_accepted_then_stored(client, queue, pereval_payload):
+    response = client.post("/submitData", json=pereval_payload)
+    assert response.status_code == 202
+    submission_id = response.json()["submission_id"]
+    assert submission(client, submission_id)["status"] == QUEUED
+    
+    assert client.portal.call(main.ingest_worker.drain) == 1
+    stored = submission(client, submission_id)
+    assert stored["status"] == DONE
+    assert stored["attempts"] == 1
+    assert client.get(f"/submitData/{stored['pereval_id']}").status_code == 200
+    
+    assert client.get(f"/submitData/queue/{uuid.uuid4().hex}").status_code == 404
+
+
+def test_replay_after_restart(client, queue, pereval_payload, tmp_path):
+    submission_id = client.portal.call(queue.enqueue, pereval_payload, "offline-1")
+    
+    # Падение после записи в БД, но до отметки в очереди
+    pereval_data = main.PerevalSubmitData.model_validate(pereval_payload).model_dump()
+    written = client.portal.call(main.db_manager.add_pereval, pereval_data, "offline-1")
+    
+    # Отправка пережила перезапуск процесса и записывается в ту же запись
+    queue.close()
+    reopened = IngestQueue(str(tmp_path / "ingest.db"))
+    try:
+        assert client.portal.call(IngestWorker(reopened, main.db_manager).drain) == 1
+        stored = client.portal.call(reopened.get, submission_id)
+    finally:
+        reopened.close()
+    assert (stored["status"], stored["pereval_id"]) == (DONE, written["id"])
+    
+    response = client.get("/submitData/", params={"user__email": pereval_payload["user"]["email"]})
+    assert [pereval["id"] for pereval in response.json()["pereval_list"]] == [written["id"]]
+
+
+def test_rejected_batch_falls_back_to_single_inserts(client, queue, pereval_payload, monkeypatch):
+    monkeypatch.setenv("FSTR_INGEST_MAX_ATTEMPTS", "2")
+    worker = IngestWorker(queue, main.db_manager)
+    broken = copy.deepcopy(pereval_payload)
+    broken["user"]["email"] = f"test-{uuid.uuid4().hex}@example.com"
+    broken["area_id"] = 999999
+    good_id = client.portal.call(queue.enqueue, pereval_payload, None)
+    broken_id = client.portal.call(queue.enqueue, broken, None)
+    
+    # Несуществующий area_id отклоняет порцию, корректная отправка записывается отдельно
+    assert client.portal.call(worker.drain) == 1
+    assert client.portal.call(queue.get, good_id)["status"] == DONE
+    first = client.portal.call(queue.get, broken_id)
+    assert (first["status"], first["attempts"]) == (QUEUED, 1)
+    
+    assert client.portal.call(worker.drain) == 0
+    second = client.portal.call(queue.get, broken_id)
+    assert (second["status"], second["attempts"]) == (FAILED, 2)
+    assert second["error"]
+
+
+def test_unavailable_database_does_not_count_attempts(client, queue, pereval_payload):
+    from database.async_db_manager import AsyncDatabaseManager
+    
+    # Менеджер без подключения: БД недоступна
+    worker = IngestWorker(queue, AsyncDatabaseManager())
+    submission_id = client.portal.call(queue.enqueue, pereval_payload, None)
+    
+    assert client.portal.call(worker.drain) == 0
+    pending = client.portal.call(queue.get, submission_id)
+    assert (pending["status"], pending["attempts"]) == (QUEUED, 0)
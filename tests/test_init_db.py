@@ -0,0 +1,45 @@
+"""
+Обновление существующей базы скриптом init_db.py
+"""
+
+from init_db import init_database
+from tests.conftest import connect
+
+# Столбцы и индексы, которых нет в базе первой версии схемы
+NEW_COLUMNS = ("area_id", "version", "change_xid", "claimed_by", "claimed_at", "duplicate_of", "idempotency_key")
+
+
+def test_existing_database_gets_new_schema(temp_database):
+    # База первой версии схемы: без новых столбцов, индексов, триггеров и замыкания районов
+    conn = connect(temp_database)
+    with conn, conn.cursor() as cursor:
+        cursor.execute("DROP TABLE pereval_areas_closure")
+        cursor.execute("DROP TRIGGER pereval_added_change ON pereval_added")
+        cursor.execute("DROP TRIGGER pereval_areas_closure_refresh ON pereval_areas")
+        cursor.execute("ALTER TABLE pereval_added " + ", ".join(f"DROP COLUMN {column} CASCADE" for column in NEW_COLUMNS))
+        cursor.execute("INSERT INTO pereval_users (email, phone, fam, name) VALUES ('old@example.com', '1', 'f', 'n') RETURNING id")
+        cursor.execute(
+            "INSERT INTO pereval_added (title, user_id, latitude, longitude, height) VALUES ('Пхия', %s, 45, 45, 1200)",
+            cursor.fetchone()
+        )
+    
+    assert init_database()
+    # Повторный запуск ничего не меняет
+    assert init_database()
+    
+    with conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'pereval_added' AND column_name = ANY(%s)",
+            (list(NEW_COLUMNS),)
+        )
+        assert {row[0] for row in cursor.fetchall()} == set(NEW_COLUMNS)
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'pereval_added'")
+        indexes = {row[0] for row in cursor.fetchall()}
+        assert {"idx_pereval_added_idempotency", "idx_pereval_added_change", "idx_pereval_added_area_id"} <= indexes
+        cursor.execute("SELECT count(*) FROM pereval_areas_closure WHERE ancestor_id = 65 AND descendant_id = 66")
+        assert cursor.fetchone()[0] == 1
+        
+        # Триггер учета изменений снова работает
+        cursor.execute("UPDATE pereval_added SET title = 'Пхия 2' RETURNING version")
+        assert cursor.fetchone()[0] == 2
+    conn.close()
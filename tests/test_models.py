@@ -0,0 +1,48 @@
+"""
+Валидация данных перевала
+"""
+
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from models.pereval_models import PerevalSubmitData, PerevalUpdateData
+
+
+def test_add_time_parsed(pereval_payload):
+    data = PerevalSubmitData.model_validate(pereval_payload)
+    assert data.add_time == datetime(2021, 9, 22, 13, 18, 13)
+
+
+@pytest.mark.parametrize("value", ["", None])
+def test_empty_add_time(pereval_payload, value):
+    pereval_payload["add_time"] = value
+    assert PerevalSubmitData.model_validate(pereval_payload).add_time is None
+
+
+@pytest.mark.parametrize("value", [
+    "2021-09-22",
+    "2021-09-22T13:18:13",
+    "2021-09-22T13:18:13+03:00",
+    "2021-09-22 13:18:13+03:00",
+    "1632300000",
+    1632300000,
+    "22.09.2021 13:18:13",
+])
+def test_other_add_time_formats_rejected(pereval_payload, value):
+    pereval_payload["add_time"] = value
+    with pytest.raises(ValidationError, match="YYYY-MM-DD HH:MM:SS"):
+        PerevalSubmitData.model_validate(pereval_payload)
+
+
+def test_update_add_time_strict():
+    assert PerevalUpdateData.model_validate({"add_time": "2021-09-22 13:18:13"}).add_time == datetime(2021, 9, 22, 13, 18, 13)
+    with pytest.raises(ValidationError):
+        PerevalUpdateData.model_validate({"add_time": "2021-09-22"})
+
+
+def test_dumped_data_validates_again(pereval_payload):
+    # Очередь приема повторно валидирует уже разобранные данные
+    data = PerevalSubmitData.model_validate(pereval_payload).model_dump()
+    assert PerevalSubmitData.model_validate(data).add_time == datetime(2021, 9, 22, 13, 18, 13)
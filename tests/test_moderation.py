@@ -0,0 +1,65 @@
+"""
+Очередь модерации: закрепление перевалов за модераторами и возврат просроченных
+"""
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def submit(client, payload: dict, count: int) -> None:
+    for _ in range(count):
+        payload = dict(payload, user=dict(payload["user"], email=f"test-{uuid.uuid4().hex}@example.com"))
+        assert client.post("/submitData", json=payload).status_code == 200
+
+
+def claim(client, moderator: str, n: int) -> list:
+    response = client.post("/moderation/claim", params={"moderator": moderator, "n": n})
+    assert response.status_code == 200, response.text
+    return [pereval["id"] for pereval in response.json()["pereval_list"]]
+
+
+def resolve(client, pereval_id: int, moderator: str, action: str) -> int:
+    return client.post(f"/moderation/{pereval_id}/{action}", params={"moderator": moderator}).status_code
+
+
+def test_concurrent_claims_are_disjoint(client, pereval_payload):
+    submit(client, pereval_payload, 8)
+    moderators = [f"moderator-{uuid.uuid4().hex}" for _ in range(4)]
+    
+    with ThreadPoolExecutor(len(moderators)) as executor:
+        claimed = list(executor.map(lambda moderator: claim(client, moderator, 2), moderators))
+    
+    pereval_ids = [pereval_id for batch in claimed for pereval_id in batch]
+    assert all(len(batch) == 2 for batch in claimed)
+    assert len(set(pereval_ids)) == len(pereval_ids)
+    for moderator, batch in zip(moderators, claimed):
+        assert all(resolve(client, pereval_id, moderator, "accept") == 200 for pereval_id in batch)
+
+
+def test_resolve_requires_own_claim(client, pereval_payload):
+    submit(client, pereval_payload, 2)
+    first, second = f"moderator-{uuid.uuid4().hex}", f"moderator-{uuid.uuid4().hex}"
+    accepted, rejected = claim(client, first, 2)
+    
+    assert resolve(client, accepted, second, "accept") == 409
+    assert resolve(client, accepted, first, "accept") == 200
+    assert resolve(client, accepted, first, "reject") == 409
+    assert resolve(client, rejected, first, "reject") == 200
+
+
+def test_resolve_after_reclaim(client, pereval_payload):
+    submit(client, pereval_payload, 2)
+    first, second = f"moderator-{uuid.uuid4().hex}", f"moderator-{uuid.uuid4().hex}"
+    accepted, rejected = claim(client, first, 2)
+    
+    response = client.post("/moderation/reclaim", params={"older_than": 0})
+    assert response.status_code == 200, response.text
+    assert {accepted, rejected} <= set(response.json()["pereval_ids"])
+    
+    # Перевал вернулся в очередь: решение прежнего модератора не принимается
+    assert resolve(client, accepted, first, "accept") == 409
+    assert resolve(client, rejected, first, "reject") == 409
+    
+    reclaimed = claim(client, second, 2)
+    assert resolve(client, reclaimed[0], first, "accept") == 409
+    assert resolve(client, reclaimed[0], second, "accept") == 200
@@ -0,0 +1,78 @@
+"""
+Чтение перевала по ID из секционированной таблицы: только секции нужных месяцев
+"""
+
+import asyncio
+from datetime import datetime
+
+from database import queries
+from database.async_db_manager import AsyncDatabaseManager
+from database.partitions import PartitionMap
+from init_db import init_database
+from tests.conftest import connect
+
+
+def month(year: int, number: int) -> datetime:
+    return datetime(year, number, 1)
+
+
+def test_partition_map_bounds():
+    partition_map = PartitionMap([
+        {"since": month(2024, 1), "until": month(2024, 2), "lo": 1, "hi": 100},
+        # Соседние диапазоны пересекаются: транзакция начата в январе, id получен позже
+        {"since": month(2024, 2), "until": month(2024, 3), "lo": 95, "hi": 200},
+        # Пустой закрытый месяц
+        {"since": month(2024, 3), "until": month(2024, 4), "lo": 0, "hi": -1},
+        {"since": month(2024, 4), "until": month(2024, 5), "lo": None, "hi": None},
+        {"since": month(2024, 5), "until": month(2024, 6), "lo": None, "hi": None},
+    ])
+    assert partition_map.bounds(50) == (month(2024, 1), month(2024, 2))
+    assert partition_map.bounds(97) == (month(2024, 1), month(2024, 3))
+    assert partition_map.bounds(150) == (month(2024, 2), month(2024, 3))
+    # Остальные id могут быть только в открытых месяцах
+    assert partition_map.bounds(201) == (month(2024, 4), None)
+    assert partition_map.bounds(0) == (month(2024, 4), None)
+
+
+def test_date_added_bounds():
+    sql = queries.date_added_bounds("SELECT 1 FROM pereval_added p WHERE p.id = %s\n", month(2024, 4), None)
+    assert sql == "SELECT 1 FROM pereval_added p WHERE p.id = %s AND p.date_added >= '2024-04-01T00:00:00'::timestamp"
+    assert queries.date_added_bounds(sql, None, None) == sql
+
+
+def test_lookup_reads_only_its_month(temp_database):
+    conn = connect(temp_database)
+    with conn, conn.cursor() as cursor:
+        cursor.execute("INSERT INTO pereval_users (email, phone, fam, name) VALUES ('p@example.com', '1', 'f', 'n') RETURNING id")
+        user_id = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT INTO pereval_added (date_added, title, user_id, latitude, longitude, height) "
+            "SELECT now() - make_interval(months => n), 'Пхия', %s, 45, 45, 1200 FROM generate_series(6, 0, -1) n "
+            "RETURNING id",
+            (user_id,)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    assert init_database(partitioned=True)
+    
+    async def lookup():
+        manager = AsyncDatabaseManager()
+        manager.cache = None
+        assert await manager.connect()
+        try:
+            assert manager.partitioned and len(manager.partition_map.sealed) >= 5
+            rows = [await manager.get_pereval_by_id(pereval_id) for pereval_id in ids]
+            missing = await manager.get_pereval_by_id(ids[-1] + 1000)
+            return rows, missing, manager.partition_map.bounds(ids[0])
+        finally:
+            await manager.disconnect()
+    
+    rows, missing, bounds = asyncio.run(lookup())
+    assert [row["id"] for row in rows] == ids
+    assert missing is None
+    
+    # План запроса по id из закрытого месяца содержит одну секцию
+    with conn, conn.cursor() as cursor:
+        cursor.execute("EXPLAIN " + queries.date_added_bounds(queries.SELECT_PEREVAL_BY_ID, *bounds), (ids[0],))
+        scans = [row[0] for row in cursor.fetchall() if " on pereval_added_y" in row[0]]
+    assert len(scans) == 1, scans
+    conn.close()
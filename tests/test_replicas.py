@@ -0,0 +1,89 @@
+"""
+Чтение с реплик и токен согласованности после записи
+Роль реплики играет тот же сервер PostgreSQL
+"""
+
+import os
+
+import pytest
+
+import main
+from database import queries
+from database.replicas import CONSISTENCY_HEADER, LSN_PATTERN
+
+# Реплика воспроизвела WAL до текущей позиции основного сервера
+CAUGHT_UP_TO_PRIMARY = "SELECT pg_current_wal_lsn() >= %s::pg_lsn AS caught_up"
+
+
+@pytest.fixture
+def open_replica(client, monkeypatch):
+    """Подключение реплики к менеджеру приложения; пулы закрываются после теста"""
+    manager = main.db_manager
+    monkeypatch.setattr(manager, "replicas", [])
+    
+    def open_replica(dsn: str):
+        monkeypatch.setattr(manager, "replica_dsns", [dsn])
+        client.portal.call(manager._open_replicas)
+        return manager.replicas[-1]
+    
+    yield open_replica
+    for replica in manager.replicas:
+        client.portal.call(replica.pool.close)
+
+
+@pytest.fixture
+def replica(open_replica):
+    return open_replica(f"host={os.getenv('FSTR_DB_HOST', 'localhost')}")
+
+
+def submit(client, payload: dict) -> str:
+    response = client.post("/submitData", json=payload)
+    assert response.status_code == 200, response.text
+    return response.headers[CONSISTENCY_HEADER]
+
+
+def sync_ids(client, email: str, token: str = None) -> list:
+    headers = {CONSISTENCY_HEADER: token} if token else {}
+    response = client.get("/sync", params={"user__email": email}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [pereval["id"] for pereval in response.json()["pereval_list"]]
+
+
+def test_read_after_write_on_replica(client, replica, monkeypatch, pereval_payload):
+    monkeypatch.setattr(queries, "SELECT_REPLICA_CAUGHT_UP", CAUGHT_UP_TO_PRIMARY)
+    token = submit(client, pereval_payload)
+    assert LSN_PATTERN.match(token)
+    
+    assert len(sync_ids(client, pereval_payload["user"]["email"], token)) == 1
+    assert (replica.reads, replica.lagging) == (1, 0)
+    assert client.get("/health").json()["replicas"][0]["reads"] == 1
+
+
+def test_lagging_replica_falls_back_to_primary(client, replica, monkeypatch, pereval_payload):
+    monkeypatch.setattr(queries, "SELECT_REPLICA_CAUGHT_UP", CAUGHT_UP_TO_PRIMARY)
+    submit(client, pereval_payload)
+    email = pereval_payload["user"]["email"]
+    
+    # Позиция WAL, до которой реплика еще не дошла
+    assert len(sync_ids(client, email, "FFFFFFFF/FFFFFFFF")) == 1
+    assert (replica.reads, replica.lagging) == (0, 1)
+    assert replica.available()
+    
+    # Некорректный токен не учитывается
+    assert len(sync_ids(client, email, "not-an-lsn")) == 1
+    assert (replica.reads, replica.lagging) == (1, 1)
+
+
+def test_unavailable_replica_falls_back_to_primary(client, open_replica, monkeypatch, pereval_payload):
+    monkeypatch.setattr(main.db_manager, "replica_timeout", 0.2)
+    replica = open_replica(f"host={os.getenv('FSTR_DB_HOST', 'localhost')} port=1")
+    submit(client, pereval_payload)
+    email = pereval_payload["user"]["email"]
+    
+    assert len(sync_ids(client, email)) == 1
+    assert replica.failures == 1
+    assert not replica.available()
+    
+    # Отключенная реплика не опрашивается до истечения replica_retry
+    assert len(sync_ids(client, email)) == 1
+    assert (replica.failures, replica.reads) == (1, 0)
@@ -0,0 +1,65 @@
+"""
+Поиск перевалов на карте: область bbox и ближайшие к точке near
+"""
+
+import math
+
+
+def submit(client, payload: dict) -> int:
+    response = client.post("/submitData", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def search(client, **params) -> dict:
+    response = client.get("/pereval/search", params=params)
+    assert response.status_code == 200, response.text
+    return {pereval["id"]: pereval for pereval in response.json()["pereval_list"]}
+
+
+def test_bbox(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    latitude = pereval_payload["coords"]["latitude"]
+    longitude = pereval_payload["coords"]["longitude"]
+    
+    inside = f"{longitude - 0.01},{latitude - 0.01},{longitude + 0.01},{latitude + 0.01}"
+    assert pereval_id in search(client, bbox=inside)
+    
+    outside = f"{longitude + 0.01},{latitude - 0.01},{longitude + 0.02},{latitude + 0.01}"
+    assert pereval_id not in search(client, bbox=outside)
+
+
+def test_near_radius_boundary(client, pereval_payload):
+    pereval_id = submit(client, pereval_payload)
+    latitude = pereval_payload["coords"]["latitude"]
+    longitude = pereval_payload["coords"]["longitude"]
+    
+    # Точка на 0.01 градуса южнее: расстояние по меридиану около 1112 м
+    near = f"{latitude - 0.01},{longitude}"
+    distance = 6371000 * math.radians(0.01)
+    
+    found = search(client, near=near, radius=distance + 5)
+    assert pereval_id in found
+    assert abs(found[pereval_id]["distance"] - distance) < 1
+    assert pereval_id not in search(client, near=near, radius=distance - 5)
+
+
+def test_near_sorted_by_distance(client, pereval_payload):
+    first = submit(client, pereval_payload)
+    farther = dict(pereval_payload, coords=dict(pereval_payload["coords"]))
+    farther["coords"]["latitude"] += 0.02
+    farther["title"] = "Кавказский"
+    second = submit(client, farther)
+    
+    near = f"{pereval_payload['coords']['latitude']},{pereval_payload['coords']['longitude']}"
+    response = client.get("/pereval/search", params={"near": near, "radius": 5000})
+    ids = [pereval["id"] for pereval in response.json()["pereval_list"]]
+    assert ids.index(first) < ids.index(second)
+
+
+def test_invalid_area(client):
+    assert client.get("/pereval/search", params={"bbox": "10,10,5,5"}).status_code == 400
+    assert client.get("/pereval/search", params={"bbox": "1,2,3"}).status_code == 400
+    assert client.get("/pereval/search", params={"bbox": "0,0,1,1", "near": "0,0"}).status_code == 400
+    assert client.get("/pereval/search", params={"near": "91,0"}).status_code == 400
+    assert client.get("/pereval/search").status_code == 400
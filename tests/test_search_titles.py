@@ -0,0 +1,69 @@
+"""
+Поиск перевалов по названиям (q): полнотекстовый и нечеткий через pg_trgm
+"""
+
+import random
+import string
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def word() -> str:
+    """Уникальное слово названия, чтобы поиск находил только перевалы теста"""
+    # Без буквы z: опечатка в тестах заменяет последнюю букву на z
+    return ''.join(random.choices(string.ascii_lowercase[:-1], k=12))
+
+
+def submit(client, payload: dict) -> int:
+    response = client.post("/submitData", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def search(client, q: str) -> list:
+    response = client.get("/pereval/search", params={"q": q})
+    assert response.status_code == 200, response.text
+    return response.json()["pereval_list"]
+
+
+@pytest.mark.parametrize("trigram", [False, True])
+def test_morphology_and_titles(client, monkeypatch, pereval_payload, word, trigram):
+    if trigram and not main.db_manager.trigram:
+        pytest.skip("Расширение pg_trgm недоступно")
+    monkeypatch.setattr(main.db_manager, "trigram", trigram)
+    by_title = submit(client, dict(pereval_payload, title=f"Ледниковый {word}"))
+    by_other = submit(client, dict(pereval_payload, title="Пхия", other_titles=f"Ледниковый {word}"))
+    
+    assert {pereval["id"] for pereval in search(client, f"ледниковые {word}")} == {by_title, by_other}
+    assert search(client, f"скальный {word}") == []
+
+
+@pytest.mark.parametrize("trigram", [False, True])
+def test_sorted_by_score(client, monkeypatch, pereval_payload, word, trigram):
+    if trigram and not main.db_manager.trigram:
+        pytest.skip("Расширение pg_trgm недоступно")
+    monkeypatch.setattr(main.db_manager, "trigram", trigram)
+    weak = submit(client, dict(pereval_payload, title="Пхия", other_titles=word))
+    strong = submit(client, dict(pereval_payload, title=f"{word} {word}", other_titles=word))
+    
+    found = search(client, word)
+    assert [pereval["id"] for pereval in found] == [strong, weak]
+    assert found[0]["score"] > found[1]["score"]
+
+
+def test_typo_without_trigram(client, monkeypatch, pereval_payload, word):
+    monkeypatch.setattr(main.db_manager, "trigram", False)
+    submit(client, dict(pereval_payload, title=word))
+    
+    assert search(client, word[:-1] + "z") == []
+
+
+def test_typo_with_trigram(client, pereval_payload, word):
+    if not main.db_manager.trigram:
+        pytest.skip("Расширение pg_trgm недоступно")
+    pereval_id = submit(client, dict(pereval_payload, title=word))
+    
+    assert pereval_id in [pereval["id"] for pereval in search(client, word[:-1] + "z")]
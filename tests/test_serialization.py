@@ -0,0 +1,33 @@
+"""
+Выбор сжатия ответа по Accept-Encoding
+"""
+
+import pytest
+
+import serialization
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(serialization, "brotli", object())
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.1, gzip;q=1", "gzip"),
+    ("br;q=1, gzip;q=0.5", "br"),
+    ("br;q=0.5, gzip;q=0.5", "br"),
+    ("gzip;q=0.2, *;q=0.8", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_highest_quality_wins(with_brotli, header, expected):
+    assert serialization.choose_encoding(header) == expected
+
+
+def test_gzip_without_brotli(monkeypatch):
+    monkeypatch.setattr(serialization, "brotli", None)
+    assert serialization.choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert serialization.choose_encoding("br") is None
@@ -0,0 +1,66 @@
+"""
+Подготовленные запросы после изменения типа столбца (ALTER COLUMN TYPE)
+"""
+
+import logging
+
+import psycopg
+import pytest
+
+import main
+from database.async_db_manager import StaleStatementError
+
+
+def alter_connect(manager, type_name: str):
+    # Отдельное подключение: DDL на подключении пула сбросил бы его подготовленные запросы
+    with psycopg.connect(
+        host=manager.host, port=manager.port, user=manager.login,
+        password=manager.password, dbname=manager.database, autocommit=True
+    ) as connection:
+        connection.execute(f"ALTER TABLE pereval_added ALTER COLUMN connect TYPE {type_name}")
+
+
+@pytest.fixture
+def manager(client, monkeypatch):
+    """Менеджер приложения без кэша: каждый вызов идет в БД"""
+    monkeypatch.setattr(main.db_manager, "cache", None)
+    yield main.db_manager
+    alter_connect(main.db_manager, "text")
+
+
+async def execute(manager, sql: str):
+    async with manager.pool.connection() as connection:
+        await connection.execute(sql)
+
+
+def warm_up(client, manager, pereval_id: int):
+    # Пул выдает подключения по очереди: запрос готовится на каждом
+    for _ in range(2 * manager.pool_max):
+        assert client.portal.call(manager.get_pereval_by_id, pereval_id)
+
+
+def test_retry_after_column_type_change(client, manager, pereval_payload, caplog):
+    caplog.set_level(logging.INFO, logger="database.async_db_manager")
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    warm_up(client, manager, pereval_id)
+    
+    alter_connect(manager, "varchar(2000)")
+    for _ in range(2 * manager.pool_max):
+        assert client.portal.call(manager.get_pereval_by_id, pereval_id)["id"] == pereval_id
+    assert "Подготовленный запрос устарел" in caplog.text
+
+
+def test_last_attempt_returns_failure_value(client, manager, pereval_payload, monkeypatch):
+    pereval_id = client.post("/submitData", json=pereval_payload).json()["id"]
+    warm_up(client, manager, pereval_id)
+    
+    # Единственная попытка: метод сам обрабатывает ошибку и возвращает None
+    alter_connect(manager, "varchar(2000)")
+    monkeypatch.setattr(manager, "pool_max", 0)
+    assert client.portal.call(manager.get_pereval_by_id, pereval_id) is None
+
+
+def test_other_feature_not_supported_unchanged(client, manager):
+    with pytest.raises(psycopg.errors.FeatureNotSupported) as error:
+        client.portal.call(execute, manager, "SELECT count(*) FROM pereval_added GROUP BY id FOR UPDATE")
+    assert not isinstance(error.value, StaleStatementError)
@@ -0,0 +1,68 @@
+"""
+Синхронизация мобильного приложения: курсор изменений /sync
+"""
+
+from database import queries
+
+
+def submit(client, payload: dict, count: int) -> list:
+    pereval_ids = []
+    for number in range(count):
+        coords = dict(payload["coords"], longitude=payload["coords"]["longitude"] + number * 0.1)
+        response = client.post("/submitData", json=dict(payload, title=f"Пхия {number}", coords=coords))
+        assert response.status_code == 200, response.text
+        pereval_ids.append(response.json()["id"])
+    return pereval_ids
+
+
+def position(cursor: str) -> tuple:
+    change_xid, last_id = queries.decode_sync_cursor(cursor)
+    return int(change_xid), last_id
+
+
+def sync(client, email: str, since: str = None, limit: int = 100) -> dict:
+    params = {"user__email": email, "limit": limit}
+    if since:
+        params["since"] = since
+    response = client.get("/sync", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_pages_until_has_more_is_false(client, pereval_payload):
+    email = pereval_payload["user"]["email"]
+    pereval_ids = submit(client, pereval_payload, 3)
+    
+    first = sync(client, email, limit=2)
+    assert [pereval["id"] for pereval in first["pereval_list"]] == pereval_ids[:2]
+    assert first["has_more"]
+    
+    second = sync(client, email, first["next_cursor"], limit=2)
+    assert [pereval["id"] for pereval in second["pereval_list"]] == pereval_ids[2:]
+    assert not second["has_more"]
+    assert position(first["next_cursor"]) < position(second["next_cursor"])
+    
+    # Без новых изменений курсор не меняется
+    empty = sync(client, email, second["next_cursor"])
+    assert (empty["pereval_list"], empty["has_more"]) == ([], False)
+    assert empty["next_cursor"] == second["next_cursor"]
+
+
+def test_cursor_moves_forward_on_update(client, pereval_payload):
+    email = pereval_payload["user"]["email"]
+    pereval_ids = submit(client, pereval_payload, 2)
+    cursor = sync(client, email)["next_cursor"]
+    
+    response = client.patch(f"/submitData/{pereval_ids[0]}", json={"title": "Кавказский"})
+    assert response.json()["state"] == 1, response.text
+    
+    changed = sync(client, email, cursor)
+    assert [(pereval["id"], pereval["version"]) for pereval in changed["pereval_list"]] == [(pereval_ids[0], 2)]
+    change_xid, last_id = position(changed["next_cursor"])
+    assert change_xid > position(cursor)[0]
+    assert last_id == pereval_ids[0]
+
+
+def test_invalid_cursor(client):
+    response = client.get("/sync", params={"since": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+"""
+Частичное редактирование перевала: изменяются только переданные поля
+"""
+
+import base64
+
+import pytest
+
+
+IMAGE = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"x" * 100).decode()
+
+
+@pytest.fixture
+def pereval(client, pereval_payload) -> tuple:
+    """Перевал с изображением и его данные до редактирования"""
+    pereval_payload["images"] = [{"data": IMAGE, "title": "Седловина"}]
+    response = client.post("/submitData", json=pereval_payload)
+    assert response.status_code == 200, response.text
+    pereval_id = response.json()["id"]
+    return pereval_id, client.get(f"/submitData/{pereval_id}").json()
+
+
+def patch(client, pereval_id: int, changes: dict) -> dict:
+    response = client.patch(f"/submitData/{pereval_id}", json=changes)
+    assert response.status_code == 200, response.text
+    assert response.json()["state"] == 1, response.text
+    return client.get(f"/submitData/{pereval_id}").json()
+
+
+def test_unsent_fields_untouched(client, pereval):
+    pereval_id, before = pereval
+    
+    after = patch(client, pereval_id, {"title": "Кавказский", "coords": {"height": 1500}})
+    
+    assert (after["title"], after["height"]) == ("Кавказский", 1500)
+    assert after["version"] == before["version"] + 1
+    assert after["raw_data"]["coords"] == dict(before["raw_data"]["coords"], height=1500)
+    for field in before.keys() - {"title", "height", "version", "raw_data"}:
+        assert after[field] == before[field], field
+
+
+def test_null_clears_sent_field(client, pereval):
+    pereval_id, before = pereval
+    
+    after = patch(client, pereval_id, {"other_titles": None})
+    
+    assert after["other_titles"] is None
+    assert after["title"] == before["title"]
+    assert after["images"] == before["images"]
+
+
+def test_images_replaced_only_when_sent(client, pereval):
+    pereval_id, before = pereval
+    
+    after = patch(client, pereval_id, {"images": [{"data": IMAGE, "title": "Подъем"}]})
+    assert [image["title"] for image in after["images"]] == ["Подъем"]
+    assert after["images"][0]["id"] != before["images"][0]["id"]
+    
+    after = patch(client, pereval_id, {"images": []})
+    assert after["images"] == []
+
+
+def test_null_coords_rejected(client, pereval):
+    pereval_id, before = pereval
+    
+    response = client.patch(f"/submitData/{pereval_id}", json={"coords": None})
+    assert response.status_code == 422
+    assert client.get(f"/submitData/{pereval_id}").json() == before